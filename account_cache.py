@@ -0,0 +1,129 @@
+from collections import OrderedDict
+from threading import Lock
+from typing import List, Optional
+
+# OrderState values after which an order can no longer change
+FINISHED_ORDER_STATES = frozenset(("FullyExecuted", "Canceled", "Rejected", "Expired"))
+
+class AccountCache(object):
+    '''
+    In-memory view of one account's orders and positions, kept current by the
+    SubscribeAccountEvents stream (OrderStateEvent, OrderTradeEvent, AccountPositionEvent).
+
+    Orders are indexed by OrderId and ClientOrderId, positions by ProductId, and every lookup
+    is a single dict access that never blocks on the socket thread. Entries are replaced,
+    never mutated, so a dict returned by a lookup is a consistent snapshot. Finished orders
+    (and their trades) are kept for the `maxFinishedOrders` most recent ones, so a strategy
+    can still read the final state of an order that has just filled or been cancelled.
+    Trades of orders the cache does not hold are kept for as many orders again.
+
+    `beginSeed` and `seed` load the GetOpenOrders/GetAccountPositions snapshot without losing
+    events that arrive while it is in flight: anything an event has already updated is newer
+    than the snapshot and is kept.
+    '''
+    def __init__(self, accountId: int, omsId: int, maxFinishedOrders: int = 1000):
+        self.accountId = accountId
+        self.omsId = omsId
+        self.maxFinishedOrders = maxFinishedOrders
+        self.ordersById = dict()
+        self.orderIdByClientOrderId = dict()
+        self.openOrderIds = set()
+        self.finishedOrderIds = OrderedDict()
+        self.tradesByOrderId = dict()
+        # Orders with trades but no order state (yet), oldest first
+        self.untrackedTradeOrderIds = OrderedDict()
+        self.positionsByProductId = dict()
+        self.lock = Lock()
+        self.seeding = False
+        self.updatedOrderIds = set()
+        self.updatedProductIds = set()
+
+    # ============== Lookups ================
+    def getOrder(self, orderId: int) -> Optional[dict]:
+        return self.ordersById.get(orderId)
+
+    def getOrderByClientOrderId(self, clientOrderId: int) -> Optional[dict]:
+        orderId = self.orderIdByClientOrderId.get(clientOrderId)
+        return self.ordersById.get(orderId) if orderId is not None else None
+
+    def getPosition(self, productId: int) -> Optional[dict]:
+        return self.positionsByProductId.get(productId)
+
+    def getTrades(self, orderId: int) -> List[dict]:
+        return list(self.tradesByOrderId.get(orderId, ()))
+
+    def openOrders(self) -> List[dict]:
+        ordersById = self.ordersById
+        return [ordersById[orderId] for orderId in list(self.openOrderIds) if orderId in ordersById]
+
+    def positions(self) -> List[dict]:
+        return list(self.positionsByProductId.values())
+
+    # ============== Seeding ================
+    def beginSeed(self):
+        with self.lock:
+            self.seeding = True
+            self.updatedOrderIds.clear()
+            self.updatedProductIds.clear()
+
+    def seed(self, openOrders: List[dict] = None, positions: List[dict] = None):
+        with self.lock:
+            for order in openOrders or ():
+                if order["OrderId"] not in self.updatedOrderIds:
+                    self.storeOrder(order)
+            for position in positions or ():
+                if position["ProductId"] not in self.updatedProductIds:
+                    self.positionsByProductId[position["ProductId"]] = position
+            self.seeding = False
+            self.updatedOrderIds.clear()
+            self.updatedProductIds.clear()
+
+    # ============== Events ================
+    def onOrderState(self, order: dict):
+        with self.lock:
+            if self.seeding:
+                self.updatedOrderIds.add(order["OrderId"])
+            self.storeOrder(order)
+
+    def onOrderTrade(self, trade: dict):
+        with self.lock:
+            orderId = trade["OrderId"]
+            trades = self.tradesByOrderId.get(orderId)
+            if trades is None:
+                trades = self.tradesByOrderId[orderId] = []
+            # getTrades copies the list, so appending in place keeps each fill O(1)
+            trades.append(trade)
+            if orderId not in self.ordersById:
+                self.untrackedTradeOrderIds[orderId] = None
+                self.untrackedTradeOrderIds.move_to_end(orderId)
+                while len(self.untrackedTradeOrderIds) > self.maxFinishedOrders:
+                    self.tradesByOrderId.pop(self.untrackedTradeOrderIds.popitem(last=False)[0], None)
+
+    def onAccountPosition(self, position: dict):
+        with self.lock:
+            if self.seeding:
+                self.updatedProductIds.add(position["ProductId"])
+            self.positionsByProductId[position["ProductId"]] = position
+
+    def storeOrder(self, order: dict):
+        # Callers hold the lock
+        orderId = order["OrderId"]
+        self.ordersById[orderId] = order
+        self.untrackedTradeOrderIds.pop(orderId, None)
+        if order.get("ClientOrderId"):
+            self.orderIdByClientOrderId[order["ClientOrderId"]] = orderId
+        if order.get("OrderState") in FINISHED_ORDER_STATES:
+            self.openOrderIds.discard(orderId)
+            self.finishedOrderIds[orderId] = None
+            self.finishedOrderIds.move_to_end(orderId)
+            while len(self.finishedOrderIds) > self.maxFinishedOrders:
+                self.evictOrder(self.finishedOrderIds.popitem(last=False)[0])
+        else:
+            self.openOrderIds.add(orderId)
+
+    def evictOrder(self, orderId: int):
+        order = self.ordersById.pop(orderId, None)
+        self.tradesByOrderId.pop(orderId, None)
+        if order is not None and order.get("ClientOrderId"):
+            if self.orderIdByClientOrderId.get(order["ClientOrderId"]) == orderId:
+                del self.orderIdByClientOrderId[order["ClientOrderId"]]
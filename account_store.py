@@ -0,0 +1,171 @@
+import json
+from threading import Lock
+from typing import List, Optional
+
+# Columns kept next to the raw record, so that range and equality filters use the indexes
+TRADE_COLUMNS = ("TradeId", "OrderId", "InstrumentId", "Side", "Quantity", "Price", "Value", "Fee", "FeeProductId", "TradeTimeMS")
+TRANSACTION_COLUMNS = ("ProductId", "TransactionType", "ReferenceType", "ReferenceId", "CR", "DR", "Balance", "TimeStamp")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS trades (
+    AccountId INTEGER NOT NULL, ExecutionId INTEGER NOT NULL,
+    TradeId INTEGER, OrderId INTEGER, InstrumentId INTEGER, Side TEXT, Quantity REAL, Price REAL,
+    Value REAL, Fee REAL, FeeProductId INTEGER, TradeTimeMS INTEGER, Record TEXT NOT NULL,
+    PRIMARY KEY (AccountId, ExecutionId));
+CREATE INDEX IF NOT EXISTS tradesByTime ON trades (AccountId, TradeTimeMS);
+CREATE INDEX IF NOT EXISTS tradesByInstrument ON trades (AccountId, InstrumentId, TradeTimeMS);
+CREATE TABLE IF NOT EXISTS transactions (
+    AccountId INTEGER NOT NULL, TransactionId INTEGER NOT NULL,
+    ProductId INTEGER, TransactionType TEXT, ReferenceType TEXT, ReferenceId INTEGER, CR REAL, DR REAL,
+    Balance REAL, TimeStamp INTEGER, Record TEXT NOT NULL,
+    PRIMARY KEY (AccountId, TransactionId));
+CREATE INDEX IF NOT EXISTS transactionsByTime ON transactions (AccountId, TimeStamp);
+CREATE INDEX IF NOT EXISTS transactionsByProduct ON transactions (AccountId, ProductId, TimeStamp);
+CREATE TABLE IF NOT EXISTS syncState (
+    AccountId INTEGER NOT NULL, Kind TEXT NOT NULL, HighWaterMark INTEGER NOT NULL,
+    PRIMARY KEY (AccountId, Kind));
+"""
+
+class AccountStore(object):
+    '''
+    Local SQLite copy of account trades (GetAccountTrades) and transactions
+    (GetAccountTransactions), with the highest TradeId and TransactionId synced per account.
+    Rows are keyed by ExecutionId and TransactionId, so storing a record twice replaces it.
+    Time-range, instrument and product queries use indexes and return the records as the API
+    sent them.
+    '''
+    def __init__(self, path: str = "foxbit_account.db"):
+        # sqlite3 is only imported by processes that keep a local store
+        import sqlite3
+        self.path = path
+        self.lock = Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        with self.lock, self.connection:
+            self.connection.executescript(SCHEMA)
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+    # ============== Writes ================
+    def storeTrades(self, accountId: int, trades: List[dict]):
+        rows = [
+            (accountId, trade.get("ExecutionId", trade["TradeId"])) + tuple(trade.get(name) for name in TRADE_COLUMNS) + (json.dumps(trade),)
+            for trade in trades
+        ]
+        with self.lock, self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO trades (AccountId, ExecutionId, {}, Record) VALUES (?, ?, {}, ?)".format(
+                    ", ".join(TRADE_COLUMNS), ", ".join("?" * len(TRADE_COLUMNS))),
+                rows)
+            self.raiseHighWaterMark(accountId, "trades", max((trade["TradeId"] for trade in trades), default=None))
+
+    def storeTransactions(self, accountId: int, transactions: List[dict]):
+        rows = [
+            (accountId, transaction["TransactionId"]) + tuple(transaction.get(name) for name in TRANSACTION_COLUMNS) + (json.dumps(transaction),)
+            for transaction in transactions
+        ]
+        with self.lock, self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO transactions (AccountId, TransactionId, {}, Record) VALUES (?, ?, {}, ?)".format(
+                    ", ".join(TRANSACTION_COLUMNS), ", ".join("?" * len(TRANSACTION_COLUMNS))),
+                rows)
+            self.raiseHighWaterMark(accountId, "transactions", max((transaction["TransactionId"] for transaction in transactions), default=None))
+
+    def raiseHighWaterMark(self, accountId: int, kind: str, highWaterMark: Optional[int]):
+        # Callers hold the lock, inside the transaction that stored the rows
+        if highWaterMark is not None:
+            self.connection.execute(
+                "INSERT INTO syncState (AccountId, Kind, HighWaterMark) VALUES (?, ?, ?) "
+                "ON CONFLICT (AccountId, Kind) DO UPDATE SET HighWaterMark = MAX(HighWaterMark, excluded.HighWaterMark)",
+                (accountId, kind, highWaterMark))
+
+    # ============== Reads ================
+    def highWaterMark(self, accountId: int, kind: str) -> Optional[int]:
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT HighWaterMark FROM syncState WHERE AccountId = ? AND Kind = ?", (accountId, kind)).fetchone()
+        return row[0] if row is not None else None
+
+    def queryTrades(self, accountId: int, startTimeMs: int = None, endTimeMs: int = None,
+        instrumentId: int = None) -> List[dict]:
+        # startTimeMs inclusive, endTimeMs exclusive, oldest first
+        return self.query("trades", "TradeTimeMS", accountId, startTimeMs, endTimeMs, "InstrumentId", instrumentId)
+
+    def queryTransactions(self, accountId: int, startTimeMs: int = None, endTimeMs: int = None,
+        productId: int = None) -> List[dict]:
+        return self.query("transactions", "TimeStamp", accountId, startTimeMs, endTimeMs, "ProductId", productId)
+
+    def query(self, table: str, timeColumn: str, accountId: int, startTimeMs: Optional[int], endTimeMs: Optional[int],
+        filterColumn: str, filterValue: Optional[int]) -> List[dict]:
+        conditions = ["AccountId = ?"]
+        parameters = [accountId]
+        if filterValue is not None:
+            conditions.append("{} = ?".format(filterColumn))
+            parameters.append(filterValue)
+        if startTimeMs is not None:
+            conditions.append("{} >= ?".format(timeColumn))
+            parameters.append(startTimeMs)
+        if endTimeMs is not None:
+            conditions.append("{} < ?".format(timeColumn))
+            parameters.append(endTimeMs)
+        statement = "SELECT Record FROM {} WHERE {} ORDER BY {}".format(table, " AND ".join(conditions), timeColumn)
+        with self.lock:
+            rows = self.connection.execute(statement, parameters).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+class AccountSync(object):
+    '''
+    Brings an AccountStore up to date with the exchange, fetching only records newer than its
+    high-water marks.
+
+    Trades are walked most recent first with `FoxBitClient.iterAccountTrades` down to the
+    mark. GetAccountTransactions only takes a depth, so the depth starts at
+    `transactionDepth` and doubles until the reply reaches the mark or comes back short
+    (`maxTransactionDepth` caps it). Each kind is stored in one SQLite transaction once it
+    has been fetched completely, so an interrupted sync never advances a mark past records it
+    did not store.
+    '''
+    def __init__(self, client, store: AccountStore, accountId: int, omsId: int,
+        transactionDepth: int = 200, maxTransactionDepth: int = 100000, timeout: float = 5.0):
+        self.client = client
+        self.store = store
+        self.accountId = accountId
+        self.omsId = omsId
+        self.transactionDepth = transactionDepth
+        self.maxTransactionDepth = maxTransactionDepth
+        self.timeout = timeout
+
+    def sync(self) -> dict:
+        return {"trades": self.syncTrades(), "transactions": self.syncTransactions()}
+
+    def syncTrades(self) -> int:
+        highWaterMark = self.store.highWaterMark(self.accountId, "trades")
+        # An incremental run usually ends on the first page, so nothing is requested ahead of it
+        trades = []
+        for trade in self.client.iterAccountTrades(self.accountId, self.omsId,
+            readAhead=2 if highWaterMark is None else 0, timeout=self.timeout):
+            if highWaterMark is not None and trade["TradeId"] <= highWaterMark:
+                break
+            trades.append(trade)
+        self.store.storeTrades(self.accountId, trades)
+        return len(trades)
+
+    def syncTransactions(self) -> int:
+        highWaterMark = self.store.highWaterMark(self.accountId, "transactions")
+        depth = self.transactionDepth
+        while True:
+            transactions = self.client.getAccountTransactions(self.accountId, self.omsId, depth)
+            if transactions is None:
+                raise RuntimeError("GetAccountTransactions failed for account {}.".format(self.accountId))
+            reachedMark = highWaterMark is not None and any(transaction["TransactionId"] <= highWaterMark for transaction in transactions)
+            if reachedMark or len(transactions) < depth or depth >= self.maxTransactionDepth:
+                break
+            depth = min(depth * 2, self.maxTransactionDepth)
+        if highWaterMark is not None and not reachedMark and len(transactions) >= depth:
+            self.client.logger.warning("Account %s has more than %s new transactions; older ones were not synced.",
+                self.accountId, depth)
+        if highWaterMark is not None:
+            transactions = [transaction for transaction in transactions if transaction["TransactionId"] > highWaterMark]
+        self.store.storeTransactions(self.accountId, transactions)
+        return len(transactions)
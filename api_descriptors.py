@@ -13,18 +13,23 @@ class EndPointMethodType(Enum):
 class RotatingQueue(Queue):
     def __init__(self, maxsize=0):
         super().__init__(maxsize=maxsize)
+        self.drops = 0
 
     def put(self, item, block=True, timeout=None):
         if self.full():
             del self.queue[0]
+            self.drops += 1
         super().put(item, block, timeout)
 
 class EndPointMethodDescriptor(object):
     def __init__(self, 
         methodType = EndPointMethodType.Private, 
         methodReplyType = EndPointMethodReplyType.Response, 
-        methodQueue = RotatingQueue(maxsize=100), associatedEvent = "None"):
+        methodQueue = None, associatedEvent = "None", coalesce = False):
         self.methodType = methodType
         self.methodReplyType = methodReplyType
-        self.methodQueue = methodQueue
-        self.associatedEvent = associatedEvent
\ No newline at end of file
+        # Each endpoint gets its own queue unless one is given explicitly
+        self.methodQueue = methodQueue if methodQueue is not None else RotatingQueue(maxsize=100)
+        self.associatedEvent = associatedEvent
+        # Identical concurrent requests share one wire request and its reply (read-only endpoints)
+        self.coalesce = coalesce
\ No newline at end of file
@@ -0,0 +1,240 @@
+from enum import Enum
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from queue import Full, Queue
+from threading import Lock, Thread
+from time import monotonic
+from typing import List, Optional
+
+from message_enums import MakerTaker
+from message_request import OrderFeeRequest
+
+# FeeType values of GetAccountFees rows that apply to each side of a trade
+FEE_TYPES_BY_MAKER_TAKER = {
+    MakerTaker.Maker.value: ("MakerFee", "Flat"),
+    MakerTaker.Taker.value: ("TakerFee", "Flat"),
+}
+
+def enumValue(value):
+    return value.value if isinstance(value, Enum) else value
+
+def orderTypeName(orderType) -> str:
+    # OrderFeeRequest carries the OrderType enum, fee rows its name
+    if isinstance(orderType, Enum):
+        return orderType.name
+    return str(orderType)
+
+class FeeSchedule(object):
+    '''
+    The GetAccountFees rows of one account, resolved per (InstrumentId, MakerTaker, OrderType).
+    A row applies when its InstrumentId is the instrument or 0 and its OrderType is the order
+    type or "Unknown"; the most specific row wins, a MakerFee/TakerFee row over a Flat one,
+    and among the ladder tiers the highest LadderThreshold not above the trailing volume.
+    Resolutions are memoised, so an estimate is a dict lookup and a multiplication.
+    '''
+    def __init__(self, rows: List[dict], loadedAt: float):
+        self.rows = [row for row in rows if row.get("IsActive", True)]
+        self.loadedAt = loadedAt
+        self.tiersByKey = dict()
+
+    def tiers(self, instrumentId: int, makerTaker: str, orderType: str) -> List[dict]:
+        key = (instrumentId, makerTaker, orderType)
+        tiers = self.tiersByKey.get(key)
+        if tiers is None:
+            feeTypes = FEE_TYPES_BY_MAKER_TAKER.get(makerTaker, FEE_TYPES_BY_MAKER_TAKER[MakerTaker.Taker.value])
+            best = None
+            candidates = []
+            for row in self.rows:
+                if row.get("InstrumentId") not in (instrumentId, 0, None):
+                    continue
+                if row.get("OrderType") not in (orderType, "Unknown", "", None):
+                    continue
+                if row.get("FeeType") not in feeTypes:
+                    continue
+                specificity = (
+                    row.get("InstrumentId") == instrumentId,
+                    row.get("OrderType") == orderType,
+                    row.get("FeeType") != "Flat",
+                )
+                if best is None or specificity > best:
+                    best = specificity
+                    candidates = [row]
+                elif specificity == best:
+                    candidates.append(row)
+            tiers = sorted(candidates, key=lambda row: row.get("LadderThreshold") or 0, reverse=True)
+            self.tiersByKey[key] = tiers
+        return tiers
+
+    def rule(self, instrumentId: int, makerTaker: str, orderType: str, trailingVolume: float = 0.0) -> Optional[dict]:
+        for row in self.tiers(instrumentId, makerTaker, orderType):
+            if (row.get("LadderThreshold") or 0) <= trailingVolume:
+                return row
+        return None
+
+class FeeEngine(object):
+    '''
+    Computes order fees in-process from the account fee schedule (GetAccountFees) instead of
+    asking the exchange with GetOrderFee before every order. Schedules are loaded per account on
+    first use and reloaded in the background once older than `ttl` seconds, while the previous
+    one keeps serving estimates. After a failed load the account's schedule is not requested
+    again for `retryDelay` seconds.
+
+    Percentage fees are charged on the traded amount when the fee is denominated in the
+    instrument's base product (Product1) and on the notional (Amount * Price) otherwise;
+    `instrumentProducts` maps InstrumentId to its (Product1, Product2), and the client fills it
+    from GetInstruments.
+
+    With `driftCheckEvery` set, every Nth estimate is also sent to GetOrderFee on a background
+    thread and the difference is recorded in `driftReport()`. Estimates never wait for it.
+    '''
+    def __init__(self, client, ttl: float = 300.0, instrumentProducts: dict = None,
+        driftCheckEvery: int = None, driftTolerance: float = 1e-8, driftTimeout: float = 5.0,
+        loadTimeout: float = 5.0, retryDelay: float = 30.0):
+        self.client = client
+        self.ttl = ttl
+        self.loadTimeout = loadTimeout
+        self.retryDelay = retryDelay
+        self.instrumentProducts = instrumentProducts if instrumentProducts is not None else dict()
+        self.driftCheckEvery = driftCheckEvery
+        self.driftTolerance = driftTolerance
+        self.driftTimeout = driftTimeout
+        self.schedulesByAccount = dict()
+        self.refreshingAccounts = set()
+        self.failedAtByAccount = dict()
+        self.lock = Lock()
+        self.estimates = 0
+        self.driftChecks = 0
+        self.driftMismatches = 0
+        self.maxDrift = 0.0
+        self.lastMismatch = None
+        self.driftQueue = None
+        self.driftThread = None
+
+    # ============== Schedules ================
+    def loadSchedule(self, accountId: int, omsId: int) -> Optional[FeeSchedule]:
+        # Matched to its reply by sequence, so it never races user calls to getAccountFees
+        future = self.client.sendRequestAsync("GetAccountFees", {"AccountId": accountId, "OMSId": omsId})
+        try:
+            rows = future.result(self.loadTimeout)
+        except FutureTimeoutError:
+            rows = None
+        except Exception as e:
+            self.client.logger.warning("Fee schedule of account %s could not be loaded: %s", accountId, e)
+            rows = None
+        finally:
+            # A reply that never came must not stay registered with the client
+            self.client.pendingReplies.pop(future.sequence, None)
+        if not isinstance(rows, list):
+            self.failedAtByAccount[accountId] = monotonic()
+            return None
+        return self.seedSchedule(accountId, rows)
+
+    def seedSchedule(self, accountId: int, rows: List[dict]) -> FeeSchedule:
+        schedule = FeeSchedule(rows, monotonic())
+        self.schedulesByAccount[accountId] = schedule
+        self.failedAtByAccount.pop(accountId, None)
+        return schedule
+
+    def getSchedule(self, accountId: int, omsId: int) -> Optional[FeeSchedule]:
+        schedule = self.schedulesByAccount.get(accountId)
+        failedAt = self.failedAtByAccount.get(accountId)
+        if failedAt is not None and monotonic() - failedAt < self.retryDelay:
+            return schedule
+        if schedule is None:
+            return self.loadSchedule(accountId, omsId)
+        if monotonic() - schedule.loadedAt > self.ttl:
+            self.refreshInBackground(accountId, omsId)
+        return schedule
+
+    def refreshInBackground(self, accountId: int, omsId: int):
+        with self.lock:
+            if accountId in self.refreshingAccounts:
+                return
+            self.refreshingAccounts.add(accountId)
+
+        def refresh():
+            try:
+                self.loadSchedule(accountId, omsId)
+            finally:
+                with self.lock:
+                    self.refreshingAccounts.discard(accountId)
+
+        Thread(target=refresh, daemon=True).start()
+
+    def invalidate(self, accountId: int = None):
+        if accountId is None:
+            self.schedulesByAccount.clear()
+        else:
+            self.schedulesByAccount.pop(accountId, None)
+
+    # ============== Estimates ================
+    # Same result as FoxBitClient.getOrderFee ({"OrderFee", "ProductId"}), None when the
+    # schedule cannot be loaded
+    def getOrderFee(self, orderFeeRequest: OrderFeeRequest, trailingVolume: float = 0.0) -> Optional[dict]:
+        schedule = self.getSchedule(orderFeeRequest.AccountId, orderFeeRequest.OMSId)
+        if schedule is None:
+            return None
+        rule = schedule.rule(
+            orderFeeRequest.InstrumentId,
+            enumValue(orderFeeRequest.MakerTaker),
+            orderTypeName(orderFeeRequest.OrderType),
+            trailingVolume)
+        fee = 0.0
+        if rule is not None:
+            if rule.get("FeeCalcType") == "FlatRate":
+                fee = rule["FeeAmt"]
+            else:
+                products = self.instrumentProducts.get(orderFeeRequest.InstrumentId)
+                if products is not None and orderFeeRequest.ProductId == products[0]:
+                    fee = orderFeeRequest.Amount * rule["FeeAmt"]
+                else:
+                    fee = orderFeeRequest.Amount * orderFeeRequest.Price * rule["FeeAmt"]
+        result = {"OrderFee": fee, "ProductId": orderFeeRequest.ProductId}
+        self.estimates += 1
+        if self.driftCheckEvery and self.estimates % self.driftCheckEvery == 0:
+            self.queueDriftCheck(orderFeeRequest, result)
+        return result
+
+    # ============== Drift ================
+    def queueDriftCheck(self, orderFeeRequest: OrderFeeRequest, estimate: dict):
+        if self.driftThread is None:
+            with self.lock:
+                if self.driftThread is None:
+                    self.driftQueue = Queue(maxsize=100)
+                    self.driftThread = Thread(target=self.runDriftChecks, daemon=True)
+                    self.driftThread.start()
+        try:
+            self.driftQueue.put_nowait((orderFeeRequest, estimate))
+        except Full:
+            pass
+
+    def runDriftChecks(self):
+        while True:
+            orderFeeRequest, estimate = self.driftQueue.get()
+            future = None
+            try:
+                future = self.client.sendRequestAsync("GetOrderFee", orderFeeRequest)
+                response = future.result(self.driftTimeout)
+            except Exception:
+                continue
+            finally:
+                if future is not None:
+                    self.client.pendingReplies.pop(future.sequence, None)
+            if not isinstance(response, dict) or "OrderFee" not in response:
+                continue
+            drift = estimate["OrderFee"] - response["OrderFee"]
+            self.driftChecks += 1
+            self.maxDrift = max(self.maxDrift, abs(drift))
+            if abs(drift) > self.driftTolerance:
+                self.driftMismatches += 1
+                self.lastMismatch = {"request": orderFeeRequest, "estimate": estimate["OrderFee"], "exchange": response["OrderFee"]}
+                self.client.logger.warning("Local fee %s differs from GetOrderFee %s for %s",
+                    estimate["OrderFee"], response["OrderFee"], orderFeeRequest)
+
+    def driftReport(self) -> dict:
+        return {
+            "estimates": self.estimates,
+            "checks": self.driftChecks,
+            "mismatches": self.driftMismatches,
+            "maxDrift": self.maxDrift,
+            "lastMismatch": self.lastMismatch,
+        }
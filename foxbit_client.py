@@ -1,25 +1,46 @@
-from threading import Thread
-from queue import Empty
+from threading import Event, Lock, Thread
+from queue import Empty, Queue
 from datetime import datetime
-from time import sleep
-import websocket
-import websocket._logging as wsLogging
+from time import monotonic, perf_counter_ns
 import json
-from typing import Union, Any, List, Tuple
+from typing import TYPE_CHECKING, Union, Any, Dict, Iterator, List, Tuple
 import hmac
 import hashlib
+from logging import DEBUG
 
+from account_cache import AccountCache
+from account_store import AccountStore, AccountSync
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
 from api_descriptors import EndPointMethodDescriptor, EndPointMethodReplyType, EndPointMethodType, RotatingQueue
-from log_service import DefaultLogger, WebSocketLogger
-from message_enums import MessageType
+from log_service import DefaultLogger, LogRetentionPolicy, LogSampler, WebSocketLogger
+from metrics_service import ClientMetrics, MetricsHttpServer
+from trace_service import TraceHooks, TraceStage
+from frame_journal import FrameDirection, FrameRecorder, JournalCompression
+from frame_replay import FrameReplayer
+from fee_engine import FeeEngine
+from reference_data import ReferenceData
+from session_snapshot import SessionSnapshot
+from ticket_cache import TicketCache
+from ticket_watcher import TicketWatcher
+from message_enums import MessageType, Side
 from message_frame import MessageFrame
-from message_request import CancelReplaceOrderRequest, \
+from message_result import AccountTradesResult, AllDepositTicketsResult, AllWithdrawTicketsResult
+from order_template import OrderTemplate
+from order_tracker import OrderHandle, OrderTracker, ReplyDeadlines
+from order_validator import OrderValidator
+from pagination import ROW_FORMATS, iterRows, readPages
+from message_request import AllDepositOrWithdrawTicketsRequest, CancelReplaceOrderRequest, \
     OrderFeeRequest, SendOrderRequest
 
-from helpers import formatTicks, formatL2Snapshots
+from helpers import canonicalJson, failFuture, formatTicks, formatL2Snapshots, resolveFuture
+
+if TYPE_CHECKING:
+    import websocket
 
 MAX_QUEUE_SIZE = 100
+EVENT_LOG_MAX_PER_SECOND = 10
 ONE_SHOT_TIMEOUT = 5.0
+MAX_ACCOUNT_TRADES_PAGE = 200
 
 class FoxBitClient(object):
     sequenceByMessageType = {
@@ -30,6 +51,8 @@ class FoxBitClient(object):
         MessageType.Unsubscribe: 0,
         MessageType.Error: 0,
     }
+    # Sequence numbers are shared by every client, so is the lock that assigns them
+    sequenceLock = Lock()
     endPointDescriptorByMethod = {
         # Private
         "GetAvailablePermissionList": EndPointMethodDescriptor(),
@@ -53,6 +76,8 @@ class FoxBitClient(object):
         "GetOrderHistory": EndPointMethodDescriptor(),
         "GetDepositTickets": EndPointMethodDescriptor(),
         "GetWithdrawTickets": EndPointMethodDescriptor(),
+        "GetAllDepositTickets": EndPointMethodDescriptor(),
+        "GetAllWithdrawTickets": EndPointMethodDescriptor(),
         "GetDepositTicket": EndPointMethodDescriptor(),
         "GetWithdrawTicket": EndPointMethodDescriptor(),
         # Public
@@ -85,36 +110,43 @@ class FoxBitClient(object):
           methodReplyType=EndPointMethodReplyType.Response,
           methodQueue=RotatingQueue(maxsize=MAX_QUEUE_SIZE),
           methodType=EndPointMethodType.Public,
+          coalesce=True,
         ),
         "GetInstrument": EndPointMethodDescriptor(
           methodReplyType=EndPointMethodReplyType.Response,
           methodQueue=RotatingQueue(maxsize=MAX_QUEUE_SIZE),
           methodType=EndPointMethodType.Public,
+          coalesce=True,
         ),
         "GetInstruments": EndPointMethodDescriptor(
           methodReplyType=EndPointMethodReplyType.Response,
           methodQueue=RotatingQueue(maxsize=MAX_QUEUE_SIZE),
           methodType=EndPointMethodType.Public,
+          coalesce=True,
         ),
         "GetProduct": EndPointMethodDescriptor(
           methodReplyType=EndPointMethodReplyType.Response,
           methodQueue=RotatingQueue(maxsize=MAX_QUEUE_SIZE),
           methodType=EndPointMethodType.Public,
+          coalesce=True,
         ),
         "GetProducts": EndPointMethodDescriptor(
           methodReplyType=EndPointMethodReplyType.Response,
           methodQueue=RotatingQueue(maxsize=MAX_QUEUE_SIZE),
           methodType=EndPointMethodType.Public,
+          coalesce=True,
         ),
         "GetL2Snapshot": EndPointMethodDescriptor(
           methodReplyType=EndPointMethodReplyType.Response,
           methodQueue=RotatingQueue(maxsize=MAX_QUEUE_SIZE),
           methodType=EndPointMethodType.Public,
+          coalesce=True,
         ),
         "GetTickerHistory": EndPointMethodDescriptor(
           methodReplyType=EndPointMethodReplyType.Response,
           methodQueue=RotatingQueue(maxsize=MAX_QUEUE_SIZE),
           methodType=EndPointMethodType.Public,
+          coalesce=True,
         ),
         "SubscribeLevel1": EndPointMethodDescriptor(
           methodReplyType=EndPointMethodReplyType.ResponseAndEvent,
@@ -157,14 +189,70 @@ class FoxBitClient(object):
           methodReplyType=EndPointMethodReplyType.Response,
           methodQueue=RotatingQueue(maxsize=MAX_QUEUE_SIZE),
           methodType=EndPointMethodType.Public,
+        ),
+        "SubscribeAccountEvents": EndPointMethodDescriptor(
+          methodReplyType=EndPointMethodReplyType.ResponseAndEvent,
+          methodQueue=RotatingQueue(maxsize=MAX_QUEUE_SIZE),
+          methodType=EndPointMethodType.Private,
+        ),
+        # Account events, each one on its own queue
+        "OrderStateEvent": EndPointMethodDescriptor(
+          methodReplyType=EndPointMethodReplyType.Event,
+          methodQueue=RotatingQueue(maxsize=MAX_QUEUE_SIZE),
+          methodType=EndPointMethodType.Private,
+        ),
+        "OrderTradeEvent": EndPointMethodDescriptor(
+          methodReplyType=EndPointMethodReplyType.Event,
+          methodQueue=RotatingQueue(maxsize=MAX_QUEUE_SIZE),
+          methodType=EndPointMethodType.Private,
+        ),
+        "AccountPositionEvent": EndPointMethodDescriptor(
+          methodReplyType=EndPointMethodReplyType.Event,
+          methodQueue=RotatingQueue(maxsize=MAX_QUEUE_SIZE),
+          methodType=EndPointMethodType.Private,
+        ),
+        "NewOrderRejectEvent": EndPointMethodDescriptor(
+          methodReplyType=EndPointMethodReplyType.Event,
+          methodQueue=RotatingQueue(maxsize=MAX_QUEUE_SIZE),
+          methodType=EndPointMethodType.Private,
+        ),
+        "CancelOrderRejectEvent": EndPointMethodDescriptor(
+          methodReplyType=EndPointMethodReplyType.Event,
+          methodQueue=RotatingQueue(maxsize=MAX_QUEUE_SIZE),
+          methodType=EndPointMethodType.Private,
+        ),
+        "CancelReplaceOrderRejectEvent": EndPointMethodDescriptor(
+          methodReplyType=EndPointMethodReplyType.Event,
+          methodQueue=RotatingQueue(maxsize=MAX_QUEUE_SIZE),
+          methodType=EndPointMethodType.Private,
+        ),
+        "CancelAllOrdersRejectEvent": EndPointMethodDescriptor(
+          methodReplyType=EndPointMethodReplyType.Event,
+          methodQueue=RotatingQueue(maxsize=MAX_QUEUE_SIZE),
+          methodType=EndPointMethodType.Private,
+        ),
+        "TransactionEvent": EndPointMethodDescriptor(
+          methodReplyType=EndPointMethodReplyType.Event,
+          methodQueue=RotatingQueue(maxsize=MAX_QUEUE_SIZE),
+          methodType=EndPointMethodType.Private,
+        ),
+        "AccountInfoUpdateEvent": EndPointMethodDescriptor(
+          methodReplyType=EndPointMethodReplyType.Event,
+          methodQueue=RotatingQueue(maxsize=MAX_QUEUE_SIZE),
+          methodType=EndPointMethodType.Private,
+        ),
+        "PendingDepositUpdate": EndPointMethodDescriptor(
+          methodReplyType=EndPointMethodReplyType.Event,
+          methodQueue=RotatingQueue(maxsize=MAX_QUEUE_SIZE),
+          methodType=EndPointMethodType.Private,
         )
     }
 
-    socket: websocket.WebSocket
+    socket: "websocket.WebSocketApp"
     logger: DefaultLogger
     connectionLogger: WebSocketLogger
 
-    def __init__(self, enableConnLog=True):
+    def __init__(self, enableConnLog=True, enableMetrics=True, logLevel=DEBUG, logRetention: LogRetentionPolicy = None):
         # Only alias for SubscribeLevel1
         self.endPointDescriptorByMethod["Level1UpdateEvent"] = self.endPointDescriptorByMethod["SubscribeLevel1"]
         # Only alias for SubscribeLevel2
@@ -174,12 +262,44 @@ class FoxBitClient(object):
         # Only alias for SubscribeTrade
         self.endPointDescriptorByMethod["TradeDataUpdateEvent"] = self.endPointDescriptorByMethod["SubscribeTrades"]
         self.enableConnLog = enableConnLog
-        self.logger = DefaultLogger()
-        self.connectionLogger = WebSocketLogger()
+        self.logger = DefaultLogger(level=logLevel, retention=logRetention)
+        # Request/reply frames are always logged, each event stream at most this often
+        self.logSampler = LogSampler(defaultMaxPerSecond=EVENT_LOG_MAX_PER_SECOND)
+        self.connectionLogger = WebSocketLogger(retention=logRetention)
         self.connectQueue = RotatingQueue(maxsize=MAX_QUEUE_SIZE)
+        self.socket = None
         self.thread = None
+        self.opened = Event()
         self.userId = None
         self.sessionToken = None
+        self.metrics = None
+        self.metricsServer = None
+        self.traceHooks = TraceHooks()
+        self.frameRecorder = None
+        self.eventHandlersByFunction = dict()
+        self.eventHandlersLock = Lock()
+        self.accountCache = None
+        # Futures of requests sent with sendRequestAsync, by sequence number
+        self.pendingReplies = dict()
+        # Futures of coalesced reads in flight, by (endpoint name, canonical payload)
+        self.inFlightReads = dict()
+        self.inFlightReadsLock = Lock()
+        self.orderTracker = None
+        # SendOrder replies of submitted orders fail after ONE_SHOT_TIMEOUT, as sendOrder gives up
+        self.orderReplyDeadlines = ReplyDeadlines(ONE_SHOT_TIMEOUT, self.expireOrderReply)
+        self.feeEngine = None
+        self.referenceDataByOms = dict()
+        self.orderValidator = None
+        self.ticketCache = TicketCache()
+        if enableMetrics:
+          self.metrics = ClientMetrics()
+          self.metrics.watchQueue("Connect", self.connectQueue)
+          watchedQueues = set()
+          # Event aliases share their subscription queue, so watch each queue only once
+          for endPointName, endPointDescriptor in self.endPointDescriptorByMethod.items():
+            if id(endPointDescriptor.methodQueue) not in watchedQueues:
+              watchedQueues.add(id(endPointDescriptor.methodQueue))
+              self.metrics.watchQueue(endPointName, endPointDescriptor.methodQueue)
 
     def is_error_message(self, message_payload: dict) -> bool:
       return ("errorcode" in message_payload and "result" in message_payload and message_payload["errorcode"])
@@ -192,6 +312,9 @@ class FoxBitClient(object):
     * @memberof FoxBitClient
     '''
     def connect(self, url: str = "wss://api.foxbit.com.br") -> bool:
+        # websocket-client is only imported when a connection is actually made
+        import websocket
+        import websocket._logging as wsLogging
         if self.enableConnLog:
           websocket.enableTrace(True, handler=self.connectionLogger.handlers[-1])
           wsLogging._logger = self.connectionLogger
@@ -204,14 +327,18 @@ class FoxBitClient(object):
                 on_close=self.onClose,
                 on_error=self.onError
             )
+            self.opened.clear()
             self.thread = Thread(target=self.socket.run_forever, args=(None, None, 30, 25), daemon=True)
             self.thread.start()
+            # Woken by onOpen as soon as the handshake completes
             while not self.isConnected():
-              sleep(1)
+              if not self.thread.is_alive():
+                raise ConnectionError("Socket closed before the handshake completed.")
+              self.opened.wait(0.1)
         except Exception as e:
             connected = False
             print("Not possible to establish connection with {:s}".format(url))
-            self.logger.warning("Not possible to establish connection with {:s}".format(url))
+            self.logger.warning("Not possible to establish connection with %s", url)
 
         return connected
 
@@ -232,23 +359,26 @@ class FoxBitClient(object):
     '''
     def disconnect(self):
         if self.isConnected():
-            self.socket.close(status=websocket.STATUS_NORMAL)
+            from websocket import STATUS_NORMAL
+            self.socket.close(status=STATUS_NORMAL)
             self.thread.join()
 
     # Open event handler
     def onOpen(self, socket):
         #print("Connection established.")
         self.logger.info("Connection established.")
+        self.opened.set()
 
     # Close event handler
     def onClose(self, socket, status_code, close_message):
         if status_code is not None and status_code > 1000:
           #print("Connection terminated. Status code {:d}: {:s}".format(status_code, close_message))
-          self.logger.info("Connection terminated. Status code {:d}: {:s}".format(status_code, close_message))
+          self.logger.info("Connection terminated. Status code %d: %s", status_code, close_message)
         else:
           #print("Connection terminated normally.")
           self.logger.info("Connection terminated normally.")
 
+        self.failPendingReplies(ConnectionError("Connection closed."))
         if status_code is not None and status_code != 0:
           for prop in self.endPointDescriptorByMethod.keys():
             endPointDescriptorByMethod = self.endPointDescriptorByMethod[prop]
@@ -257,17 +387,38 @@ class FoxBitClient(object):
     # Error event handler
     def onError(self, socket, error):
       print("Socket error: {}".format(error))
-      self.logger.error("Socket error: {}".format(error))
+      self.logger.error("Socket error: %s", error)
       self.connectQueue.put(error)
+      self.failPendingReplies(ConnectionError("Socket error: {}".format(error)))
 
       for prop in self.endPointDescriptorByMethod.keys():
         endPointDescriptorByMethod = self.endPointDescriptorByMethod[prop]
         endPointDescriptorByMethod.methodQueue.put(error)
 
     def onMessage(self, socket, message):
-      self.logger.debug("Message received (raw): {}".format(message))
-
+      # Read once: stopRecording may clear it from another thread
+      recorder = self.frameRecorder
+      if recorder is not None:
+        recorder.record(FrameDirection.Inbound, message)
+      metrics = self.metrics
+      tracing = self.traceHooks.active
+      if metrics is not None or tracing:
+        receivedAt = perf_counter_ns()
       response_json = json.loads(message)
+      if tracing:
+        envelopeDecodedAt = perf_counter_ns()
+      # Formatting is deferred to the log writer thread and skipped entirely below DEBUG.
+      # Replies are always logged, event streams only as often as the sampler admits them.
+      logFrame = self.logger.isEnabledFor(DEBUG)
+      if logFrame:
+        suppressed = 0
+        if response_json['m'] == MessageType.Event.value:
+          suppressed = self.logSampler.admit(response_json['n'])
+          logFrame = suppressed is not None
+        if logFrame and suppressed:
+          self.logger.debug("Message received (raw, %d suppressed): %s", suppressed, message)
+        elif logFrame:
+          self.logger.debug("Message received (raw): %s", message)
       response = MessageFrame(
         messageType=response_json['m'], 
         functionName=response_json['n'], 
@@ -275,19 +426,54 @@ class FoxBitClient(object):
         sequence=response_json['i'])
       if response.payload:
         response.payload = json.loads(response.payload)
-      self.logger.debug("Message received (parsed): {}".format(response.payload))
+      if metrics is not None or tracing:
+        payloadDecodedAt = perf_counter_ns()
+      if metrics is not None:
+        metrics.recordDecode(payloadDecodedAt - receivedAt)
+        metrics.countMessage(response.functionName)
+      if tracing:
+        # The function name is only known after decoding, so the earlier stages fire late
+        self.traceHooks.emit(TraceStage.Receive, response.functionName, response.sequence, receivedAt)
+        self.traceHooks.emit(TraceStage.EnvelopeDecode, response.functionName, response.sequence, envelopeDecodedAt)
+        self.traceHooks.emit(TraceStage.PayloadDecode, response.functionName, response.sequence, payloadDecodedAt)
+      if logFrame:
+        self.logger.debug("Message received (parsed): %s", response.payload)
 
       endPointDescriptorByMethod = self.endPointDescriptorByMethod[response.functionName]
-
-      if self.is_error_message(response.payload):
+      # Replies to asynchronous requests go to their future instead of the endpoint queue
+      pendingReply = None
+      if self.pendingReplies and response.messageType == MessageType.Reply.value:
+        pendingReply = self.pendingReplies.pop(response.sequence, None)
+
+      if pendingReply is not None:
+        if self.is_error_message(response.payload):
+          err = response.payload
+          self.logger.error("Error %s: %s %s", err["errorcode"], err["errormsg"], err["detail"])
+        # The caller may have cancelled the future meanwhile; its reply is simply dropped
+        resolveFuture(pendingReply, response.payload)
+      elif self.is_error_message(response.payload):
         # GenericResponse
         err = response.payload
         print("Error {}: {} {}".format(err["errorcode"], err["errormsg"], err["detail"]))
-        self.logger.error("Error {}: {} {}".format(err["errorcode"], err["errormsg"], err["detail"]))
+        self.logger.error("Error %s: %s %s", err["errorcode"], err["errormsg"], err["detail"])
         endPointDescriptorByMethod.methodQueue.put(err)
       else:
+        # Handlers (e.g. the account cache) see an event before queue consumers do
+        handlers = self.eventHandlersByFunction.get(response.functionName)
+        if handlers:
+          for handler in handlers:
+            try:
+              handler(response.payload)
+            except Exception:
+              self.logger.exception("Event handler failed for %s", response.functionName)
         endPointDescriptorByMethod.methodQueue.put(response.payload)
-        
+
+      if metrics is not None or tracing:
+        dispatchedAt = perf_counter_ns()
+        if metrics is not None and response.messageType == MessageType.Reply.value:
+          metrics.markReply(response.functionName, response.sequence, dispatchedAt)
+        if tracing:
+          self.traceHooks.emit(TraceStage.Dispatch, response.functionName, response.sequence, dispatchedAt)
       return
 
     def calculateMessageFrameSequence(self, messageFrame: MessageFrame):
@@ -300,18 +486,95 @@ class FoxBitClient(object):
         self.sequenceByMessageType[messageFrame.messageType] += 1
         messageFrame.sequence = self.sequenceByMessageType[messageFrame.messageType]
 
-    def prepareAndSendFrame(self, frame: MessageFrame):
-      self.calculateMessageFrameSequence(frame)
-      frameStr = frame.to_json()
-
-      self.logger.debug("Message sent: {}".format(frameStr))
-      # Reset RotatingQueue
-      with self.endPointDescriptorByMethod[frame.functionName].methodQueue.mutex:
-        self.endPointDescriptorByMethod[frame.functionName].methodQueue.queue.clear()
+    def prepareAndSendFrame(self, frame: MessageFrame, pendingReply: Future = None):
+      with self.sequenceLock:
+        self.calculateMessageFrameSequence(frame)
+      self.sendEncodedFrame(frame.functionName, frame.sequence, frame.to_json(), pendingReply)
+
+    def nextRequestSequence(self) -> int:
+      with self.sequenceLock:
+        self.sequenceByMessageType[MessageType.Request] += 2
+        return self.sequenceByMessageType[MessageType.Request]
+
+    # Sends a frame that is already encoded (by MessageFrame.to_json or an OrderTemplate)
+    def sendEncodedFrame(self, functionName: str, sequence: int, frameStr: str, pendingReply: Future = None):
+      if self.logger.isEnabledFor(DEBUG):
+        self.logger.debug("Message sent: %s", frameStr)
+      if pendingReply is not None:
+        # Registered before sending, so the reply cannot arrive first
+        self.pendingReplies[sequence] = pendingReply
+      else:
+        # Reset RotatingQueue
+        with self.endPointDescriptorByMethod[functionName].methodQueue.mutex:
+          self.endPointDescriptorByMethod[functionName].methodQueue.queue.clear()
       # Send message
-      self.socket.send(frameStr)
+      tracing = self.traceHooks.active
+      if self.metrics is not None or tracing:
+        sentAt = perf_counter_ns()
+        if self.metrics is not None:
+          self.metrics.markSent(functionName, sequence, sentAt)
+      try:
+        self.socket.send(frameStr)
+      except Exception:
+        if pendingReply is not None:
+          self.pendingReplies.pop(sequence, None)
+        raise
+      recorder = self.frameRecorder
+      if recorder is not None:
+        recorder.record(FrameDirection.Outbound, frameStr)
+      if tracing:
+        self.traceHooks.emit(TraceStage.Send, functionName, sequence, sentAt)
       return
 
+    '''
+    * Sends a request without waiting for its reply. The reply is matched to the request by
+    * sequence number, so any number of requests, to the same endpoint or not, can be in flight
+    * at once and none of them goes through the endpoint queue. The future resolves with the
+    * reply payload (error payloads included, as getResponse returns them) and fails with
+    * ConnectionError if the connection breaks first.
+    *
+    * @param {string} endPointName
+    * @param {Any} payload Request payload (dict or request dataclass)
+    * @returns {Future}
+    * @memberof FoxBitClient
+    '''
+    def sendRequestAsync(self, endPointName: str, payload: Any) -> Future:
+      future = Future()
+      frame = MessageFrame(MessageType.Request, endPointName, payload)
+      self.prepareAndSendFrame(frame, pendingReply=future)
+      future.sequence = frame.sequence
+      return future
+
+    def getAsyncResponses(self, futures: List[Future], timeout: float = ONE_SHOT_TIMEOUT) -> List[Any]:
+      # Waits for every future against a single deadline; a reply that does not arrive in time
+      # (or a broken connection) gives None, as getResponse does
+      deadline = monotonic() + timeout
+      responses = []
+      for future in futures:
+        try:
+          responses.append(future.result(max(0.0, deadline - monotonic())))
+        except Exception:
+          self.pendingReplies.pop(getattr(future, "sequence", None), None)
+          responses.append(None)
+      if any(response is None for response in responses):
+        print("{:d} of {:d} asynchronous requests timed out.".format(
+          sum(1 for response in responses if response is None), len(responses)))
+      return responses
+
+    # Forgets requests whose replies are no longer wanted
+    def cancelPendingReplies(self, futures: List[Future]):
+      for future in futures:
+        self.pendingReplies.pop(getattr(future, "sequence", None), None)
+        future.cancel()
+
+    def failPendingReplies(self, error: BaseException):
+      while self.pendingReplies:
+        try:
+          _, future = self.pendingReplies.popitem()
+        except KeyError:
+          break
+        failFuture(future, error)
+
     def getResponse(self, endPointName: str) -> Any:
       response = None
       try:
@@ -321,6 +584,188 @@ class FoxBitClient(object):
 
       return response
 
+    '''
+    * Sends a request and waits for its reply, like prepareAndSendFrame followed by getResponse.
+    * On endpoints whose descriptor has `coalesce` set, a call made while an identical request
+    * (same endpoint, same payload whatever its key order) is in flight sends nothing: it waits
+    * for that request's reply, within that request's timeout, and gets the same reply object,
+    * which callers must therefore not modify. Coalesced requests are matched by sequence number,
+    * so they never race on the endpoint queue.
+    *
+    * @param {string} endPointName
+    * @param {Any} payload Request payload (dict or request dataclass)
+    * @returns {Any} The reply payload, None on timeout
+    * @memberof FoxBitClient
+    '''
+    def requestReply(self, endPointName: str, payload: Any) -> Any:
+      if not self.endPointDescriptorByMethod[endPointName].coalesce:
+        self.prepareAndSendFrame(MessageFrame(MessageType.Request, endPointName, payload))
+        return self.getResponse(endPointName)
+
+      key = (endPointName, canonicalJson(payload))
+      with self.inFlightReadsLock:
+        future = self.inFlightReads.get(key)
+        sendRequest = future is None
+        if sendRequest:
+          future = self.inFlightReads[key] = Future()
+          future.deadline = monotonic() + ONE_SHOT_TIMEOUT
+      if sendRequest:
+        # Later callers join until the reply (or the failure) resolves the future
+        future.add_done_callback(lambda done: self.forgetInFlightRead(key, done))
+        frame = MessageFrame(MessageType.Request, endPointName, payload)
+        try:
+          self.prepareAndSendFrame(frame, pendingReply=future)
+        except Exception as e:
+          # failPendingReplies may have failed the future already
+          failFuture(future, e)
+          raise
+        future.sequence = frame.sequence
+
+      try:
+        return future.result(max(0.0, future.deadline - monotonic()))
+      except FutureTimeoutError:
+        # The first waiter to give up fails the request for all of them; if the reply is being
+        # dispatched at that moment it resolves the future instead
+        if self.pendingReplies.pop(getattr(future, "sequence", None), None) is not None:
+          failFuture(future, FutureTimeoutError("Method '{}' timed out.".format(endPointName)))
+        print("Method \'{:s}\' timed out.".format(endPointName))
+      except Exception as e:
+        # e.g. the ConnectionError of a broken connection, shared by every waiter
+        self.logger.error("Method '%s' failed: %r", endPointName, e)
+      return None
+
+    def forgetInFlightRead(self, key: Tuple[str, str], future: Future):
+      with self.inFlightReadsLock:
+        if self.inFlightReads.get(key) is future:
+          del self.inFlightReads[key]
+
+    '''
+    * Returns a snapshot of the client instrumentation: request latency percentiles per endpoint
+    * (in nanoseconds), inbound message counts and rates per function name, frame decode time,
+    * the depth and drop count of every endpoint queue and the event messages left out of the log.
+    *
+    * @returns {Dict} (None when the client was created with enableMetrics=False)
+    * @memberof FoxBitClient
+    '''
+    def getStats(self) -> dict:
+      if self.metrics is None:
+        return None
+      stats = self.metrics.snapshot()
+      stats["logSuppressed"] = self.logSampler.suppressedCounts()
+      return stats
+
+    '''
+    * Serves the client instrumentation over HTTP on a local address, in the Prometheus text
+    * format at /metrics and as JSON at /stats.
+    *
+    * @param {string} [host='127.0.0.1']
+    * @param {number} [port=9464] Use 0 to bind any free port
+    * @returns {MetricsHttpServer}
+    * @memberof FoxBitClient
+    '''
+    def startMetricsServer(self, host: str = "127.0.0.1", port: int = 9464) -> MetricsHttpServer:
+      if self.metrics is None:
+        raise RuntimeError("Metrics are disabled for this client.")
+      if self.metricsServer is None:
+        self.metricsServer = MetricsHttpServer(self.metrics, host=host, port=port).start()
+      return self.metricsServer
+
+    def stopMetricsServer(self):
+      if self.metricsServer is not None:
+        self.metricsServer.stop()
+        self.metricsServer = None
+
+    '''
+    * Sets how often DEBUG logging records the frames of one event stream: every Nth message,
+    * at most maxPerSecond messages per second, or both. Leaving both unset logs every frame.
+    * Streams that are not configured are logged at most EVENT_LOG_MAX_PER_SECOND times per
+    * second; request replies are never sampled.
+    *
+    * @param {string} functionName Event name, e.g. Level2UpdateEvent
+    * @param {number} [everyN]
+    * @param {number} [maxPerSecond]
+    * @memberof FoxBitClient
+    '''
+    def setEventLogSampling(self, functionName: str, everyN: int = None, maxPerSecond: float = None):
+      self.logSampler.configure(functionName, everyN=everyN, maxPerSecond=maxPerSecond)
+
+    '''
+    * Registers a tracing hook called as hook(stage, functionName, sequence, timestampNs) at the
+    * Send, Receive, EnvelopeDecode, PayloadDecode and Dispatch stages of the hot path, with
+    * timestamps taken from time.perf_counter_ns. Hooks run inline on the sending or socket
+    * thread and must not block. Nothing is timestamped while no hook is registered.
+    *
+    * @param {Callable} hook
+    * @param {List[TraceStage]} [stages] Stages to hook, all of them by default
+    * @memberof FoxBitClient
+    '''
+    def addTraceHook(self, hook, stages: List[TraceStage] = None):
+      self.traceHooks.register(hook, stages)
+
+    def removeTraceHook(self, hook, stages: List[TraceStage] = None):
+      self.traceHooks.unregister(hook, stages)
+
+    '''
+    * Registers a handler called as handler(payload) on the socket thread for every message
+    * received with the given function name, before the payload is put on its queue. Handlers
+    * must be quick and must not block; an exception raised by one is logged and ignored.
+    *
+    * @param {string} functionName e.g. "OrderStateEvent"
+    * @param {Callable} handler
+    * @memberof FoxBitClient
+    '''
+    def addEventHandler(self, functionName: str, handler):
+      with self.eventHandlersLock:
+        handlers = self.eventHandlersByFunction.get(functionName, ())
+        if handler not in handlers:
+          self.eventHandlersByFunction[functionName] = handlers + (handler,)
+
+    def removeEventHandler(self, functionName: str, handler):
+      with self.eventHandlersLock:
+        handlers = tuple(h for h in self.eventHandlersByFunction.get(functionName, ()) if h != handler)
+        if handlers:
+          self.eventHandlersByFunction[functionName] = handlers
+        else:
+          self.eventHandlersByFunction.pop(functionName, None)
+
+    '''
+    * Starts recording every inbound and outbound websocket frame to an append-only binary
+    * journal (see frame_journal.py). The receive path only appends to an in-memory buffer;
+    * a background thread encodes, compresses and writes it.
+    *
+    * @param {string} path Journal file, appended to if it already exists
+    * @param {JournalCompression} [compression=JournalCompression.Zlib]
+    * @returns {FrameRecorder}
+    * @memberof FoxBitClient
+    '''
+    def startRecording(self, path: str, compression: JournalCompression = JournalCompression.Zlib) -> FrameRecorder:
+      self.stopRecording()
+      recorder = self.frameRecorder = FrameRecorder(path, compression=compression).start()
+      return recorder
+
+    '''
+    * Stops recording frames, writing out whatever is still buffered.
+    *
+    * @memberof FoxBitClient
+    '''
+    def stopRecording(self):
+      recorder = self.frameRecorder
+      if recorder is not None:
+        self.frameRecorder = None
+        recorder.stop()
+
+    '''
+    * Replays the inbound frames of a recorded journal through onMessage, driving the
+    * subscription queues and every consumer attached to them without a connection.
+    *
+    * @param {string} path Journal written by startRecording
+    * @param {number} [speed=1.0] 1.0 is real time, N is N times faster, None is as fast as possible
+    * @returns {Dict} Number of frames replayed, elapsed seconds and frames per second
+    * @memberof FoxBitClient
+    '''
+    def replayJournal(self, path: str, speed: float = 1.0) -> dict:
+      return FrameReplayer(self, path, speed=speed).run()
+
     '''
     * Logout ends the current websocket session
     * **********************
@@ -479,6 +924,28 @@ class FoxBitClient(object):
 
       return resetTriggered
 
+    '''
+    * Returns the instrument and product cache of an Order Management System (see
+    * reference_data.py), loaded from GetInstruments and GetProducts on first use and reloaded in
+    * the background every `ttl` seconds. Lookups by InstrumentId, Symbol, ProductId or product
+    * symbol are dict accesses with no round-trip.
+    * @param {number} omsId
+    * @param {number} [ttl=3600] Seconds before the data is reloaded (applies when the cache is created).
+    * @returns {ReferenceData}
+    * @memberof FoxBitClient
+    '''
+    def getReferenceData(self, omsId: int, ttl: float = 3600.0) -> ReferenceData:
+      referenceData = self.referenceDataByOms.get(omsId)
+      if referenceData is None:
+        referenceData = self.referenceDataByOms.setdefault(omsId, ReferenceData(self, omsId, ttl=ttl))
+      return referenceData
+
+    # Endpoints taking an instrument accept its symbol too, resolved from the reference data
+    def resolveInstrumentId(self, omsId: int, instrumentIdOrSymbol: Union[int, str]) -> int:
+      if isinstance(instrumentIdOrSymbol, str):
+        return self.getReferenceData(omsId).resolveInstrumentId(instrumentIdOrSymbol)
+      return instrumentIdOrSymbol
+
     '''
     * Retrieves Fee structure for specific Account
     * **********************
@@ -490,15 +957,11 @@ class FoxBitClient(object):
     '''
     def getAccountFees(self, accountId: int, omsId: int) -> Union[List[dict], dict]:
       endPointName = "GetAccountFees"
-      frame = MessageFrame(MessageType.Request, endPointName, 
+      response = self.requestReply(endPointName, 
         {
           "AccountId": accountId,
           "OMSId": omsId,
         })
-
-      self.prepareAndSendFrame(frame)
-
-      response = self.getResponse(endPointName)
       fees = None
       if response is not None and not self.is_error_message(response):
         fees = response
@@ -517,16 +980,19 @@ class FoxBitClient(object):
     * @memberof FoxBitClient
     '''
     def getProduct(self, omsId: int, productId: int) -> dict:
+      # Served from the reference data; the exchange is asked when it cannot be loaded or does
+      # not know the product yet
+      referenceData = self.getReferenceData(omsId)
+      if referenceData.ensureLoaded():
+        product = referenceData.getProduct(productId)
+        if product is not None:
+          return dict(product)
       endPointName = "GetProduct"
-      frame = MessageFrame(MessageType.Request, endPointName, 
+      response = self.requestReply(endPointName, 
         {
           "OMSId": omsId,
           "ProductId": productId
         })
-
-      self.prepareAndSendFrame(frame)
-
-      response = self.getResponse(endPointName)
       product = None
       if response is not None and not self.is_error_message(response):
         product = response
@@ -540,21 +1006,25 @@ class FoxBitClient(object):
     * **********************
     * Endpoint Type: Public
     * @param {number} omsId The ID of the Order Management System from where the instrument is traded.
-    * @param {number} instrumentId The ID of the instrument.
+    * @param {(number | string)} instrumentId The ID or the symbol of the instrument.
     * @returns {Dict}
     * @memberof FoxBitClient
     '''
-    def getInstrument(self, omsId: int, instrumentId: int) -> dict:
+    def getInstrument(self, omsId: int, instrumentId: Union[int, str]) -> dict:
+      referenceData = self.getReferenceData(omsId)
+      if referenceData.ensureLoaded():
+        instrument = referenceData.getInstrument(instrumentId)
+        if instrument is not None:
+          return dict(instrument)
+        if isinstance(instrumentId, str):
+          # GetInstrument takes an InstrumentId only, so an unknown symbol has nothing to ask for
+          return None
       endPointName = "GetInstrument"
-      frame = MessageFrame(MessageType.Request, endPointName, 
+      response = self.requestReply(endPointName, 
       {
         "OMSId": omsId,
-        "InstrumentId": instrumentId,
+        "InstrumentId": self.resolveInstrumentId(omsId, instrumentId),
       })
-
-      self.prepareAndSendFrame(frame)
-
-      response = self.getResponse(endPointName)
       instrument = None
       if response is not None and not self.is_error_message(response):
         instrument = response
@@ -571,12 +1041,11 @@ class FoxBitClient(object):
     * @memberof FoxBitClient
     '''
     def getInstruments(self, omsId: int) -> List[dict]:
+      referenceData = self.getReferenceData(omsId)
+      if referenceData.ensureLoaded():
+        return [dict(instrument) for instrument in referenceData.instruments()]
       endPointName = "GetInstruments"
-      frame = MessageFrame(MessageType.Request, endPointName, {"OMSId": omsId})
-
-      self.prepareAndSendFrame(frame)
-
-      response = self.getResponse(endPointName)
+      response = self.requestReply(endPointName, {"OMSId": omsId})
       instruments = None
       if response is not None and not self.is_error_message(response):
         instruments = response
@@ -593,12 +1062,11 @@ class FoxBitClient(object):
     * @memberof FoxBitClient
     '''
     def getProducts(self, omsId: int) -> List[dict]:
+      referenceData = self.getReferenceData(omsId)
+      if referenceData.ensureLoaded():
+        return [dict(product) for product in referenceData.products()]
       endPointName = "GetProducts"
-      frame = MessageFrame(MessageType.Request, endPointName, {"OMSId": omsId})
-
-      self.prepareAndSendFrame(frame)
-
-      response = self.getResponse(endPointName)
+      response = self.requestReply(endPointName, {"OMSId": omsId})
       products = None
       if response is not None and not self.is_error_message(response):
         products = response
@@ -611,23 +1079,19 @@ class FoxBitClient(object):
     * **********************
     * Endpoint Type: Public
     * @param {number} omsId The ID of the Order Management System where the instrument is traded.
-    * @param {number} instrumentId The ID of the instrument that is the subject of the snapshot.
+    * @param {(number | string)} instrumentId The ID or the symbol of the instrument that is the subject of the snapshot.
     * @param {number} [depth=100] in this call is "depth of market," the number of buyers and sellers at greater or lesser prices in
     * the order book for the instrument.
     * @returns {List[Dict]}
     * @memberof FoxBitClient
     '''
-    def getL2Snapshot(self, omsId: int, instrumentId: int, depth: int = 100) -> List[dict]:
+    def getL2Snapshot(self, omsId: int, instrumentId: Union[int, str], depth: int = 100) -> List[dict]:
       endPointName = "GetL2Snapshot"
-      frame = MessageFrame(MessageType.Request, endPointName, {
+      response = self.requestReply(endPointName, {
         "OMSId": omsId,
-        "InstrumentId": instrumentId,
+        "InstrumentId": self.resolveInstrumentId(omsId, instrumentId),
         "Depth": depth
       })
-
-      self.prepareAndSendFrame(frame)
-
-      response = self.getResponse(endPointName)
       snapshotsResponse = None
       if response is not None and not self.is_error_message(response):
         snapshotsResponse = formatL2Snapshots(response)
@@ -641,7 +1105,7 @@ class FoxBitClient(object):
     * **********************
     * Endpoint Type: Public
     * @param {number} omsId The ID of the Order Management System.
-    * @param {number} instrumentId The ID of a specific instrument. The Order Management System
+    * @param {(number | string)} instrumentId The ID or the symbol of a specific instrument. The Order Management System
     * and the default Account ID of the logged-in user are assumed.
     * @param {Date} fromDate Oldest date from which the ticker history will start, in 'yyyy-MM-ddThh:mm:ssZ' format.
     * The report moves toward the present from this point.
@@ -652,23 +1116,19 @@ class FoxBitClient(object):
     '''
     def getTickerHistory(self,
       omsId: int,
-      instrumentId: int,
+      instrumentId: Union[int, str],
       fromDate: datetime,
       toDate: datetime = datetime.utcnow().replace(minute=0, second=0, microsecond=0),
       interval: int = 300) -> List[dict]:
       endPointName = "GetTickerHistory"
-      frame = MessageFrame(MessageType.Request, endPointName, 
+      response = self.requestReply(endPointName, 
         {
           "OMSId": omsId,
-          "InstrumentId": instrumentId,
+          "InstrumentId": self.resolveInstrumentId(omsId, instrumentId),
           "Interval": interval,
           "FromDate": fromDate.strftime("%Y-%m-%dT%H:%M:%S"), # POSIX-format date and time
           "ToDate": toDate.strftime("%Y-%m-%dT%H:%M:%S"),
         })
-
-      self.prepareAndSendFrame(frame)
-
-      response = self.getResponse(endPointName)
       ticks = None
       if response is not None and not self.is_error_message(response):
         ticks = formatTicks(response)
@@ -744,7 +1204,7 @@ class FoxBitClient(object):
     * **********************
     * Endpoint Type: Public
     * @param {number} omsId The ID of the Order Management System
-    * @param {number} instrumentId The ID of the instrument whose information you want to track.
+    * @param {(number | string)} instrumentId The ID or the symbol of the instrument whose information you want to track.
     * @param {number} [interval=60]  Specifies in seconds how frequently to obtain ticker updates.
     * Default is 60 — one minute.
     * @param {number} [includeLastCount=100] The limit of records returned in the ticker history. The default is 100.
@@ -753,12 +1213,12 @@ class FoxBitClient(object):
     '''
     def subscribeTicker(self, 
       omsId: int,
-      instrumentId: int,
+      instrumentId: Union[int, str],
       interval: int = 60,
       includeLastCount: int = 100) -> RotatingQueue:
       param = {
         "OMSId": omsId,
-        "InstrumentId": instrumentId,
+        "InstrumentId": self.resolveInstrumentId(omsId, instrumentId),
         "Interval": interval,
         "IncludeLastCount": includeLastCount,
       }
@@ -774,13 +1234,13 @@ class FoxBitClient(object):
     * Endpoint Type: Public
     * @param {number} omsId  The ID of the Order Management System on which the user has
     * subscribed to a Level 1 market data feed.
-    * @param {number} instrumentId The ID of the instrument being tracked by the Level 1 market data feed.
+    * @param {(number | string)} instrumentId The ID or the symbol of the instrument being tracked by the Level 1 market data feed.
     * @returns {boolean}
     * @memberof FoxBitClient
     '''
-    def unsubscribeLevel1(self, omsId: int, instrumentId: int) -> bool:
+    def unsubscribeLevel1(self, omsId: int, instrumentId: Union[int, str]) -> bool:
       endPointName = "UnsubscribeLevel1"
-      param = {"OMSId": omsId, "InstrumentId": instrumentId}
+      param = {"OMSId": omsId, "InstrumentId": self.resolveInstrumentId(omsId, instrumentId)}
       frame = MessageFrame(MessageType.Request, endPointName, param)
 
       self.prepareAndSendFrame(frame)
@@ -798,13 +1258,13 @@ class FoxBitClient(object):
     * Endpoint Type: Public
     * @param {number} omsId  The ID of the Order Management System on which the user has
     * subscribed to a Level 2 market data feed.
-    * @param {number} instrumentId The ID of the instrument being tracked by the Level 2 market data feed.
+    * @param {(number | string)} instrumentId The ID or the symbol of the instrument being tracked by the Level 2 market data feed.
     * @returns {boolean}
     * @memberof FoxBitClient
     '''
-    def unsubscribeLevel2(self, omsId: int, instrumentId: int) -> bool:
+    def unsubscribeLevel2(self, omsId: int, instrumentId: Union[int, str]) -> bool:
       endPointName = "UnsubscribeLevel2"
-      param = {"OMSId": omsId, "InstrumentId": instrumentId}
+      param = {"OMSId": omsId, "InstrumentId": self.resolveInstrumentId(omsId, instrumentId)}
       frame = MessageFrame(MessageType.Request, endPointName, param)
 
       self.prepareAndSendFrame(frame)
@@ -822,13 +1282,13 @@ class FoxBitClient(object):
     * Endpoint Type: Public
     * @param {number} omsId  The ID of the Order Management System on which the user has
     * subscribed to a ticker market data feed.
-    * @param {number} instrumentId The ID of the instrument being tracked by the ticker market data feed.
+    * @param {(number | string)} instrumentId The ID or the symbol of the instrument being tracked by the ticker market data feed.
     * @returns {boolean}
     * @memberof FoxBitClient
     '''
-    def unsubscribeTicker(self, omsId: int, instrumentId: int) -> bool:
+    def unsubscribeTicker(self, omsId: int, instrumentId: Union[int, str]) -> bool:
       endPointName = "UnsubscribeTicker"
-      param = {"OMSId": omsId, "InstrumentId": instrumentId}
+      param = {"OMSId": omsId, "InstrumentId": self.resolveInstrumentId(omsId, instrumentId)}
       frame = MessageFrame(MessageType.Request, endPointName, param)
 
       self.prepareAndSendFrame(frame)
@@ -846,17 +1306,17 @@ class FoxBitClient(object):
     * ******************
     * **When subscribed to Trades, you will receive TradeDataUpdateEvent messages from the server**
     * @param {number} omsId Order Management System ID
-    * @param {number} instrumentId Instrument's Identifier
+    * @param {(number | string)} instrumentId Instrument's Identifier or symbol
     * @param {number} [includeLastCount=100] Specifies the number of previous trades to
     * retrieve in the immediate snapshot. Default is 100.
     * @returns {RotatingQueue}
     * @memberof FoxBitClient
     '''
-    def subscribeTrades(self, omsId: int, instrumentId: int, includeLastCount: int = 100) -> RotatingQueue:
+    def subscribeTrades(self, omsId: int, instrumentId: Union[int, str], includeLastCount: int = 100) -> RotatingQueue:
       endPointName = "SubscribeTrades"
       param = {
         "OMSId": omsId,
-        "InstrumentId": instrumentId,
+        "InstrumentId": self.resolveInstrumentId(omsId, instrumentId),
         "IncludeLastCount": includeLastCount,
       }
 
@@ -870,14 +1330,14 @@ class FoxBitClient(object):
     * Unsubscribes a user from the Trades Market Data Feed.
     * @param {number} omsId The ID of the Order Management System on which the user has
     * subscribed to a trades market data feed.
-    * @param {number} instrumentId The ID of the instrument being tracked by the trades
+    * @param {(number | string)} instrumentId The ID or the symbol of the instrument being tracked by the trades
     * market data feed.
     * @returns {boolean}
     * @memberof FoxBitClient
     '''
-    def unsubscribeTrades(self, omsId: int, instrumentId: int) -> bool:
+    def unsubscribeTrades(self, omsId: int, instrumentId: Union[int, str]) -> bool:
       endPointName = "UnsubscribeTrades"
-      param = {"OMSId": omsId, "InstrumentId": instrumentId}
+      param = {"OMSId": omsId, "InstrumentId": self.resolveInstrumentId(omsId, instrumentId)}
 
       frame = MessageFrame(MessageType.Request, endPointName, param)
 
@@ -1122,7 +1582,7 @@ class FoxBitClient(object):
     * @param {number} omsId The Order Management System under which the account operates.Required
     * @param {number} [accountId] The account for which all orders are being canceled. Conditionally optional.
     * @param {number} [userId] The ID of the user whose orders are being canceled. Conditionally optional.
-    * @param {number} [instrumentId] The ID of the instrument for which all orders are being cancelled. Conditionally optional.
+    * @param {(number | string)} [instrumentId] The ID or the symbol of the instrument for which all orders are being cancelled. Conditionally optional.
     * @returns {boolean}
     * @memberof FoxBitClient
     '''
@@ -1130,7 +1590,7 @@ class FoxBitClient(object):
       omsId: int, 
       accountId: int = None, 
       userId: int = None, 
-      instrumentId: int = None) -> bool:
+      instrumentId: Union[int, str] = None) -> bool:
       
       endPointName = "CancelAllOrders"
       param = {"OMSId": omsId}
@@ -1139,7 +1599,7 @@ class FoxBitClient(object):
       if userId is not None:
         param["UserId"] = userId
       if instrumentId is not None:
-        param["InstrumentId"] = instrumentId
+        param["InstrumentId"] = self.resolveInstrumentId(omsId, instrumentId)
       frame = MessageFrame(MessageType.Request, endPointName, param)
 
       self.prepareAndSendFrame(frame)
@@ -1189,6 +1649,55 @@ class FoxBitClient(object):
 
       return orderCancelled
 
+    '''
+    * Cancels many orders at once: every CancelOrder frame is sent back-to-back and the replies
+    * are collected as they arrive, so the whole batch costs about one round-trip.
+    * With fallbackToCancelAll, any order that could not be cancelled individually (rejected or
+    * timed out) triggers a single CancelAllOrders for the account, narrowed to instrumentId
+    * when given. The open orders are read just before it, and only the failed orders they show
+    * inside that scope are reported as cancelled by it; unknown, already finished or
+    * out-of-scope orders stay False. Note that it also cancels orders of that scope that are
+    * not in the batch.
+    *
+    * @param {number} omsId The Order Management System on which the orders exist. Required
+    * @param {number} accountId The ID of account under which the orders were placed. Required
+    * @param {List[number]} orderIds The orders to be cancelled.
+    * @param {(number | string)} [instrumentId] Scope of the CancelAllOrders fallback, ID or symbol.
+    * @param {boolean} [fallbackToCancelAll=False]
+    * @param {number} [timeout] Seconds to wait for all replies.
+    * @returns {Dict[number, boolean]} (whether each order was cancelled, by OrderId)
+    * @memberof FoxBitClient
+    '''
+    def cancelOrders(self,
+      omsId: int,
+      accountId: int,
+      orderIds: List[int],
+      instrumentId: Union[int, str] = None,
+      fallbackToCancelAll: bool = False,
+      timeout: float = ONE_SHOT_TIMEOUT) -> Dict[int, bool]:
+
+      futures = [
+        self.sendRequestAsync("CancelOrder", {"OMSId": omsId, "AccountId": accountId, "OrderId": orderId})
+        for orderId in orderIds
+      ]
+      cancelledByOrderId = dict()
+      for orderId, response in zip(orderIds, self.getAsyncResponses(futures, timeout)):
+        cancelledByOrderId[orderId] = bool(
+          response is not None and not self.is_error_message(response) and response["result"])
+
+      failedOrderIds = [orderId for orderId, cancelled in cancelledByOrderId.items() if not cancelled]
+      if fallbackToCancelAll and failedOrderIds:
+        scopeInstrumentId = self.resolveInstrumentId(omsId, instrumentId) if instrumentId is not None else None
+        openOrderIds = set()
+        for order in self.getOpenOrders(accountId, omsId) or ():
+          if scopeInstrumentId is None or order.get("Instrument") == scopeInstrumentId:
+            openOrderIds.add(order.get("OrderId"))
+        if self.cancelAllOrders(omsId, accountId=accountId, instrumentId=instrumentId):
+          for orderId in failedOrderIds:
+            cancelledByOrderId[orderId] = orderId in openOrderIds
+
+      return cancelledByOrderId
+
     '''
     * Cancels a quote that has not been executed yet.
     * Quoting is not enabled for the retail end user of the AlphaPoint software.
@@ -1199,7 +1708,7 @@ class FoxBitClient(object):
     * @param {number} bidQuoteId The ID of the bid quote. Required.
     * @param {number} askQuoteId The ID of the ask quote. Required
     * @param {number} [accountId] The ID of the account that requested the quote. Conditionally optional
-    * @param {number} [instrumentId] The ID of the instrument being quoted. Conditionally optional.
+    * @param {(number | string)} [instrumentId] The ID or the symbol of the instrument being quoted. Conditionally optional.
     * @returns {boolean}
     * @memberof FoxBitClient
     '''
@@ -1208,14 +1717,14 @@ class FoxBitClient(object):
       bidQuoteId: int,
       askQuoteId: int,
       accountId: int = None,
-      instrumentId: int = None) -> bool:
+      instrumentId: Union[int, str] = None) -> bool:
       endPointName = "CancelQuote"
       param = {
         "OMSId": omsId,
         "BidQuoteId": bidQuoteId,
         "AskQuoteId": askQuoteId,
         "AccountId": accountId if accountId is not None else '',
-        "InstrumentId": instrumentId if instrumentId is not None else ''
+        "InstrumentId": self.resolveInstrumentId(omsId, instrumentId) if instrumentId is not None else ''
       }
 
       frame = MessageFrame(MessageType.Request, endPointName, param)
@@ -1234,12 +1743,16 @@ class FoxBitClient(object):
     * the order book. You can use ModifyOrder to preserve priority in the book but ModifyOrder only
     * allows a reduction in order quantity.
     * `Note: ` CancelReplaceOrder sacrifices the order’s priority in the order book.
+    * With startOrderValidator, a replacement failing the pre-trade checks is not sent and False is returned.
     * @param {CancelReplaceOrderRequest} cancelReplaceOrderReq
     * @returns {boolean}
     * @memberof FoxBitClient
     '''
     def cancelReplaceOrder(self, cancelReplaceOrderReq: CancelReplaceOrderRequest) -> bool:
       endPointName = "CancelReplaceOrder"
+      if self.rejectInvalidOrder(cancelReplaceOrderReq) is not None:
+        return False
+
       frame = MessageFrame(MessageType.Request, endPointName, cancelReplaceOrderReq)
 
       self.prepareAndSendFrame(frame)
@@ -1270,11 +1783,7 @@ class FoxBitClient(object):
         "AccountHandle": accountHandle,
       }
 
-      frame = MessageFrame(MessageType.Request, endPointName, param)
-
-      self.prepareAndSendFrame(frame)
-
-      response = self.getResponse(endPointName)
+      response = self.requestReply(endPointName, param)
       accountInfo = None
       if response is not None and not self.is_error_message(response):
         accountInfo = response
@@ -1295,11 +1804,7 @@ class FoxBitClient(object):
     def getAccountPositions(self, accountId: int, omsId: int) -> List[dict]:
       endPointName = "GetAccountPositions"
       param = {"OMSId": omsId, "AccountId": accountId}
-      frame = MessageFrame(MessageType.Request, endPointName, param)
-
-      self.prepareAndSendFrame(frame)
-
-      response = self.getResponse(endPointName)
+      response = self.requestReply(endPointName, param)
       accountPositions = None
       if response is not None and not self.is_error_message(response):
         accountPositions = response
@@ -1346,6 +1851,41 @@ class FoxBitClient(object):
 
       return accountTrades
 
+    '''
+    * Walks the whole trade history of an account, most recent first, without a blocking
+    * round-trip per page: `readAhead` further GetAccountTrades pages are kept in flight while
+    * the current one is consumed, and the walk stops after the first short page.
+    * Trades executed during the walk shift the indexes, so a trade may be yielded twice;
+    * deduplicate by TradeId if that matters.
+    * @param {number} accountId
+    * @param {number} omsId
+    * @param {number} [pageSize=200] Trades per request (at most `200`).
+    * @param {number} [readAhead=2] Pages requested ahead of the one being consumed.
+    * @param {number} [startIndex=0]
+    * @param {string} [rowFormat='dict'] 'dict' yields the trade dicts, 'typed' AccountTradesResult
+    * instances, 'columns' one {field: [values]} chunk per page.
+    * @param {number} [timeout] Seconds to wait for each page.
+    * @returns {Iterator} Raises TimeoutError or RuntimeError when a page cannot be read.
+    * @memberof FoxBitClient
+    '''
+    def iterAccountTrades(self,
+      accountId: int,
+      omsId: int,
+      pageSize: int = 200,
+      readAhead: int = 2,
+      startIndex: int = 0,
+      rowFormat: str = "dict",
+      timeout: float = ONE_SHOT_TIMEOUT) -> Iterator:
+
+      if rowFormat not in ROW_FORMATS:
+        raise ValueError("rowFormat must be one of {}, got {!r}.".format(ROW_FORMATS, rowFormat))
+      # A larger Count is answered with 200 trades, which would read as the last page
+      pageSize = min(pageSize, MAX_ACCOUNT_TRADES_PAGE)
+      pages = readPages(self, "GetAccountTrades",
+        lambda index, count: {"OMSId": omsId, "AccountId": accountId, "StartIndex": index, "Count": count},
+        pageSize, readAhead=readAhead, startIndex=startIndex, timeout=timeout)
+      return iterRows(pages, rowFormat, AccountTradesResult)
+
     '''
     * Returns a list of transactions for a specific account on an Order Management System.
     * The owner of the trading venue determines how long to retain order history before archiving.
@@ -1376,6 +1916,22 @@ class FoxBitClient(object):
 
       return accountTransactions
 
+    '''
+    * Brings a local store (see account_store.py) up to date with the account's trades and
+    * transactions, fetching only those newer than the highest TradeId and TransactionId
+    * already stored. Query the store afterwards, e.g. store.queryTrades(accountId,
+    * startTimeMs, endTimeMs, instrumentId).
+    * @param {number} accountId
+    * @param {number} omsId
+    * @param {AccountStore} store e.g. AccountStore("foxbit_account.db")
+    * @returns {Dict} Number of new records: {"trades": ..., "transactions": ...}. Raises
+    * TimeoutError or RuntimeError when the history cannot be read; the store is then unchanged
+    * for the kind that failed.
+    * @memberof FoxBitClient
+    '''
+    def syncAccountHistory(self, accountId: int, omsId: int, store: AccountStore) -> dict:
+      return AccountSync(self, store, accountId, omsId).sync()
+
     '''
     * Returns an array of 0 or more orders that have not yet been filled (open orders) for a single account
     * for a given user on a specific Order Management System. The call returns an empty array if a user
@@ -1389,27 +1945,96 @@ class FoxBitClient(object):
     def getOpenOrders(self, accountId: int, omsId: int) -> List[dict]:
       endPointName = "GetOpenOrders"
       param = {"OMSId": omsId, "AccountId": accountId}
+      response = self.requestReply(endPointName, param)
+      openOrders = None
+      if response is not None and not self.is_error_message(response):
+        openOrders = response
+
+      return openOrders
+
+    '''
+    * Subscribes the session to the account event stream: OrderStateEvent, OrderTradeEvent,
+    * AccountPositionEvent, the order reject events, TransactionEvent, AccountInfoUpdateEvent and
+    * PendingDepositUpdate. Each event type is delivered on its own queue,
+    * endPointDescriptorByMethod[eventName].methodQueue.
+    * **********************
+    * Endpoint Type: Private
+    * @param {number} accountId The ID of the account whose events are wanted.
+    * @param {number} omsId The ID of the Order Management System.
+    * @returns {boolean}
+    * @memberof FoxBitClient
+    '''
+    def subscribeAccountEvents(self, accountId: int, omsId: int) -> bool:
+      endPointName = "SubscribeAccountEvents"
+      param = {"AccountId": accountId, "OMSId": omsId}
       frame = MessageFrame(MessageType.Request, endPointName, param)
 
       self.prepareAndSendFrame(frame)
 
       response = self.getResponse(endPointName)
-      openOrders = None
+      subscribed = False
       if response is not None and not self.is_error_message(response):
-        openOrders = response
+        subscribed = bool(response.get("Subscribed"))
 
-      return openOrders
+      return subscribed
+
+    '''
+    * Starts a live cache of the account's orders (by OrderId and ClientOrderId) and positions
+    * (by ProductId). The account event stream is subscribed first and the cache is then seeded
+    * from GetOpenOrders and GetAccountPositions, so nothing that happens in between is lost.
+    * From then on it is updated by the events alone, without polling.
+    * **********************
+    * Endpoint Type: Private
+    * @param {number} accountId
+    * @param {number} omsId
+    * @returns {AccountCache} (None when the subscription or the snapshot fails)
+    * @memberof FoxBitClient
+    '''
+    def startAccountCache(self, accountId: int, omsId: int) -> AccountCache:
+      self.stopAccountCache()
+      cache = AccountCache(accountId, omsId)
+      cache.beginSeed()
+      self.addEventHandler("OrderStateEvent", cache.onOrderState)
+      self.addEventHandler("OrderTradeEvent", cache.onOrderTrade)
+      self.addEventHandler("AccountPositionEvent", cache.onAccountPosition)
+      self.accountCache = cache
+      if not self.subscribeAccountEvents(accountId, omsId):
+        self.stopAccountCache()
+        return None
+      openOrders = self.getOpenOrders(accountId, omsId)
+      positions = self.getAccountPositions(accountId, omsId)
+      if openOrders is None or positions is None:
+        self.stopAccountCache()
+        return None
+      cache.seed(openOrders, positions)
+      return cache
+
+    '''
+    * Detaches the account cache from the event stream. The session stays subscribed.
+    *
+    * @memberof FoxBitClient
+    '''
+    def stopAccountCache(self):
+      cache = self.accountCache
+      if cache is not None:
+        self.removeEventHandler("OrderStateEvent", cache.onOrderState)
+        self.removeEventHandler("OrderTradeEvent", cache.onOrderTrade)
+        self.removeEventHandler("AccountPositionEvent", cache.onAccountPosition)
+        self.accountCache = None
 
     '''
     * Creates an order. Anyone submitting an order should also subscribe to the various market data and
     * event feeds, or call GetOpenOrders or GetOrderStatus to monitor the status of the order. If the
     * order is not in a state to be executed, GetOpenOrders will not return it.
+    * With startOrderValidator, an order failing the pre-trade checks is not sent and (False, -1) is returned.
     * @param {SendOrderRequest} sendOrderRequest
     * @returns {Tuple[boolean, number]}
     * @memberof FoxBitClient
     '''
     def sendOrder(self, sendOrderRequest: SendOrderRequest) -> Tuple[bool, int]:
       endPointName = "SendOrder"
+      if self.rejectInvalidOrder(sendOrderRequest) is not None:
+        return False, -1
 
       frame = MessageFrame(MessageType.Request, endPointName, sendOrderRequest)
 
@@ -1424,6 +2049,202 @@ class FoxBitClient(object):
 
       return orderProcessed, orderId
 
+    '''
+    * Creates many orders at once, e.g. to re-quote a ladder: every SendOrder frame is sent
+    * back-to-back and the acknowledgements are collected as they arrive, so the whole batch
+    * costs about one round-trip instead of one per order. Orders failing the pre-trade checks
+    * (startOrderValidator) are not sent and get (False, -1).
+    * @param {List[SendOrderRequest]} sendOrderRequests
+    * @param {number} [timeout] Seconds to wait for all acknowledgements.
+    * @returns {List[Tuple[boolean, number]]} (as sendOrder returns, in request order)
+    * @memberof FoxBitClient
+    '''
+    def sendOrders(self, sendOrderRequests: List[SendOrderRequest], timeout: float = ONE_SHOT_TIMEOUT) -> List[Tuple[bool, int]]:
+      futures = []
+      for request in sendOrderRequests:
+        if self.rejectInvalidOrder(request) is None:
+          futures.append(self.sendRequestAsync("SendOrder", request))
+        else:
+          futures.append(None)
+      responses = iter(self.getAsyncResponses([future for future in futures if future is not None], timeout))
+      results = []
+      for future in futures:
+        response = next(responses) if future is not None else None
+        orderProcessed = False
+        orderId = -1
+        if response is not None and not self.is_error_message(response):
+          orderProcessed = response["status"] == "Accepted"
+          orderId = response["OrderId"]
+        results.append((orderProcessed, orderId))
+
+      return results
+
+    '''
+    * Creates an order from a pre-encoded template (see order_template.py): only the sequence
+    * number, ClientOrderId, Side, Quantity and LimitPrice are encoded per call, which takes a few
+    * microseconds instead of the generic frame encoding. Replies as sendOrder does.
+    * @param {OrderTemplate} orderTemplate e.g. OrderTemplate(prototypeSendOrderRequest)
+    * @param {number} clientOrderId
+    * @param {Side} side
+    * @param {number} quantity
+    * @param {number} limitPrice
+    * @returns {Tuple[boolean, number]}
+    * @memberof FoxBitClient
+    '''
+    def sendOrderFromTemplate(self,
+      orderTemplate: OrderTemplate,
+      clientOrderId: int,
+      side: Side,
+      quantity: float,
+      limitPrice: float) -> Tuple[bool, int]:
+
+      endPointName = "SendOrder"
+      if self.rejectInvalidTemplateOrder(orderTemplate, quantity, limitPrice) is not None:
+        return False, -1
+
+      sequence = self.nextRequestSequence()
+      frameStr = orderTemplate.render(sequence, clientOrderId, side, quantity, limitPrice)
+
+      self.sendEncodedFrame(endPointName, sequence, frameStr)
+
+      response = self.getResponse(endPointName)
+      orderProcessed = False
+      orderId = -1
+      if response is not None and not self.is_error_message(response):
+        orderProcessed = response["status"] == "Accepted"
+        orderId = response["OrderId"]
+
+      return orderProcessed, orderId
+
+    '''
+    * Non-blocking variant of sendOrderFromTemplate, returning the same handle as submitOrder.
+    * @param {OrderTemplate} orderTemplate
+    * @param {number} clientOrderId
+    * @param {Side} side
+    * @param {number} quantity
+    * @param {number} limitPrice
+    * @returns {OrderHandle}
+    * @memberof FoxBitClient
+    '''
+    def submitOrderFromTemplate(self,
+      orderTemplate: OrderTemplate,
+      clientOrderId: int,
+      side: Side,
+      quantity: float,
+      limitPrice: float) -> OrderHandle:
+
+      rejectReason = self.rejectInvalidTemplateOrder(orderTemplate, quantity, limitPrice)
+      if rejectReason is not None:
+        return self.rejectedOrderHandle(orderTemplate.toRequest(clientOrderId, side, quantity, limitPrice), rejectReason)
+
+      sequence = self.nextRequestSequence()
+      frameStr = orderTemplate.render(sequence, clientOrderId, side, quantity, limitPrice)
+      return self.submitEncodedOrder(
+        orderTemplate.toRequest(clientOrderId, side, quantity, limitPrice), sequence, frameStr)
+
+    def submitEncodedOrder(self, sendOrderRequest: SendOrderRequest, sequence: int, frameStr: str) -> OrderHandle:
+      tracker = self.getOrderTracker()
+      handle = OrderHandle(sendOrderRequest)
+      tracker.track(handle)
+      reply = Future()
+      reply.sequence = sequence
+      try:
+        self.sendEncodedFrame("SendOrder", sequence, frameStr, pendingReply=reply)
+      except Exception:
+        tracker.forget(handle)
+        raise
+      reply.add_done_callback(lambda reply: tracker.acknowledge(handle, reply))
+      self.orderReplyDeadlines.watch(reply)
+      return handle
+
+    def expireOrderReply(self, reply: Future):
+      # Whoever pops the sequence first, this or the reply, resolves the future
+      if self.pendingReplies.pop(reply.sequence, None) is not None:
+        failFuture(reply, FutureTimeoutError(
+          "SendOrder reply not received within {} seconds.".format(self.orderReplyDeadlines.timeout)))
+
+    '''
+    * Submits an order without blocking. The returned handle is a future resolving with the
+    * same (accepted, orderId) tuple as sendOrder once the exchange acknowledges the order, so
+    * hundreds of orders can be in flight from a single thread. If the session is subscribed
+    * to account events (subscribeAccountEvents or startAccountCache), the handle then follows
+    * the order: handle.state, handle.trades, handle.updates and handle.finished.
+    * Give every order a distinct non-zero ClientOrderId so that events published before the
+    * acknowledgement can be matched to it. An order failing the pre-trade checks
+    * (startOrderValidator) is not sent: its handle is already resolved with (False, -1) and
+    * handle.rejectReason says why. If no reply arrives within ONE_SHOT_TIMEOUT seconds the
+    * handle fails with concurrent.futures.TimeoutError; the order may still have been placed.
+    * @param {SendOrderRequest} sendOrderRequest
+    * @returns {OrderHandle}
+    * @memberof FoxBitClient
+    '''
+    def submitOrder(self, sendOrderRequest: SendOrderRequest) -> OrderHandle:
+      rejectReason = self.rejectInvalidOrder(sendOrderRequest)
+      if rejectReason is not None:
+        return self.rejectedOrderHandle(sendOrderRequest, rejectReason)
+
+      frame = MessageFrame(MessageType.Request, "SendOrder", sendOrderRequest)
+      with self.sequenceLock:
+        self.calculateMessageFrameSequence(frame)
+      return self.submitEncodedOrder(sendOrderRequest, frame.sequence, frame.to_json())
+
+    def getOrderTracker(self) -> OrderTracker:
+      if self.orderTracker is None:
+        with self.eventHandlersLock:
+          if self.orderTracker is None:
+            self.orderTracker = OrderTracker()
+        self.addEventHandler("OrderStateEvent", self.orderTracker.onOrderState)
+        self.addEventHandler("OrderTradeEvent", self.orderTracker.onOrderTrade)
+        self.addEventHandler("NewOrderRejectEvent", self.orderTracker.onNewOrderReject)
+      return self.orderTracker
+
+    '''
+    * Turns on pre-trade validation (see order_validator.py): sendOrder, sendOrders, submitOrder,
+    * the template variants and cancelReplaceOrder check each order against the cached instrument
+    * metadata (getReferenceData) and refuse, without a round-trip, orders the exchange would
+    * reject: unknown instrument, session not Running, quantity below MinimumQuantity or off the
+    * QuantityIncrement, price below MinimumPrice or off the PriceIncrement.
+    * @returns {OrderValidator}
+    * @memberof FoxBitClient
+    '''
+    def startOrderValidator(self) -> OrderValidator:
+      self.orderValidator = OrderValidator(self)
+      return self.orderValidator
+
+    '''
+    * Turns pre-trade validation off.
+    *
+    * @memberof FoxBitClient
+    '''
+    def stopOrderValidator(self):
+      self.orderValidator = None
+
+    def rejectInvalidOrder(self, request: Union[SendOrderRequest, CancelReplaceOrderRequest]) -> str:
+      validator = self.orderValidator
+      if validator is None:
+        return None
+      rejectReason = validator.validate(request)
+      if rejectReason is not None:
+        self.logger.warning("Order rejected before sending: %s", rejectReason)
+      return rejectReason
+
+    def rejectInvalidTemplateOrder(self, orderTemplate: OrderTemplate, quantity: float, limitPrice: float) -> str:
+      validator = self.orderValidator
+      if validator is None:
+        return None
+      prototype = orderTemplate.prototype
+      rejectReason = validator.check(
+        prototype.OMSId, prototype.InstrumentId, prototype.OrderType, quantity, limitPrice, prototype.StopPrice)
+      if rejectReason is not None:
+        self.logger.warning("Order rejected before sending: %s", rejectReason)
+      return rejectReason
+
+    def rejectedOrderHandle(self, sendOrderRequest: SendOrderRequest, rejectReason: str) -> OrderHandle:
+      handle = OrderHandle(sendOrderRequest)
+      handle.rejectReason = rejectReason
+      handle.acknowledge(False, -1)
+      return handle
+
     '''
     * Returns an estimate of the fee for a specific order and order type.
     * Fees are set and calculated by the operator of the trading venue.
@@ -1433,17 +2254,125 @@ class FoxBitClient(object):
     '''
     def getOrderFee(self, orderFeeRequest: OrderFeeRequest) -> dict:
       endPointName = "GetOrderFee"
-      frame = MessageFrame(MessageType.Request, endPointName, orderFeeRequest)
-
-      self.prepareAndSendFrame(frame)
-
-      response = self.getResponse(endPointName)
+      response = self.requestReply(endPointName, orderFeeRequest)
       orderFeeInfo = None
       if response is not None and not self.is_error_message(response):
         orderFeeInfo = response
 
       return orderFeeInfo
 
+    '''
+    * Creates the local fee engine (see fee_engine.py), which computes the same result as
+    * getOrderFee in-process from the account fee schedule (GetAccountFees), reloaded every
+    * `ttl` seconds, instead of a round-trip per order. Each instrument's base product comes
+    * from the reference data (getReferenceData). With driftCheckEvery=N, every Nth estimate is
+    * checked against getOrderFee in the background; see feeEngine.driftReport().
+    * @param {number} omsId
+    * @param {number} [ttl=300] Seconds before a fee schedule is reloaded.
+    * @param {number} [driftCheckEvery]
+    * @returns {FeeEngine}
+    * @memberof FoxBitClient
+    '''
+    def startFeeEngine(self, omsId: int, ttl: float = 300.0, driftCheckEvery: int = None) -> FeeEngine:
+      self.feeEngine = FeeEngine(self, ttl=ttl, instrumentProducts=self.getInstrumentProducts(omsId), driftCheckEvery=driftCheckEvery)
+      return self.feeEngine
+
+    def getInstrumentProducts(self, omsId: int) -> Dict[int, Tuple[int, int]]:
+      instrumentProducts = dict()
+      for instrument in self.getReferenceData(omsId).instruments():
+        instrumentProducts[instrument["InstrumentId"]] = (instrument["Product1"], instrument["Product2"])
+      return instrumentProducts
+
+    '''
+    * Connects, authenticates and loads the reference data, fee schedule and account info in as
+    * few round-trips as possible. GetInstruments and GetProducts are pipelined with
+    * AuthenticateUser, then GetAccountFees and GetAccountInfo are pipelined together.
+    *
+    * With a warm-start snapshot (see session_snapshot.py) younger than `maxAge` at
+    * `snapshotPath`, its contents are installed (getReferenceData, the fee engine) before
+    * connecting and the method returns right after authentication, while the exchange copies
+    * are fetched and applied in the background (snapshot.revalidated is set when done). The
+    * snapshot file is rewritten after every complete load.
+    * @param {string} url
+    * @param {string} apiKey
+    * @param {string} apiSecret
+    * @param {number} userId
+    * @param {number} omsId
+    * @param {number} accountId
+    * @param {string} [snapshotPath='foxbit_session.json']
+    * @param {number} [maxAge=86400] Seconds after which a snapshot is ignored.
+    * @param {number} [timeout] Seconds to wait for the pipelined replies.
+    * @returns {SessionSnapshot} (None when the connection or the authentication fails); its
+    * accountInfo holds the GetAccountInfo reply
+    * @memberof FoxBitClient
+    '''
+    def warmStart(self,
+      url: str,
+      apiKey: str,
+      apiSecret: str,
+      userId: int,
+      omsId: int,
+      accountId: int,
+      snapshotPath: str = "foxbit_session.json",
+      maxAge: float = 86400.0,
+      timeout: float = ONE_SHOT_TIMEOUT) -> SessionSnapshot:
+
+      snapshot = SessionSnapshot(snapshotPath, omsId, accountId, maxAge=maxAge)
+      if snapshot.load():
+        self.applySessionSnapshot(snapshot)
+
+      if not self.connect(url):
+        return None
+      # Public reference data does not need the session, so it travels with the authentication
+      futures = [
+        self.sendRequestAsync("GetInstruments", {"OMSId": omsId}),
+        self.sendRequestAsync("GetProducts", {"OMSId": omsId}),
+      ]
+      try:
+        authenticated = self.authenticateUser(apiKey, apiSecret, userId)
+      except Exception:
+        self.cancelPendingReplies(futures)
+        raise
+      if not authenticated:
+        self.cancelPendingReplies(futures)
+        return None
+      futures.append(self.sendRequestAsync("GetAccountFees", {"AccountId": accountId, "OMSId": omsId}))
+      futures.append(self.sendRequestAsync("GetAccountInfo", {"OMSId": omsId, "AccountId": accountId, "AccountHandle": ""}))
+
+      if snapshot.fromFile:
+        Thread(target=self.revalidateSessionSnapshot, args=(snapshot, futures, timeout), daemon=True).start()
+      else:
+        self.revalidateSessionSnapshot(snapshot, futures, timeout)
+      return snapshot
+
+    def revalidateSessionSnapshot(self, snapshot: SessionSnapshot, futures: List[Future], timeout: float):
+      try:
+        responses = []
+        for response in self.getAsyncResponses(futures, timeout):
+          if isinstance(response, dict) and self.is_error_message(response):
+            response = None
+          responses.append(response)
+        snapshot.update(*responses)
+        self.applySessionSnapshot(snapshot)
+        if snapshot.isComplete() and None not in responses:
+          try:
+            snapshot.save()
+          except OSError as e:
+            self.logger.warning("Could not save the session snapshot %s: %s", snapshot.path, e)
+      finally:
+        snapshot.revalidated.set()
+
+    def applySessionSnapshot(self, snapshot: SessionSnapshot):
+      if snapshot.instruments is not None and snapshot.products is not None:
+        self.getReferenceData(snapshot.omsId).seed(snapshot.instruments, snapshot.products)
+      if snapshot.accountFees is not None and self.getReferenceData(snapshot.omsId).loadedAt is not None:
+        feeEngine = self.feeEngine
+        if feeEngine is None:
+          feeEngine = self.startFeeEngine(snapshot.omsId)
+        else:
+          feeEngine.instrumentProducts = self.getInstrumentProducts(snapshot.omsId)
+        feeEngine.seedSchedule(snapshot.accountId, snapshot.accountFees)
+
     '''
     * Returns a complete list of all orders, both open and executed, for a specific account on the specified
     * Order Management System.
@@ -1524,6 +2453,108 @@ class FoxBitClient(object):
 
       return withdrawTickets
 
+    '''
+    * Returns the deposit tickets matching the filters of the request (Status, TicketId,
+    * StartTimestamp/EndTimestamp, UserName, Amount/AmountOperator), most recent first, from
+    * StartIndex and at most Limit of them. Filters left as None are not sent.
+    * ************
+    * Only admin-level users can issue this call.
+    * @param {AllDepositOrWithdrawTicketsRequest} ticketsRequest
+    * @returns {List[Dict]}
+    * @memberof FoxBitClient
+    '''
+    def getAllDepositTickets(self, ticketsRequest: AllDepositOrWithdrawTicketsRequest) -> List[dict]:
+      endPointName = "GetAllDepositTickets"
+      frame = MessageFrame(MessageType.Request, endPointName, self.ticketsPayload(ticketsRequest))
+
+      self.prepareAndSendFrame(frame)
+
+      response = self.getResponse(endPointName)
+      depositTickets = None
+      if response is not None and not self.is_error_message(response):
+        depositTickets = response
+
+      return depositTickets
+
+    '''
+    * Returns the withdraw tickets matching the filters of the request, as getAllDepositTickets.
+    * ************
+    * Only admin-level users can issue this call.
+    * @param {AllDepositOrWithdrawTicketsRequest} ticketsRequest
+    * @returns {List[Dict]}
+    * @memberof FoxBitClient
+    '''
+    def getAllWithdrawTickets(self, ticketsRequest: AllDepositOrWithdrawTicketsRequest) -> List[dict]:
+      endPointName = "GetAllWithdrawTickets"
+      frame = MessageFrame(MessageType.Request, endPointName, self.ticketsPayload(ticketsRequest))
+
+      self.prepareAndSendFrame(frame)
+
+      response = self.getResponse(endPointName)
+      withdrawTickets = None
+      if response is not None and not self.is_error_message(response):
+        withdrawTickets = response
+
+      return withdrawTickets
+
+    '''
+    * Streams the deposit tickets matching the filters of the request page by page, instead of
+    * one reply holding every ticket: GetAllDepositTickets is called with Limit=pageSize from
+    * the request's StartIndex (0 when None), `readAhead` further pages are in flight while the
+    * current one is consumed, and the walk stops after the first short page.
+    * ************
+    * Only admin-level users can issue this call.
+    * @param {AllDepositOrWithdrawTicketsRequest} ticketsRequest Its Limit is ignored.
+    * @param {number} [pageSize=100]
+    * @param {number} [readAhead=2]
+    * @param {string} [rowFormat='dict'] 'dict', 'typed' (AllDepositTicketsResult) or 'columns'.
+    * @param {number} [timeout] Seconds to wait for each page.
+    * @returns {Iterator} Raises TimeoutError or RuntimeError when a page cannot be read.
+    * @memberof FoxBitClient
+    '''
+    def iterAllDepositTickets(self,
+      ticketsRequest: AllDepositOrWithdrawTicketsRequest,
+      pageSize: int = 100,
+      readAhead: int = 2,
+      rowFormat: str = "dict",
+      timeout: float = ONE_SHOT_TIMEOUT) -> Iterator:
+      return self.iterTickets("GetAllDepositTickets", ticketsRequest, AllDepositTicketsResult, pageSize, readAhead, rowFormat, timeout)
+
+    '''
+    * Streams the withdraw tickets matching the filters of the request, as iterAllDepositTickets.
+    * ************
+    * Only admin-level users can issue this call.
+    * @param {AllDepositOrWithdrawTicketsRequest} ticketsRequest Its Limit is ignored.
+    * @param {number} [pageSize=100]
+    * @param {number} [readAhead=2]
+    * @param {string} [rowFormat='dict'] 'dict', 'typed' (AllWithdrawTicketsResult) or 'columns'.
+    * @param {number} [timeout] Seconds to wait for each page.
+    * @returns {Iterator}
+    * @memberof FoxBitClient
+    '''
+    def iterAllWithdrawTickets(self,
+      ticketsRequest: AllDepositOrWithdrawTicketsRequest,
+      pageSize: int = 100,
+      readAhead: int = 2,
+      rowFormat: str = "dict",
+      timeout: float = ONE_SHOT_TIMEOUT) -> Iterator:
+      return self.iterTickets("GetAllWithdrawTickets", ticketsRequest, AllWithdrawTicketsResult, pageSize, readAhead, rowFormat, timeout)
+
+    def iterTickets(self, endPointName: str, ticketsRequest: AllDepositOrWithdrawTicketsRequest, rowType,
+      pageSize: int, readAhead: int, rowFormat: str, timeout: float) -> Iterator:
+      if rowFormat not in ROW_FORMATS:
+        raise ValueError("rowFormat must be one of {}, got {!r}.".format(ROW_FORMATS, rowFormat))
+      pages = readPages(self, endPointName,
+        lambda index, count: self.ticketsPayload(ticketsRequest, StartIndex=index, Limit=count),
+        pageSize, readAhead=readAhead, startIndex=ticketsRequest.StartIndex or 0, timeout=timeout)
+      return iterRows(pages, rowFormat, rowType)
+
+    def ticketsPayload(self, ticketsRequest: AllDepositOrWithdrawTicketsRequest, **overrides) -> dict:
+      # Unset filters are left out rather than sent as null
+      payload = {name: getattr(ticketsRequest, name) for name in ticketsRequest.__dataclass_fields__}
+      payload.update(overrides)
+      return {name: value for name, value in payload.items() if value is not None}
+
     '''
     * Returns a single deposit ticket by matching its request code to one already in the database.
     * ************
@@ -1558,6 +2589,7 @@ class FoxBitClient(object):
       depositTicket = None
       if response is not None and not self.is_error_message(response):
         depositTicket = response
+        self.ticketCache.store("Deposit", depositTicket)
 
       return depositTicket
 
@@ -1596,5 +2628,144 @@ class FoxBitClient(object):
       withdrawTicket = None
       if response is not None and not self.is_error_message(response):
         withdrawTicket = response
+        self.ticketCache.store("Withdraw", withdrawTicket)
+
+      return withdrawTicket
+
+    '''
+    * Looks up many deposit tickets by request code at once. Up to `maxInFlight` GetDepositTicket
+    * requests are kept in flight over the connection (replies are matched by sequence number),
+    * and codes whose ticket was already seen in a terminal status (Rejected, FullyProcessed,
+    * Failed; see ticket_cache.py) are answered from the cache without a request.
+    * ************
+    * Only admin-level users can issue this call.
+    * @param {number} omsId
+    * @param {number} operatorId
+    * @param {number} accountId
+    * @param {List[string]} requestCodes
+    * @param {number} [maxInFlight=16]
+    * @param {number} [timeout] Seconds to wait for each reply.
+    * @returns {Dict[string, Dict]} Ticket by request code, in request order; None for a code that
+    * was not found or whose reply did not arrive in time.
+    * @memberof FoxBitClient
+    '''
+    def getDepositTicketBatch(self,
+      omsId: int,
+      operatorId: int,
+      accountId: int,
+      requestCodes: List[str],
+      maxInFlight: int = 16,
+      timeout: float = ONE_SHOT_TIMEOUT) -> Dict[str, dict]:
+      return self.getTicketBatch("GetDepositTicket", "Deposit", omsId, operatorId, accountId, requestCodes, maxInFlight, timeout)
+
+    '''
+    * Looks up many withdraw tickets by request code at once, as getDepositTicketBatch.
+    * ************
+    * Only admin-level users can issue this call.
+    * @param {number} omsId
+    * @param {number} operatorId
+    * @param {number} accountId
+    * @param {List[string]} requestCodes
+    * @param {number} [maxInFlight=16]
+    * @param {number} [timeout] Seconds to wait for each reply.
+    * @returns {Dict[string, Dict]}
+    * @memberof FoxBitClient
+    '''
+    def getWithdrawTicketBatch(self,
+      omsId: int,
+      operatorId: int,
+      accountId: int,
+      requestCodes: List[str],
+      maxInFlight: int = 16,
+      timeout: float = ONE_SHOT_TIMEOUT) -> Dict[str, dict]:
+      return self.getTicketBatch("GetWithdrawTicket", "Withdraw", omsId, operatorId, accountId, requestCodes, maxInFlight, timeout)
+
+    '''
+    * Starts a background watcher (see ticket_watcher.py) that follows deposit or withdraw tickets
+    * until they reach a terminal status and reports status changes only. Only the watched,
+    * non-terminal tickets are polled, each less often while its status stays the same, and
+    * with slower schedules for statuses that wait on a person (AdminProcessing, Pending2Fa).
+    * Add tickets with watcher.watch(requestCodes) or watcher.watchTickets(tickets); read
+    * changes from watcher.changes or watcher.addChangeCallback.
+    * ************
+    * Only admin-level users can issue this call.
+    * @param {string} kind "Deposit" or "Withdraw"
+    * @param {number} omsId
+    * @param {number} operatorId
+    * @param {number} accountId
+    * @param {List[string]} [requestCodes] Tickets to watch from the start.
+    * @param {Dict} [intervals] Poll intervals by status name, (first, longest) in seconds,
+    * overriding POLL_INTERVALS_BY_STATUS.
+    * @returns {TicketWatcher}
+    * @memberof FoxBitClient
+    '''
+    def startTicketWatcher(self,
+      kind: str,
+      omsId: int,
+      operatorId: int,
+      accountId: int,
+      requestCodes: List[str] = None,
+      intervals: Dict[str, Tuple[float, float]] = None) -> TicketWatcher:
+
+      if kind not in ("Deposit", "Withdraw"):
+        raise ValueError("kind must be 'Deposit' or 'Withdraw', got {!r}.".format(kind))
+      watcher = TicketWatcher(self, kind, omsId, operatorId, accountId, intervals=intervals)
+      if requestCodes:
+        watcher.watch(requestCodes)
+      return watcher.start()
+
+    def getTicketBatch(self, endPointName: str, kind: str, omsId: int, operatorId: int, accountId: int,
+      requestCodes: List[str], maxInFlight: int, timeout: float) -> Dict[str, dict]:
+      requestCodes = list(dict.fromkeys(requestCodes))
+      ticketsByCode = dict()
+      codesToFetch = []
+      for requestCode in requestCodes:
+        ticket = self.ticketCache.get(kind, requestCode)
+        if ticket is not None:
+          ticketsByCode[requestCode] = ticket
+        else:
+          codesToFetch.append(requestCode)
+
+      codesToFetch = iter(codesToFetch)
+      inFlight = dict()
+      completed = Queue()
+      def fillWindow():
+        while len(inFlight) < maxInFlight:
+          requestCode = next(codesToFetch, None)
+          if requestCode is None:
+            return
+          future = self.sendRequestAsync(endPointName, {
+            "OMSId": omsId,
+            "OperatorId": operatorId,
+            "RequestCode": requestCode,
+            "AccountId": accountId,
+          })
+          inFlight[future] = (requestCode, monotonic() + timeout)
+          future.add_done_callback(completed.put)
 
-      return withdrawTicket
\ No newline at end of file
+      fillWindow()
+      while inFlight:
+        # Requests are sent in order, so the oldest one in flight has the nearest deadline
+        nextDeadline = next(iter(inFlight.values()))[1]
+        try:
+          future = completed.get(timeout=max(0.0, nextDeadline - monotonic()))
+        except Empty:
+          now = monotonic()
+          for future in [future for future, (_, deadline) in inFlight.items() if deadline <= now]:
+            requestCode, _ = inFlight.pop(future)
+            self.pendingReplies.pop(future.sequence, None)
+            ticketsByCode[requestCode] = None
+        else:
+          if future not in inFlight:
+            continue
+          requestCode, _ = inFlight.pop(future)
+          ticket = None
+          if future.exception() is None:
+            response = future.result()
+            if response is not None and not self.is_error_message(response):
+              ticket = response
+              self.ticketCache.store(kind, ticket)
+          ticketsByCode[requestCode] = ticket
+        fillWindow()
+
+      return {requestCode: ticketsByCode.get(requestCode) for requestCode in requestCodes}
\ No newline at end of file
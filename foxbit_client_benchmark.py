@@ -0,0 +1,244 @@
+#!/usr/bin/env python3.7
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+from datetime import datetime, timezone
+from time import perf_counter, perf_counter_ns, time
+
+from foxbit_client import FoxBitClient
+from helpers import formatL2Snapshots, formatTicks
+from message_enums import MessageType, OrderType, PegPriceType, Side, TimeInForce
+from message_frame import MessageFrame
+from message_request import SendOrderRequest
+from metrics_service import LatencyHistogram
+from mock_server import MockFoxBitServer
+from order_template import OrderTemplate
+
+DEFAULT_OUTPUT = "benchmark-results.json"
+
+# Run in a fresh interpreter: prints the import and construction times in nanoseconds and
+# every file the client left in its working directory
+STARTUP_PROBE = """
+import json, os, sys
+from time import perf_counter_ns
+sys.path.insert(0, sys.argv[1])
+startedAt = perf_counter_ns()
+from foxbit_client import FoxBitClient
+importedAt = perf_counter_ns()
+client = FoxBitClient()
+constructedAt = perf_counter_ns()
+files = [os.path.join(root, name) for root, _, names in os.walk(".") for name in names]
+print(json.dumps({"import": importedAt - startedAt, "construct": constructedAt - importedAt, "files": files}))
+"""
+
+def throughput(operation, iterations: int, itemsPerIteration: int = 1) -> dict:
+    startedAt = perf_counter()
+    for _ in range(iterations):
+        operation()
+    elapsed = perf_counter() - startedAt
+    items = iterations * itemsPerIteration
+    return {
+        "iterations": iterations,
+        "items": items,
+        "seconds": elapsed,
+        "itemsPerSecond": items / elapsed if elapsed > 0 else 0.0,
+        "nsPerItem": elapsed * 1e9 / items if items else 0.0,
+    }
+
+def latencySummary(histogram: LatencyHistogram) -> dict:
+    summary = histogram.snapshot(quantiles=(50.0, 90.0, 99.0, 99.9))
+    return {key: (value / 1e3 if key != "count" else value) for key, value in summary.items()}
+
+def makeSendOrderRequest(rng: random.Random, clientOrderId: int) -> SendOrderRequest:
+    return SendOrderRequest(
+        AccountId=1, ClientOrderId=clientOrderId, Quantity=round(rng.uniform(0.001, 0.01), 8),
+        DisplayQuantity=0, UseDisplayQuantity=False, LimitPrice=round(rng.uniform(140000, 149000), 2),
+        OrderIdOCO=0, OrderType=OrderType.Limit, PegPriceType=PegPriceType.Last, InstrumentId=1,
+        TrailingAmount=0, LimitOffset=0, Side=rng.choice((Side.Buy, Side.Sell)), StopPrice=0,
+        TimeInForce=TimeInForce.GTC, OMSId=1)
+
+def syntheticFrames(rng: random.Random) -> dict:
+    server = MockFoxBitServer()
+    level1 = server.level1Payload(rng, 1)
+    level2 = [server.level2Row(1, 150000.0 + rng.randint(-100, 100), rng.uniform(0, 2), rng.randint(0, 1), 1)]
+    trades = [server.tradeRow(rng, 1)]
+    ticker = [server.tickerRow(rng, 1, int(time() * 1e3))]
+
+    def frame(messageType, functionName, payload):
+        return json.dumps({"m": messageType.value, "i": 2, "n": functionName, "o": json.dumps(payload)})
+
+    return {
+        "Level1UpdateEvent": frame(MessageType.Event, "Level1UpdateEvent", level1),
+        "Level2UpdateEvent": frame(MessageType.Event, "Level2UpdateEvent", level2),
+        "TradeDataUpdateEvent": frame(MessageType.Event, "TradeDataUpdateEvent", trades),
+        "TickerDataUpdateEvent": frame(MessageType.Event, "TickerDataUpdateEvent", ticker),
+        "GetInstruments": frame(MessageType.Reply, "GetInstruments", server.instruments),
+    }
+
+def benchEncode(options: argparse.Namespace) -> dict:
+    scale = options.scale
+    rng = random.Random(0)
+    request = MessageFrame(MessageType.Request, "GetL2Snapshot", {"OMSId": 1, "InstrumentId": 1, "Depth": 100})
+    order = MessageFrame(MessageType.Request, "SendOrder", makeSendOrderRequest(rng, 1))
+    template = OrderTemplate(order.payload)
+    return {
+        "GetL2Snapshot": throughput(request.to_json, 20000 * scale),
+        "SendOrder": throughput(order.to_json, 5000 * scale),
+        "SendOrderTemplate": throughput(lambda: template.render(2, 1, Side.Buy, 0.0123, 146821.59), 50000 * scale),
+    }
+
+def benchDispatch(options: argparse.Namespace) -> dict:
+    scale = options.scale
+    client = FoxBitClient(enableConnLog=False, logLevel=options.logLevel)
+    results = dict()
+    for functionName, frame in syntheticFrames(random.Random(0)).items():
+        results[functionName] = throughput(lambda: client.onMessage(None, frame), 2000 * scale)
+    return results
+
+def benchFormat(options: argparse.Namespace) -> dict:
+    scale = options.scale
+    rng = random.Random(0)
+    server = MockFoxBitServer()
+    ticks = [server.tickerRow(rng, 1, 1600000000000 + i * 60000) for i in range(1000)]
+    snapshots = server.bookRows(rng, 1, 500)
+    return {
+        "formatTicks": throughput(lambda: formatTicks(ticks), 10 * scale, len(ticks)),
+        "formatL2Snapshots": throughput(lambda: formatL2Snapshots(snapshots), 10 * scale, len(snapshots)),
+    }
+
+def benchBookApply(options: argparse.Namespace) -> dict:
+    scale = options.scale
+    # The client has no book builder of its own: this is the reference consumer a strategy would
+    # run on each Level2UpdateEvent row (price-level map per side, delete on ActionType 2)
+    rng = random.Random(0)
+    server = MockFoxBitServer()
+    updates = [
+        server.level2Row(1, 150000.0 + rng.randint(-500, 500) * 0.5, rng.uniform(0, 2), rng.randint(0, 1), rng.randint(0, 2))
+        for _ in range(10000)
+    ]
+    book = ({}, {})
+
+    def apply():
+        for row in updates:
+            levels = book[row[9]]
+            if row[3] == 2:
+                levels.pop(row[6], None)
+            else:
+                levels[row[6]] = row[8]
+
+    return {"Level2UpdateEvent": throughput(apply, 5 * scale, len(updates))}
+
+def benchSendOrder(options: argparse.Namespace) -> dict:
+    scale = options.scale
+    server = MockFoxBitServer(eventRates={name: 0 for name in ("Level1UpdateEvent", "Level2UpdateEvent",
+        "TradeDataUpdateEvent", "TickerDataUpdateEvent")}).start()
+    client = FoxBitClient(enableConnLog=False, logLevel=options.logLevel)
+    try:
+        client.connect(server.url)
+        client.authenticateUser(apiKey=server.apiKey, apiSecret=server.apiSecret, userId=server.userId)
+        rng = random.Random(0)
+        histogram = LatencyHistogram()
+        for clientOrderId in range(1, 200 * scale + 1):
+            request = makeSendOrderRequest(rng, clientOrderId)
+            startedAt = perf_counter_ns()
+            client.sendOrder(request)
+            histogram.record(perf_counter_ns() - startedAt)
+        template = OrderTemplate(makeSendOrderRequest(rng, 0))
+        templateHistogram = LatencyHistogram()
+        for clientOrderId in range(200 * scale + 1, 400 * scale + 1):
+            request = makeSendOrderRequest(rng, clientOrderId)
+            startedAt = perf_counter_ns()
+            client.sendOrderFromTemplate(template, clientOrderId, request.Side, request.Quantity, request.LimitPrice)
+            templateHistogram.record(perf_counter_ns() - startedAt)
+        return {
+            "roundTripMicroseconds": latencySummary(histogram),
+            "templateRoundTripMicroseconds": latencySummary(templateHistogram),
+        }
+    finally:
+        client.disconnect()
+        server.stop()
+
+def benchStartup(options: argparse.Namespace) -> dict:
+    repository = os.path.dirname(os.path.abspath(__file__))
+    histograms = {"import": LatencyHistogram(), "construct": LatencyHistogram()}
+    files = set()
+    for _ in range(10 * options.scale):
+        with tempfile.TemporaryDirectory() as folder:
+            output = subprocess.run([sys.executable, "-c", STARTUP_PROBE, repository],
+                cwd=folder, check=True, capture_output=True, text=True).stdout
+        probe = json.loads(output)
+        for stage, histogram in histograms.items():
+            histogram.record(probe[stage])
+        files.update(probe["files"])
+    results = {stage: latencySummary(histogram) for stage, histogram in histograms.items()}
+    results["construct"]["filesCreated"] = sorted(files)
+    return results
+
+BENCHMARKS = {
+    "startup": benchStartup,
+    "encode": benchEncode,
+    "dispatch": benchDispatch,
+    "format": benchFormat,
+    "bookApply": benchBookApply,
+    "sendOrder": benchSendOrder,
+}
+
+def compare(current: dict, baseline: dict):
+    # Prints the ratio of every throughput (higher is better) and latency percentile (lower is better)
+    for benchmark, cases in current["results"].items():
+        for case, metrics in cases.items():
+            previous = baseline.get("results", {}).get(benchmark, {}).get(case)
+            if not previous:
+                continue
+            for key in ("itemsPerSecond", "p50", "p99"):
+                value, before = metrics.get(key), previous.get(key)
+                if value is not None and before:
+                    print("{:<12}{:<28}{:<16}{:>14.2f}{:>14.2f}{:>9.2f}x".format(
+                        benchmark, case, key, before, value, value / before))
+
+def main():
+    parser = argparse.ArgumentParser(description="FoxBit client benchmarks.")
+    parser.add_argument("--only", nargs="*", choices=sorted(BENCHMARKS), help="benchmarks to run (default: all)")
+    parser.add_argument("--scale", type=int, default=1, help="multiplier for the number of iterations")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="where to save the JSON results")
+    parser.add_argument("--compare", help="previous JSON results to compare against")
+    parser.add_argument("--log-level", dest="logLevel", default="DEBUG",
+        choices=["DEBUG", "INFO", "WARNING", "ERROR"], help="client log level")
+    args = parser.parse_args()
+
+    results = dict()
+    for name in (args.only or BENCHMARKS):
+        print("Running {}...".format(name))
+        results[name] = BENCHMARKS[name](args)
+    report = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "scale": args.scale,
+        "logLevel": args.logLevel,
+        "results": results,
+    }
+    folder = os.path.dirname(args.output)
+    if folder and not os.path.exists(folder):
+        os.makedirs(folder)
+    with open(args.output, "w") as output:
+        json.dump(report, output, indent=2)
+    for benchmark, cases in results.items():
+        for case, metrics in cases.items():
+            if "itemsPerSecond" in metrics:
+                print("{:<12}{:<28}{:>14.0f} items/s {:>10.0f} ns/item".format(
+                    benchmark, case, metrics["itemsPerSecond"], metrics["nsPerItem"]))
+            else:
+                print("{:<12}{:<28} p50 {:.1f} us  p99 {:.1f} us  p99.9 {:.1f} us".format(
+                    benchmark, case, metrics["p50"], metrics["p99"], metrics["p99.9"]))
+    if args.compare:
+        with open(args.compare) as baseline:
+            compare(report, json.load(baseline))
+
+if __name__ == "__main__":
+    main()
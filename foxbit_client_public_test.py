@@ -1,4 +1,5 @@
 #!/usr/bin/env python3.7
+import sys
 from api_descriptors import RotatingQueue
 from queue import Empty
 from datetime import datetime, timedelta
@@ -16,14 +17,14 @@ def get_response(q: RotatingQueue, timeout=30):
         print("Timed out")
     return response
 
-def test_sequence():
+def test_sequence(url="wss://api.foxbit.com.br"):
     print(Fore.CYAN + "FoxBit Client - API Public endpoints" + Style.RESET_ALL)
     print(Fore.CYAN + "FoxBit Client - Requests" + Style.RESET_ALL)
     client = FoxBitClient(enableConnLog=True)
     omsId = 1
 
     print("{0:<30}".format("connect()"), end='')
-    response = client.connect()
+    response = client.connect(url)
     if response and client.isConnected():
         print(OK)
     else:
@@ -83,7 +84,7 @@ def test_sequence():
         print(FAILED)
 
     print("{0:<30}".format("connect() (reconnect)"), end='')
-    response = client.connect()
+    response = client.connect(url)
     if response and client.isConnected():
         print(OK)
     else:
@@ -154,4 +155,11 @@ def test_sequence():
         print(FAILED)
 
 if __name__ == "__main__":
-    test_sequence()
\ No newline at end of file
+    # Run against a local mock server with: python3 foxbit_client_public_test.py --mock
+    if "--mock" in sys.argv:
+        from mock_server import MockFoxBitServer
+        server = MockFoxBitServer().start()
+        test_sequence(server.url)
+        server.stop()
+    else:
+        test_sequence()
\ No newline at end of file
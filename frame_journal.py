@@ -0,0 +1,156 @@
+import os
+import struct
+import zlib
+from collections import deque
+from enum import Enum
+from threading import Event, Thread
+from time import time_ns
+from typing import Iterator, Tuple
+
+JOURNAL_MAGIC = b"FXJ1"
+# magic, compression
+FILE_HEADER = struct.Struct("<4sB")
+# stored length, raw length
+BLOCK_HEADER = struct.Struct("<II")
+# direction, timestamp (ns since epoch), frame length
+ENTRY_HEADER = struct.Struct("<BqI")
+
+class FrameDirection(Enum):
+    Inbound = 0
+    Outbound = 1
+
+class JournalCompression(Enum):
+    NoCompression = 0
+    Zlib = 1
+    Lzma = 2
+
+def compressBlock(compression: JournalCompression, data: bytes, level: int = None) -> bytes:
+    if compression == JournalCompression.Zlib:
+        return zlib.compress(data, level if level is not None else 6)
+    if compression == JournalCompression.Lzma:
+        import lzma
+        return lzma.compress(data, preset=level)
+    return data
+
+def decompressBlock(compression: JournalCompression, data: bytes) -> bytes:
+    if compression == JournalCompression.Zlib:
+        return zlib.decompress(data)
+    if compression == JournalCompression.Lzma:
+        import lzma
+        return lzma.decompress(data)
+    return data
+
+def readJournalHeader(journal) -> JournalCompression:
+    header = journal.read(FILE_HEADER.size)
+    if len(header) < FILE_HEADER.size:
+        raise ValueError("Truncated frame journal header.")
+    magic, compression = FILE_HEADER.unpack(header)
+    if magic != JOURNAL_MAGIC:
+        raise ValueError("Not a frame journal.")
+    return JournalCompression(compression)
+
+class FrameRecorder(object):
+    '''
+    Records raw websocket frames to an append-only journal. The file starts with a small
+    header naming the compression codec, followed by length-prefixed blocks, each one holding
+    a batch of length-prefixed entries (direction, receive timestamp in nanoseconds since the
+    epoch, UTF-8 frame). Batches are compressed independently, so a journal cut short by a
+    crash is readable up to its last complete block.
+
+    `record` only appends to an in-memory deque; encoding, compression and file writes all
+    happen on the recorder thread every `flushInterval` seconds.
+    '''
+    def __init__(self, path: str, compression: JournalCompression = JournalCompression.Zlib,
+        compressionLevel: int = None, flushInterval: float = 0.25):
+        self.path = path
+        self.compression = compression
+        self.compressionLevel = compressionLevel
+        self.flushInterval = flushInterval
+        self.buffer = deque()
+        self.framesWritten = 0
+        self.bytesWritten = 0
+        self.journal = None
+        self.thread = None
+        self.stopEvent = Event()
+
+    def record(self, direction: FrameDirection, frame: str):
+        self.buffer.append((direction.value, time_ns(), frame))
+
+    def start(self):
+        if self.thread is not None:
+            return self
+        folder = os.path.dirname(self.path)
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder)
+        if os.path.exists(self.path) and os.path.getsize(self.path) > 0:
+            with open(self.path, "rb") as journal:
+                compression = readJournalHeader(journal)
+            if compression != self.compression:
+                raise ValueError("Journal {} uses {} compression, not {}.".format(
+                    self.path, compression.name, self.compression.name))
+            self.journal = open(self.path, "ab")
+        else:
+            self.journal = open(self.path, "wb")
+            self.journal.write(FILE_HEADER.pack(JOURNAL_MAGIC, self.compression.value))
+        self.stopEvent.clear()
+        self.thread = Thread(target=self.run, daemon=True)
+        self.thread.start()
+        return self
+
+    def run(self):
+        while not self.stopEvent.wait(self.flushInterval):
+            self.flush()
+        self.flush()
+
+    def flush(self):
+        entries = []
+        count = 0
+        buffer = self.buffer
+        while buffer:
+            direction, timestamp, frame = buffer.popleft()
+            data = frame.encode("utf-8") if isinstance(frame, str) else frame
+            entries.append(ENTRY_HEADER.pack(direction, timestamp, len(data)))
+            entries.append(data)
+            count += 1
+        if count == 0:
+            return
+        raw = b"".join(entries)
+        stored = compressBlock(self.compression, raw, self.compressionLevel)
+        self.journal.write(BLOCK_HEADER.pack(len(stored), len(raw)))
+        self.journal.write(stored)
+        self.journal.flush()
+        self.framesWritten += count
+        self.bytesWritten += BLOCK_HEADER.size + len(stored)
+
+    def stop(self):
+        if self.thread is None:
+            return
+        self.stopEvent.set()
+        self.thread.join()
+        self.thread = None
+        self.journal.close()
+        self.journal = None
+
+def readFrameJournal(path: str) -> Iterator[Tuple[FrameDirection, int, str]]:
+    '''
+    Yields (direction, timestampNs, frame) for every entry of a journal written by
+    FrameRecorder, in recording order. A truncated trailing block is ignored.
+    '''
+    with open(path, "rb") as journal:
+        compression = readJournalHeader(journal)
+        while True:
+            header = journal.read(BLOCK_HEADER.size)
+            if len(header) < BLOCK_HEADER.size:
+                return
+            storedLength, rawLength = BLOCK_HEADER.unpack(header)
+            stored = journal.read(storedLength)
+            if len(stored) < storedLength:
+                return
+            raw = decompressBlock(compression, stored)
+            offset = 0
+            while offset < rawLength:
+                direction, timestamp, length = ENTRY_HEADER.unpack_from(raw, offset)
+                offset += ENTRY_HEADER.size
+                frame = raw[offset:offset + length].decode("utf-8")
+                offset += length
+                yield FrameDirection(direction), timestamp, frame
@@ -0,0 +1,66 @@
+from threading import Event, Thread
+from time import perf_counter_ns
+
+from frame_journal import FrameDirection, readFrameJournal
+
+NANOSECONDS_PER_SECOND = 1e9
+
+class FrameReplayer(object):
+    '''
+    Feeds the inbound frames of a journal recorded by FrameRecorder through
+    `FoxBitClient.onMessage`, so they take the exact decode and dispatch path of live
+    traffic (endpoint queues, callbacks, metrics, tracing hooks) without any network.
+
+    `speed` paces the replay against the recorded timestamps: 1.0 is real time, 10.0 is
+    ten times faster, and None (or 0) replays as fast as possible, which doubles as a
+    reproducible throughput benchmark of the whole receive path.
+    '''
+    def __init__(self, client, path: str, speed: float = 1.0):
+        self.client = client
+        self.path = path
+        self.speed = speed
+        self.stopEvent = Event()
+        self.thread = None
+        self.stats = None
+
+    def run(self) -> dict:
+        self.stopEvent.clear()
+        onMessage = self.client.onMessage
+        paced = bool(self.speed)
+        firstTimestamp = None
+        frames = 0
+        startedAt = perf_counter_ns()
+        for direction, timestamp, frame in readFrameJournal(self.path):
+            if self.stopEvent.is_set():
+                break
+            if direction != FrameDirection.Inbound:
+                continue
+            if paced:
+                if firstTimestamp is None:
+                    firstTimestamp = timestamp
+                delay = (timestamp - firstTimestamp) / self.speed - (perf_counter_ns() - startedAt)
+                if delay > 0 and self.stopEvent.wait(delay / NANOSECONDS_PER_SECOND):
+                    break
+            onMessage(None, frame)
+            frames += 1
+        elapsed = (perf_counter_ns() - startedAt) / NANOSECONDS_PER_SECOND
+        self.stats = {
+            "frames": frames,
+            "elapsedSeconds": elapsed,
+            "framesPerSecond": frames / elapsed if elapsed > 0 else 0.0,
+        }
+        return self.stats
+
+    def start(self):
+        self.thread = Thread(target=self.run, daemon=True)
+        self.thread.start()
+        return self
+
+    def join(self, timeout: float = None) -> dict:
+        if self.thread is not None:
+            self.thread.join(timeout)
+        return self.stats
+
+    def stop(self):
+        self.stopEvent.set()
+        return self.join()
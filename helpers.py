@@ -1,17 +1,55 @@
 import json
+import concurrent.futures
+from concurrent.futures import Future
+from dataclasses import asdict, is_dataclass
 from datetime import datetime, timezone
-from typing import List
+from enum import Enum
+from typing import List, Union
 from numbers import Number
 
-def jsonStringify(input_dict: dict) -> str:
+def jsonStringify(input_dict: Union[dict, object]) -> str:
+    # Request dataclasses (e.g. SendOrderRequest) are sent as their fields, enums as their values
+    if is_dataclass(input_dict):
+        input_dict = asdict(input_dict)
     return_dict = dict()
     for key, value in input_dict.items():
-        if isinstance(value, dict):
+        if isinstance(value, dict) or is_dataclass(value):
             return_dict[key] = jsonStringify(value)
+        elif isinstance(value, Enum):
+            return_dict[key] = value.value
         else:
             return_dict[key] = value
     return json.dumps(return_dict)
 
+def canonicalJson(payload: Union[dict, object]) -> str:
+    # Same text for equal payloads whatever their key order, e.g. to key in-flight requests
+    if is_dataclass(payload):
+        payload = asdict(payload)
+    return json.dumps(payload, sort_keys=True, default=lambda value: value.value if isinstance(value, Enum) else str(value))
+
+# Raised on resolving a future that is already done from Python 3.8 on; earlier versions
+# silently replace the first outcome, hence the done() checks below
+FutureStateError = getattr(concurrent.futures, "InvalidStateError", RuntimeError)
+
+def resolveFuture(future: Future, result) -> bool:
+    # False when the future was already cancelled or resolved, e.g. by a caller giving up
+    if future.done():
+        return False
+    try:
+        future.set_result(result)
+    except FutureStateError:
+        return False
+    return True
+
+def failFuture(future: Future, exception: BaseException) -> bool:
+    if future.done():
+        return False
+    try:
+        future.set_exception(exception)
+    except FutureStateError:
+        return False
+    return True
+
 def formatTicks(ticks: List[List[Number]]) -> List[dict]:
   formattedTicks = []
   for tick in ticks:
@@ -1,82 +1,396 @@
 import os
-from logging import Logger, FileHandler, NOTSET, DEBUG, INFO, WARNING, ERROR, CRITICAL
-from datetime import datetime
-from colorama import Fore, Style
+import re
+import sys
+import atexit
+import itertools
+from logging import Logger, Handler, LogRecord, Formatter, StreamHandler, NOTSET, DEBUG, INFO, WARNING, ERROR, CRITICAL
+from datetime import datetime, timedelta
+from queue import SimpleQueue, Empty
+from threading import Lock, Thread
+from time import time, monotonic
+from typing import Optional
 
-COLORMAP = {
-    NOTSET: Fore.RESET,
-    DEBUG: Fore.CYAN,
-    INFO: Fore.GREEN,
-    WARNING: Fore.YELLOW,
-    ERROR: Fore.LIGHTRED_EX,
-    CRITICAL: Fore.RED
-}
+class ColorFormatter(Formatter):
+    # colorama is only imported once a terminal handler actually needs colours
+    def __init__(self, *args, **kwargs):
+        from colorama import Fore, Style
+        super().__init__(*args, **kwargs)
+        self.colorMap = {
+            NOTSET: Fore.RESET,
+            DEBUG: Fore.CYAN,
+            INFO: Fore.GREEN,
+            WARNING: Fore.YELLOW,
+            ERROR: Fore.LIGHTRED_EX,
+            CRITICAL: Fore.RED
+        }
+        self.defaultColor = Fore.RESET
+        self.colorReset = Style.RESET_ALL
 
-COLOR_RESET = Style.RESET_ALL
+    def format(self, record):
+        return self.colorMap.get(record.levelno, self.defaultColor) + super().format(record) + self.colorReset
 
-class RotatingFileLogger(Logger):
-    def __init__(self, name, folder, encoding='utf-8', level=DEBUG, maxFileSize=20):
+class TerminalHandler(StreamHandler):
+    '''
+    Stream handler that colours records by level, but only when the stream is a terminal;
+    redirected output stays free of escape codes.
+    '''
+    def __init__(self, stream=None):
+        super().__init__(stream if stream is not None else sys.stderr)
+        isatty = getattr(self.stream, "isatty", None)
+        if isatty is not None and isatty():
+            self.setFormatter(ColorFormatter())
+
+# Files of earlier days written to more recently than this may still be open in another client
+LEFTOVER_QUIET_SECONDS = 3600
+# Numbers the writers of this process, so no two of them ever share a file
+writerNumbers = itertools.count(1)
+
+class LogRetentionPolicy(object):
+    '''
+    What happens to log files once they are rotated out: gzip compression, deletion after
+    `maxAgeDays` days and deletion of the oldest files while all of them together exceed
+    `maxTotalSize` megabytes. None disables a limit.
+    '''
+    def __init__(self, compress=True, maxAgeDays=30, maxTotalSize=1024):
+        self.compress = compress
+        self.maxAgeDays = maxAgeDays
+        self.maxTotalSize = maxTotalSize
+
+class LogArchiver(object):
+    '''
+    Compresses and prunes the rotated files of one logger on its own daemon thread, so the
+    writer thread only switches file handles and never waits for gzip or deletions. Only
+    files known to be closed are touched: each one handed over by `submit` after a rotation
+    and, from earlier runs, files dated before today that have not been written to for
+    LEFTOVER_QUIET_SECONDS. Every writer names its files after its own process and instance
+    (see RotatingFileWriter), so a file closed by one writer is never one another is still
+    appending to.
+    '''
+    def __init__(self, name, folder, policy: LogRetentionPolicy):
         self.folder = folder
+        self.policy = policy
+        self.pattern = re.compile(r"^{}-(\d{{4}}-\d{{2}}-\d{{2}})-(?:\d+\.\d+-)?\d+\.log(\.gz)?$".format(re.escape(name)))
+        self.closed = set()
+        self.queue = SimpleQueue()
+        self.thread = None
+
+    def submit(self, closedFilename):
+        if self.thread is None:
+            # Leftovers from previous runs are archived along with the first rotation
+            self.closed.update(self.leftovers())
+            self.thread = Thread(target=self.run, daemon=True)
+            self.thread.start()
+        self.queue.put(closedFilename)
+
+    def leftovers(self):
+        today = datetime.now().strftime("%Y-%m-%d")
+        quietSince = time() - LEFTOVER_QUIET_SECONDS
+        for name in os.listdir(self.folder):
+            match = self.pattern.match(name)
+            if match is None or match.group(1) >= today:
+                continue
+            try:
+                if os.stat(os.path.join(self.folder, name)).st_mtime < quietSince:
+                    yield name
+            except FileNotFoundError:
+                pass
+
+    def run(self):
+        while True:
+            closedFilename = self.queue.get()
+            if closedFilename is not None:
+                self.closed.add(os.path.basename(closedFilename))
+            try:
+                self.archive()
+            except OSError:
+                pass
+
+    def archive(self):
+        if self.policy.compress:
+            for name in [name for name in self.closed if name.endswith(".log")]:
+                path = os.path.join(self.folder, name)
+                if os.path.exists(path):
+                    self.compress(path)
+                self.closed.discard(name)
+                self.closed.add(name + ".gz")
+        stats = []
+        for name in list(self.closed):
+            path = os.path.join(self.folder, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                self.closed.discard(name)
+                continue
+            stats.append((stat.st_mtime, stat.st_size, name))
+        stats.sort()
+        if self.policy.maxAgeDays is not None:
+            oldest = time() - self.policy.maxAgeDays * 86400
+            while stats and stats[0][0] < oldest:
+                self.remove(stats.pop(0)[2])
+        if self.policy.maxTotalSize is not None:
+            totalSize = sum(size for _, size, _ in stats)
+            while stats and totalSize > self.policy.maxTotalSize * 1024 * 1024:
+                _, size, name = stats.pop(0)
+                self.remove(name)
+                totalSize -= size
+
+    def remove(self, name):
+        os.remove(os.path.join(self.folder, name))
+        self.closed.discard(name)
+
+    def compress(self, path):
+        import gzip
+        import shutil
+        temporaryPath = path + ".gz.tmp"
+        with open(path, "rb") as source, gzip.open(temporaryPath, "wb") as target:
+            shutil.copyfileobj(source, target)
+        shutil.copystat(path, temporaryPath)
+        os.replace(temporaryPath, path + ".gz")
+        os.remove(path)
+
+class RotatingFileWriter(Handler):
+    '''
+    File handler used by the background writer thread. Rotation is decided from the byte
+    count it has written itself and from a cached deadline for the next local midnight, so
+    no stat() or strftime() call is made per record. Files are named
+    `name-date-pid.instance-sequence.log`: clients in one process or in several sharing a
+    folder each rotate on their own byte counts, so they must never append to the same file.
+    '''
+    def __init__(self, name, folder, encoding='utf-8', maxFileSize=20, retention: LogRetentionPolicy = None):
+        super().__init__()
+        self.name = name
+        self.folder = folder
+        self.encoding = encoding
+        self.maxFileSize = maxFileSize * 1024 * 1024
+        self.token = "{}.{}".format(os.getpid(), next(writerNumbers))
         self.seqNumber = 0
         self.dateTime = None
-        self.maxFileSize = maxFileSize * 1024 * 1024
-        self.encoding = encoding
-        if not os.path.exists(folder):
-            os.mkdir(folder)
-        super().__init__(name, level=level)
+        self.rolloverAt = 0.0
+        self.bytesWritten = 0
+        self.stream = None
+        self.baseFilename = None
+        self.archiver = LogArchiver(name, folder, retention) if retention is not None else None
 
-    def rotateFile(self):
-        startNewHandler = False
-        dateTime = datetime.now().strftime("%Y-%m-%d")
-        if not self.hasHandlers():
+    def rotate(self, now):
+        previousStream = self.stream
+        previousFilename = self.baseFilename
+        day = datetime.fromtimestamp(now).date()
+        dateTime = day.strftime("%Y-%m-%d")
+        if dateTime != self.dateTime:
             self.seqNumber = 1
             self.dateTime = dateTime
-            startNewHandler = True
+            self.rolloverAt = datetime.combine(day + timedelta(days=1), datetime.min.time()).timestamp()
         else:
-            if dateTime != self.dateTime:
-                self.seqNumber = 1
-                self.dateTime = dateTime
-                startNewHandler = True
-            elif os.path.getsize(self.handlers[-1].baseFilename) > self.maxFileSize:
-                self.seqNumber += 1
-                startNewHandler = True
-            else:
-                pass
-        
-        if startNewHandler:
-            if self.hasHandlers():
-                self.handlers[-1].close()
-            self.handlers.clear()
-            filePath = os.path.join(
-                self.folder, 
-                '-'.join([self.name, self.dateTime, str(self.seqNumber)]) + '.log'
+            self.seqNumber += 1
+        if not os.path.exists(self.folder):
+            os.mkdir(self.folder)
+        while True:
+            self.baseFilename = os.path.join(
+                self.folder,
+                '-'.join([self.name, self.dateTime, self.token, str(self.seqNumber)]) + '.log'
             )
-            self.addHandler(FileHandler(filePath, encoding=self.encoding))
+            # Never reopen a sequence number that has already been archived
+            if not os.path.exists(self.baseFilename + '.gz'):
+                break
+            self.seqNumber += 1
+        # The new file is open before the old one is released, then archived in the background
+        self.stream = open(self.baseFilename, 'ab')
+        self.bytesWritten = self.stream.tell()
+        if previousStream is not None:
+            previousStream.close()
+        if self.archiver is not None:
+            self.archiver.submit(previousFilename)
+
+    def emit(self, record):
+        try:
+            data = (self.format(record) + '\n').encode(self.encoding)
+            if self.stream is None or record.created >= self.rolloverAt or self.bytesWritten > self.maxFileSize:
+                self.rotate(record.created)
+            self.stream.write(data)
+            self.bytesWritten += len(data)
+        except Exception:
+            self.handleError(record)
+
+    def flush(self):
+        if self.stream is not None:
+            self.stream.flush()
+
+    def close(self):
+        if self.stream is not None:
+            self.stream.close()
+            self.stream = None
+        super().close()
+
+class DeferredQueueHandler(Handler):
+    '''
+    Hands records, unformatted, to a BackgroundLogWriter. The writer thread, and with it the
+    log folder and file, is only started by the first record that passes the filters.
+    '''
+    def __init__(self, writer):
+        super().__init__()
+        self.writer = writer
+        self.queue = writer.queue
+
+    # SimpleQueue.put is atomic, so the handler lock is not taken on the logging thread
+    def handle(self, record):
+        result = self.filter(record)
+        if isinstance(result, LogRecord):
+            record = result
+        if result:
+            if self.writer.thread is None:
+                self.writer.start()
+            self.queue.put_nowait(record)
+        return result
+
+    def emit(self, record):
+        self.handle(record)
+
+class BackgroundLogWriter(object):
+    '''
+    Drains a SimpleQueue of log records on a daemon thread and hands them to a handler,
+    flushing once per batch rather than once per record.
+    '''
+    def __init__(self, handler: Handler):
+        self.handler = handler
+        self.queue = SimpleQueue()
+        self.thread = None
+        self.stopped = False
+        self.lock = Lock()
+
+    def start(self):
+        with self.lock:
+            if self.thread is None and not self.stopped:
+                self.thread = Thread(target=self.run, daemon=True)
+                self.thread.start()
+                atexit.register(self.stop)
+        return self
+
+    def run(self):
+        queue = self.queue
+        handler = self.handler
+        while True:
+            record = queue.get()
+            while record is not None:
+                handler.handle(record)
+                try:
+                    record = queue.get_nowait()
+                except Empty:
+                    break
+            handler.flush()
+            if record is None:
+                return
+
+    def stop(self):
+        with self.lock:
+            self.stopped = True
+            if self.thread is not None:
+                self.queue.put(None)
+                self.thread.join()
+                self.thread = None
+                self.handler.close()
+
+class SamplingState(object):
+    def __init__(self, everyN=None, maxPerSecond=None):
+        self.everyN = everyN
+        self.maxPerSecond = maxPerSecond
+        self.seen = 0
+        self.windowSecond = 0
+        self.windowCount = 0
+        self.suppressed = 0
+        self.suppressedSinceLast = 0
+
+    def admit(self) -> Optional[int]:
+        self.seen += 1
+        if self.everyN and (self.seen - 1) % self.everyN != 0:
+            self.suppressed += 1
+            self.suppressedSinceLast += 1
+            return None
+        if self.maxPerSecond:
+            second = int(monotonic())
+            if second != self.windowSecond:
+                self.windowSecond = second
+                self.windowCount = 0
+            if self.windowCount >= self.maxPerSecond:
+                self.suppressed += 1
+                self.suppressedSinceLast += 1
+                return None
+            self.windowCount += 1
+        skipped = self.suppressedSinceLast
+        self.suppressedSinceLast = 0
+        return skipped
+
+class LogSampler(object):
+    '''
+    Decides, per function name, whether a message should be logged: every Nth message
+    (`everyN`), at most `maxPerSecond` messages per second, or both. Names without an explicit
+    policy use the default one; a policy with neither limit logs everything. `admit` returns
+    None for a message that must be skipped, otherwise how many were skipped since the last
+    one logged, and `suppressedCounts` reports the running totals.
+    '''
+    def __init__(self, defaultEveryN=None, defaultMaxPerSecond=None):
+        self.defaultEveryN = defaultEveryN
+        self.defaultMaxPerSecond = defaultMaxPerSecond
+        self.policyByFunction = dict()
+        self.stateByFunction = dict()
+
+    def configure(self, functionName: str, everyN: int = None, maxPerSecond: float = None):
+        self.policyByFunction[functionName] = (everyN, maxPerSecond)
+        self.stateByFunction.pop(functionName, None)
+
+    def admit(self, functionName: str) -> Optional[int]:
+        state = self.stateByFunction.get(functionName)
+        if state is None:
+            everyN, maxPerSecond = self.policyByFunction.get(
+                functionName, (self.defaultEveryN, self.defaultMaxPerSecond))
+            state = self.stateByFunction.setdefault(functionName, SamplingState(everyN, maxPerSecond))
+        return state.admit()
+
+    def suppressedCounts(self) -> dict:
+        return {name: state.suppressed for name, state in list(self.stateByFunction.items())}
+
+class RotatingFileLogger(Logger):
+    '''
+    Logger writing to `folder/name-date-pid.instance-sequence.log` on a background thread. Nothing touches
+    the disk until the first record is logged, so constructing one is free.
+    '''
+    def __init__(self, name, folder, encoding='utf-8', level=DEBUG, maxFileSize=20,
+        retention: LogRetentionPolicy = None):
+        self.folder = folder
+        self.maxFileSize = maxFileSize * 1024 * 1024
+        self.encoding = encoding
+        super().__init__(name, level=level)
+        self.writer = BackgroundLogWriter(RotatingFileWriter(
+            name, folder, encoding=encoding, maxFileSize=maxFileSize,
+            retention=retention if retention is not None else LogRetentionPolicy()))
+        self.addHandler(DeferredQueueHandler(self.writer))
 
-    def callHandlers(self, record):
-        self.rotateFile()
-        super().callHandlers(record)
+    def close(self):
+        self.writer.stop()
 
-    def _log(self, level, msg, args, exc_info=None, extra=None, stack_info=False):
-        color_msg = '\n' + COLORMAP[level] + msg + COLOR_RESET
-        super()._log(level, color_msg, args, exc_info, extra, stack_info)
+    def addTerminalHandler(self, stream=None, level=NOTSET) -> TerminalHandler:
+        handler = TerminalHandler(stream)
+        handler.setLevel(level)
+        self.addHandler(handler)
+        return handler
 
 class DefaultLogger(RotatingFileLogger):
-    def __init__(self, encoding='utf-8', level=DEBUG, maxFileSize=20):
+    def __init__(self, encoding='utf-8', level=DEBUG, maxFileSize=20,
+        retention: LogRetentionPolicy = None):
         super().__init__(
-            folder="logs", 
-            name="foxbit-client", 
-            encoding=encoding, 
-            level=level, 
-            maxFileSize=maxFileSize)
-        self.rotateFile()
+            folder="logs",
+            name="foxbit-client",
+            encoding=encoding,
+            level=level,
+            maxFileSize=maxFileSize,
+            retention=retention)
 
 class WebSocketLogger(RotatingFileLogger):
-    def __init__(self, encoding='utf-8', level=DEBUG, maxFileSize=20):
+    def __init__(self, encoding='utf-8', level=DEBUG, maxFileSize=20,
+        retention: LogRetentionPolicy = None):
         super().__init__(
-            folder="logs", 
-            name="foxbit-client-websocket", 
-            encoding=encoding, 
-            level=level, 
-            maxFileSize=maxFileSize)
-        self.rotateFile()
+            folder="logs",
+            name="foxbit-client-websocket",
+            encoding=encoding,
+            level=level,
+            maxFileSize=maxFileSize,
+            retention=retention)
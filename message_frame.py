@@ -4,7 +4,7 @@ class MessageFrame(object):
     def __init__(self, messageType, functionName, payload = None, sequence = 0):
         self.messageType = messageType
         self.functionName = functionName
-        self.sequence = 0
+        self.sequence = sequence
         self.payload = payload
 
     def to_json(self):
@@ -415,7 +415,7 @@ class AllDepositOrWithdrawTicketsRequest:
     @type {DepositStatus}
     @memberof AllDepositTicketsRequest
     '''
-    Status: DepositStatus
+    Status: DepositStatus = None
 
     '''
     The ID of a single deposit ticket that is unique across the Order
@@ -424,21 +424,21 @@ class AllDepositOrWithdrawTicketsRequest:
     @type {number}
     @memberof AllDepositTicketsRequest
     '''
-    TicketId: Number
+    TicketId: Number = None
 
     '''
     The start of the period over which to return deposit tickets, in ISO 8601 format.
     @type {string}
     @memberof AllDepositTicketsRequest
     '''
-    StartTimestamp: str
+    StartTimestamp: str = None
 
     '''
     The end of the period over which to return deposit tickets, in ISO 8601 format
     @type {string}
     @memberof AllDepositTicketsRequest
     '''
-    EndTimestamp: str
+    EndTimestamp: str = None
 
     '''
     Optional. The deposit ticket at which to start returning the array of
@@ -447,7 +447,7 @@ class AllDepositOrWithdrawTicketsRequest:
     @type {number}
     @memberof AllDepositTicketsRequest
     '''
-    StartIndex: Number
+    StartIndex: Number = None
 
     '''
     Optional. The total number of deposit tickets to return in the array. Limit
@@ -456,14 +456,14 @@ class AllDepositOrWithdrawTicketsRequest:
     @type {number}
     @memberof AllDepositTicketsRequest
     '''
-    Limit: Number
+    Limit: Number = None
 
     '''
     The name of the user making the deposit
     @type {string}
     @memberof AllDepositTicketsRequest
     '''
-    UserName: str
+    UserName: str = None
 
     '''
     The amount of the deposit. If you specify an Amount value, you must
@@ -471,7 +471,7 @@ class AllDepositOrWithdrawTicketsRequest:
     @type {number}
     @memberof AllDepositTicketsRequest
     '''
-    Amount: Number
+    Amount: Number = None
 
     '''
     Tells the response to return tickets in ranges based on the Amount value.
@@ -483,5 +483,5 @@ class AllDepositOrWithdrawTicketsRequest:
     @type {AmountOperator}
     @memberof AllDepositTicketsRequest
     '''
-    AmountOperator: AmountOperator
+    AmountOperator: AmountOperator = None
 
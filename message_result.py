@@ -131,6 +131,12 @@ class InstrumentResponse:
 
     QuantityIncrement: Number
 
+    PriceIncrement: Number
+
+    MinimumQuantity: Number
+
+    MinimumPrice: Number
+
 
 @dataclass
 class ProductResponse:
@@ -0,0 +1,277 @@
+import json
+from threading import Lock, Thread
+from time import monotonic
+
+NANOSECONDS_PER_SECOND = 1e9
+DEFAULT_QUANTILES = (50.0, 90.0, 99.0, 99.9)
+# Send timestamps kept for requests still waiting on their reply
+MAX_UNANSWERED_REQUESTS = 10000
+
+class LatencyHistogram(object):
+    '''
+    Log-linear (HDR-style) histogram of non-negative integer values, usually nanoseconds.
+    Every power-of-two range is split into `2 ** subBucketBits` linear sub-buckets, so the
+    relative error of any reported value is bounded by `2 ** -(subBucketBits - 1)` whatever
+    the magnitude, while memory grows only with the number of distinct buckets hit.
+    '''
+    def __init__(self, subBucketBits=7):
+        self.subBucketBits = subBucketBits
+        self.subBucketCount = 1 << subBucketBits
+        self.subBucketHalfCount = self.subBucketCount >> 1
+        self.counts = dict()
+        self.totalCount = 0
+        self.totalSum = 0
+        self.minValue = 0
+        self.maxValue = 0
+        self.lock = Lock()
+
+    def indexOf(self, value):
+        shift = value.bit_length() - self.subBucketBits
+        if shift <= 0:
+            return value
+        return shift * self.subBucketHalfCount + (value >> shift)
+
+    def highestEquivalentValue(self, index):
+        if index < self.subBucketCount:
+            return index
+        shift = index // self.subBucketHalfCount - 1
+        subBucket = index - shift * self.subBucketHalfCount
+        return ((subBucket + 1) << shift) - 1
+
+    def record(self, value):
+        if value < 0:
+            value = 0
+        index = self.indexOf(value)
+        with self.lock:
+            self.counts[index] = self.counts.get(index, 0) + 1
+            if self.totalCount == 0 or value < self.minValue:
+                self.minValue = value
+            if value > self.maxValue:
+                self.maxValue = value
+            self.totalCount += 1
+            self.totalSum += value
+
+    def percentile(self, percent):
+        with self.lock:
+            if self.totalCount == 0:
+                return 0
+            target = max(1, int(percent / 100.0 * self.totalCount + 0.5))
+            cumulative = 0
+            for index in sorted(self.counts):
+                cumulative += self.counts[index]
+                if cumulative >= target:
+                    return min(self.highestEquivalentValue(index), self.maxValue)
+            return self.maxValue
+
+    def reset(self):
+        with self.lock:
+            self.counts.clear()
+            self.totalCount = 0
+            self.totalSum = 0
+            self.minValue = 0
+            self.maxValue = 0
+
+    def snapshot(self, quantiles=DEFAULT_QUANTILES) -> dict:
+        summary = {
+            "count": self.totalCount,
+            "min": self.minValue,
+            "max": self.maxValue,
+            "mean": self.totalSum / self.totalCount if self.totalCount else 0.0,
+            "sum": self.totalSum,
+        }
+        for quantile in quantiles:
+            summary["p{:g}".format(quantile)] = self.percentile(quantile)
+        return summary
+
+class MessageCounter(object):
+    '''
+    Monotonic message counter that also keeps the number of messages seen during the last
+    complete wall-clock second, which is what the stats API reports as the current rate.
+    '''
+    def __init__(self):
+        self.count = 0
+        self.currentSecond = int(monotonic())
+        self.currentCount = 0
+        self.lastSecondCount = 0
+
+    def increment(self):
+        second = int(monotonic())
+        if second != self.currentSecond:
+            self.lastSecondCount = self.currentCount if second == self.currentSecond + 1 else 0
+            self.currentSecond = second
+            self.currentCount = 0
+        self.currentCount += 1
+        self.count += 1
+
+    def ratePerSecond(self) -> int:
+        second = int(monotonic())
+        if second == self.currentSecond:
+            return self.lastSecondCount
+        if second == self.currentSecond + 1:
+            return self.currentCount
+        return 0
+
+class ClientMetrics(object):
+    '''
+    In-process instrumentation for FoxBitClient. Writers are the socket thread (replies,
+    decode time, message counts) and the request threads (send timestamps); readers only
+    take snapshots, so nothing here ever blocks the receive path for long.
+    '''
+    def __init__(self):
+        self.startTime = monotonic()
+        # Send timestamps by (endpoint, sequence), so pipelined requests to one endpoint are
+        # each measured from their own send
+        self.sentAtByRequest = dict()
+        self.latencyByEndpoint = dict()
+        self.messagesByFunction = dict()
+        self.decodeHistogram = LatencyHistogram()
+        self.queueByName = dict()
+
+    def markSent(self, functionName: str, sequence: int, timestampNs: int):
+        sentAtByRequest = self.sentAtByRequest
+        sentAtByRequest[(functionName, sequence)] = timestampNs
+        # Requests that never got a reply are forgotten, oldest first
+        while len(sentAtByRequest) > MAX_UNANSWERED_REQUESTS:
+            try:
+                del sentAtByRequest[next(iter(sentAtByRequest))]
+            except (KeyError, RuntimeError, StopIteration):
+                break
+
+    def markReply(self, functionName: str, sequence: int, timestampNs: int):
+        sentAt = self.sentAtByRequest.pop((functionName, sequence), None)
+        if sentAt is None:
+            return
+        histogram = self.latencyByEndpoint.get(functionName)
+        if histogram is None:
+            histogram = self.latencyByEndpoint.setdefault(functionName, LatencyHistogram())
+        histogram.record(timestampNs - sentAt)
+
+    def countMessage(self, functionName: str):
+        counter = self.messagesByFunction.get(functionName)
+        if counter is None:
+            counter = self.messagesByFunction.setdefault(functionName, MessageCounter())
+        counter.increment()
+
+    def recordDecode(self, elapsedNs: int):
+        self.decodeHistogram.record(elapsedNs)
+
+    def watchQueue(self, name: str, queue):
+        self.queueByName[name] = queue
+
+    def reset(self):
+        self.startTime = monotonic()
+        self.sentAtByRequest.clear()
+        self.latencyByEndpoint.clear()
+        self.messagesByFunction.clear()
+        self.decodeHistogram.reset()
+
+    def snapshot(self) -> dict:
+        return {
+            "uptime": monotonic() - self.startTime,
+            "latency": {
+                name: histogram.snapshot() for name, histogram in list(self.latencyByEndpoint.items())
+            },
+            "messages": {
+                name: {"count": counter.count, "rate": counter.ratePerSecond()}
+                for name, counter in list(self.messagesByFunction.items())
+            },
+            "decode": self.decodeHistogram.snapshot(),
+            "queues": {
+                name: {
+                    "depth": queue.qsize(),
+                    "capacity": queue.maxsize,
+                    "dropped": getattr(queue, "drops", 0),
+                }
+                for name, queue in list(self.queueByName.items())
+            },
+        }
+
+    def toPrometheus(self, prefix="foxbit") -> str:
+        lines = []
+
+        def summary(name, help, labelName, histograms):
+            lines.append("# HELP {}_{} {}".format(prefix, name, help))
+            lines.append("# TYPE {}_{} summary".format(prefix, name))
+            for labelValue, histogram in histograms:
+                labels = '{}="{}",'.format(labelName, labelValue) if labelName else ""
+                for quantile in DEFAULT_QUANTILES:
+                    lines.append('{}_{}{{{}quantile="{:g}"}} {:.9f}'.format(
+                        prefix, name, labels, quantile / 100.0,
+                        histogram.percentile(quantile) / NANOSECONDS_PER_SECOND))
+                labels = "{" + labels[:-1] + "}" if labels else ""
+                lines.append("{}_{}_sum{} {:.9f}".format(
+                    prefix, name, labels, histogram.totalSum / NANOSECONDS_PER_SECOND))
+                lines.append("{}_{}_count{} {}".format(prefix, name, labels, histogram.totalCount))
+
+        def gauge(name, help, type, labelName, values):
+            lines.append("# HELP {}_{} {}".format(prefix, name, help))
+            lines.append("# TYPE {}_{} {}".format(prefix, name, type))
+            for labelValue, value in values:
+                lines.append('{}_{}{{{}="{}"}} {}'.format(prefix, name, labelName, labelValue, value))
+
+        summary("request_latency_seconds", "Time from sending a request to dispatching its reply.",
+            "endpoint", sorted(self.latencyByEndpoint.items()))
+        summary("decode_seconds", "Time spent decoding inbound frames.",
+            None, [(None, self.decodeHistogram)])
+        messages = sorted(self.messagesByFunction.items())
+        gauge("messages_received_total", "Inbound messages by function name.", "counter",
+            "function", [(name, counter.count) for name, counter in messages])
+        queues = sorted(self.queueByName.items())
+        gauge("queue_depth", "Items waiting in each endpoint queue.", "gauge",
+            "queue", [(name, queue.qsize()) for name, queue in queues])
+        gauge("queue_capacity", "Maximum size of each endpoint queue.", "gauge",
+            "queue", [(name, queue.maxsize) for name, queue in queues])
+        gauge("queue_dropped_total", "Items discarded by full rotating queues.", "counter",
+            "queue", [(name, getattr(queue, "drops", 0)) for name, queue in queues])
+        return "\n".join(lines) + "\n"
+
+class MetricsHttpServer(object):
+    '''
+    Serves `ClientMetrics` on a local stdlib HTTP endpoint: `/metrics` in the Prometheus
+    text format and `/stats` as the JSON snapshot.
+    '''
+    def __init__(self, metrics: ClientMetrics, host="127.0.0.1", port=9464):
+        self.metrics = metrics
+        self.host = host
+        self.port = port
+        self.server = None
+        self.thread = None
+
+    def start(self):
+        # Imported here so that clients which never serve metrics do not pay for http.server
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        metrics = self.metrics
+
+        class MetricsRequestHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == "/metrics":
+                    body = metrics.toPrometheus().encode("utf-8")
+                    contentType = "text/plain; version=0.0.4; charset=utf-8"
+                elif self.path == "/stats":
+                    body = json.dumps(metrics.snapshot()).encode("utf-8")
+                    contentType = "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", contentType)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((self.host, self.port), MetricsRequestHandler)
+        self.port = self.server.server_address[1]
+        self.thread = Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.thread.join()
+            self.server = None
+            self.thread = None
@@ -0,0 +1,902 @@
+#!/usr/bin/env python3.7
+import argparse
+import base64
+import hashlib
+import hmac
+import json
+import random
+import socket
+import struct
+from datetime import datetime, timezone
+from itertools import count
+from threading import Event, Lock, Thread
+from time import perf_counter, sleep, time
+
+from message_enums import DepositStatus, MessageType, WithdrawStatus
+
+WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+OPCODE_CONTINUATION = 0x0
+OPCODE_TEXT = 0x1
+OPCODE_BINARY = 0x2
+OPCODE_CLOSE = 0x8
+OPCODE_PING = 0x9
+OPCODE_PONG = 0xA
+
+DEFAULT_INSTRUMENTS = [
+    {
+        "OMSId": 1, "InstrumentId": 1, "Symbol": "BTC/BRL",
+        "Product1": 1, "Product1Symbol": "BTC", "Product2": 2, "Product2Symbol": "BRL",
+        "InstrumentType": "Standard", "VenueInstrumentId": 1, "VenueId": 1, "SortIndex": 0,
+        "SessionStatus": "Running", "PreviousSessionStatus": "Stopped",
+        "SessionStatusDateTime": "2020-01-01T00:00:00Z", "SelfTradePrevention": True,
+        "QuantityIncrement": 0.00000001, "PriceIncrement": 0.01,
+        "MinimumQuantity": 0.00001, "MinimumPrice": 1.0,
+    },
+    {
+        "OMSId": 1, "InstrumentId": 2, "Symbol": "ETH/BRL",
+        "Product1": 3, "Product1Symbol": "ETH", "Product2": 2, "Product2Symbol": "BRL",
+        "InstrumentType": "Standard", "VenueInstrumentId": 2, "VenueId": 1, "SortIndex": 1,
+        "SessionStatus": "Running", "PreviousSessionStatus": "Stopped",
+        "SessionStatusDateTime": "2020-01-01T00:00:00Z", "SelfTradePrevention": True,
+        "QuantityIncrement": 0.00000001, "PriceIncrement": 0.01,
+        "MinimumQuantity": 0.0001, "MinimumPrice": 1.0,
+    },
+]
+
+DEFAULT_PRODUCTS = [
+    {
+        "OMSId": 1, "ProductId": 1, "Product": "BTC", "ProductFullName": "Bitcoin",
+        "ProductType": "CryptoCurrency", "DecimalPlaces": 8, "TickSize": 0.00000001, "NoFees": False,
+    },
+    {
+        "OMSId": 1, "ProductId": 2, "Product": "BRL", "ProductFullName": "Brazilian Real",
+        "ProductType": "NationalCurrency", "DecimalPlaces": 2, "TickSize": 0.01, "NoFees": False,
+    },
+    {
+        "OMSId": 1, "ProductId": 3, "Product": "ETH", "ProductFullName": "Ethereum",
+        "ProductType": "CryptoCurrency", "DecimalPlaces": 8, "TickSize": 0.00000001, "NoFees": False,
+    },
+]
+
+DEFAULT_MID_PRICES = {1: 150000.0, 2: 10000.0}
+
+# Starting balance of every account, by ProductId
+DEFAULT_BALANCES = {1: 10.0, 2: 1000000.0, 3: 100.0}
+
+# GetAccountFees schedule of every account: percentage maker/taker fees, with a cheaper taker
+# tier above 100 units of trailing volume
+DEFAULT_FEES = [
+    {"FeeId": 1, "FeeAmt": 0.0025, "FeeCalcType": "Percentage", "FeeType": "MakerFee", "LadderThreshold": 0,
+        "LadderSeconds": 2592000, "IsActive": True, "InstrumentId": 0, "OrderType": "Unknown", "OMSId": 1},
+    {"FeeId": 2, "FeeAmt": 0.005, "FeeCalcType": "Percentage", "FeeType": "TakerFee", "LadderThreshold": 0,
+        "LadderSeconds": 2592000, "IsActive": True, "InstrumentId": 0, "OrderType": "Unknown", "OMSId": 1},
+    {"FeeId": 3, "FeeAmt": 0.004, "FeeCalcType": "Percentage", "FeeType": "TakerFee", "LadderThreshold": 100,
+        "LadderSeconds": 2592000, "IsActive": True, "InstrumentId": 0, "OrderType": "Unknown", "OMSId": 1},
+]
+
+DEFAULT_EVENT_RATES = {
+    "Level1UpdateEvent": 10.0,
+    "Level2UpdateEvent": 50.0,
+    "TradeDataUpdateEvent": 5.0,
+    "TickerDataUpdateEvent": 1.0,
+}
+
+SIDE_NAMES = ["Buy", "Sell", "Short", "Unknown"]
+ORDER_TYPE_NAMES = [
+    "Unknown", "Market", "Limit", "StopMarket", "StopLimit",
+    "TrailingStopMarket", "TrailingStopLimit", "BlockTrade",
+]
+
+def errorPayload(errorcode: int, errormsg: str, detail: str = None) -> dict:
+    return {"result": False, "errormsg": errormsg, "errorcode": errorcode, "detail": detail}
+
+def resultPayload(result: bool = True) -> dict:
+    return {"result": result, "errormsg": None, "errorcode": 0, "detail": None}
+
+def nowMs() -> int:
+    return int(time() * 1e3)
+
+def parseTimestamp(timestamp: str):
+    if not timestamp:
+        return None
+    parsed = datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+    return parsed if parsed.tzinfo is not None else parsed.replace(tzinfo=timezone.utc)
+
+def unmask(data: bytes, mask: bytes) -> bytes:
+    length = len(data)
+    if length == 0:
+        return data
+    repeated = (mask * (length // 4 + 1))[:length]
+    return (int.from_bytes(data, "big") ^ int.from_bytes(repeated, "big")).to_bytes(length, "big")
+
+class MockConnection(object):
+    '''
+    One websocket session on the mock server: RFC 6455 framing over a plain TCP socket,
+    AlphaPoint `{m, i, n, o}` envelopes on top, plus per-session authentication and
+    subscription state.
+    '''
+    def __init__(self, server, sock):
+        self.server = server
+        self.sock = sock
+        self.reader = sock.makefile("rb")
+        self.sendLock = Lock()
+        self.open = True
+        self.authenticated = False
+        self.userId = None
+        self.subscriptions = dict()
+        self.pendingStreams = []
+        self.pendingEvents = []
+        self.accountEventSequences = dict()
+        self.random = random.Random(server.seed)
+
+    def handshake(self) -> bool:
+        headers = dict()
+        requestLine = self.reader.readline()
+        if not requestLine:
+            return False
+        while True:
+            line = self.reader.readline()
+            if not line or line in (b"\r\n", b"\n"):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        key = headers.get("sec-websocket-key")
+        if key is None:
+            self.sock.sendall(b"HTTP/1.1 400 Bad Request\r\nContent-Length: 0\r\n\r\n")
+            return False
+        accept = base64.b64encode(hashlib.sha1((key + WEBSOCKET_GUID).encode("ascii")).digest()).decode("ascii")
+        self.sock.sendall((
+            "HTTP/1.1 101 Switching Protocols\r\n"
+            "Upgrade: websocket\r\n"
+            "Connection: Upgrade\r\n"
+            "Sec-WebSocket-Accept: {}\r\n\r\n".format(accept)).encode("ascii"))
+        return True
+
+    def readFrame(self):
+        header = self.reader.read(2)
+        if len(header) < 2:
+            return None, None, None
+        first, second = header
+        opcode = first & 0x0F
+        length = second & 0x7F
+        if length == 126:
+            length = struct.unpack("!H", self.reader.read(2))[0]
+        elif length == 127:
+            length = struct.unpack("!Q", self.reader.read(8))[0]
+        mask = self.reader.read(4) if second & 0x80 else None
+        payload = self.reader.read(length)
+        if len(payload) < length:
+            return None, None, None
+        if mask is not None:
+            payload = unmask(payload, mask)
+        return (first & 0x80) != 0, opcode, payload
+
+    def sendFrame(self, opcode: int, payload: bytes):
+        length = len(payload)
+        if length < 126:
+            header = struct.pack("!BB", 0x80 | opcode, length)
+        elif length < (1 << 16):
+            header = struct.pack("!BBH", 0x80 | opcode, 126, length)
+        else:
+            header = struct.pack("!BBQ", 0x80 | opcode, 127, length)
+        with self.sendLock:
+            if not self.open:
+                return
+            try:
+                self.sock.sendall(header + payload)
+            except OSError:
+                self.open = False
+
+    def sendMessage(self, messageType: MessageType, sequence: int, functionName: str, payload):
+        frame = {"m": messageType.value, "i": sequence, "n": functionName, "o": json.dumps(payload)}
+        self.sendFrame(OPCODE_TEXT, json.dumps(frame).encode("utf-8"))
+
+    def serve(self):
+        try:
+            if not self.handshake():
+                return
+            fragments = []
+            while self.open:
+                frame = self.readFrame()
+                if frame[0] is None:
+                    break
+                final, opcode, payload = frame
+                if opcode == OPCODE_PING:
+                    self.sendFrame(OPCODE_PONG, payload)
+                elif opcode == OPCODE_CLOSE:
+                    self.sendFrame(OPCODE_CLOSE, payload[:2])
+                    break
+                elif opcode in (OPCODE_TEXT, OPCODE_BINARY, OPCODE_CONTINUATION):
+                    fragments.append(payload)
+                    if final:
+                        message = b"".join(fragments).decode("utf-8")
+                        fragments = []
+                        self.server.handleMessage(self, message)
+        except (OSError, ValueError, struct.error):
+            pass
+        finally:
+            self.close()
+
+    def close(self):
+        self.open = False
+        for stopEvent in list(self.subscriptions.values()):
+            stopEvent.set()
+        self.subscriptions.clear()
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+
+class MockFoxBitServer(object):
+    '''
+    Local stand-in for the FoxBit (AlphaPoint) websocket API, for offline testing, benchmarks
+    and load generation. Serves canned reference data (GetInstruments, GetProducts,
+    GetL2Snapshot, GetTickerHistory), authenticates AuthenticateUser with the same HMAC
+    signature FoxBitClient.authenticateUser computes, keeps an in-memory order book for
+    SendOrder/CancelOrder and streams Level1, Level2, trade and ticker events at the rates
+    given in `eventRates` (events per second, 0 disables a stream). Sessions subscribed with
+    SubscribeAccountEvents get OrderStateEvent, OrderTradeEvent and AccountPositionEvent for
+    their orders; market orders fill immediately at the mid price, limit orders rest.
+    `tickets` deposit and as many withdraw tickets are generated for the account, for the
+    ticket endpoints (GetDepositTickets, GetAllDepositTickets, GetDepositTicket and their
+    withdraw counterparts).
+    '''
+    def __init__(self, host: str = "127.0.0.1", port: int = 0,
+        apiKey: str = "mock-api-key", apiSecret: str = "mock-api-secret", userId: int = 1,
+        accountId: int = None, eventRates: dict = None, seed: int = 0, tickets: int = 0):
+        self.host = host
+        self.port = port
+        self.apiKey = apiKey
+        self.apiSecret = apiSecret
+        self.userId = userId
+        self.accountId = accountId if accountId is not None else userId
+        self.eventRates = dict(DEFAULT_EVENT_RATES)
+        if eventRates:
+            self.eventRates.update(eventRates)
+        self.seed = seed
+        self.instruments = [dict(instrument) for instrument in DEFAULT_INSTRUMENTS]
+        self.instrumentById = {instrument["InstrumentId"]: instrument for instrument in self.instruments}
+        self.instrumentBySymbol = {instrument["Symbol"]: instrument for instrument in self.instruments}
+        self.products = [dict(product) for product in DEFAULT_PRODUCTS]
+        self.midPriceByInstrument = dict(DEFAULT_MID_PRICES)
+        self.ordersById = dict()
+        self.orderIds = count(1000)
+        self.tradeIds = count(1)
+        self.updateIds = count(1)
+        self.ordersLock = Lock()
+        self.positionsByAccount = dict()
+        self.tradesByAccount = dict()
+        self.transactionsByAccount = dict()
+        self.transactionIds = count(1)
+        self.ticketsByKind = {
+            "Deposit": self.makeTickets("Deposit", tickets),
+            "Withdraw": self.makeTickets("Withdraw", tickets),
+        }
+        self.ticketsByRequestCode = {
+            kind: {ticket["RequestCode"]: ticket for ticket in tickets} for kind, tickets in self.ticketsByKind.items()
+        }
+        self.fees = [dict(fee) for fee in DEFAULT_FEES]
+        self.connections = []
+        self.listener = None
+        self.thread = None
+        self.handlerByFunction = {
+            "AuthenticateUser": self.handleAuthenticateUser,
+            "LogOut": self.handleLogOut,
+            "GetInstrument": self.handleGetInstrument,
+            "GetInstruments": self.handleGetInstruments,
+            "GetProduct": self.handleGetProduct,
+            "GetProducts": self.handleGetProducts,
+            "GetL2Snapshot": self.handleGetL2Snapshot,
+            "GetTickerHistory": self.handleGetTickerHistory,
+            "SubscribeLevel1": self.handleSubscribeLevel1,
+            "SubscribeLevel2": self.handleSubscribeLevel2,
+            "SubscribeTrades": self.handleSubscribeTrades,
+            "SubscribeTicker": self.handleSubscribeTicker,
+            "UnsubscribeLevel1": self.handleUnsubscribe,
+            "UnsubscribeLevel2": self.handleUnsubscribe,
+            "UnsubscribeTrades": self.handleUnsubscribe,
+            "UnsubscribeTicker": self.handleUnsubscribe,
+            "SendOrder": self.handleSendOrder,
+            "CancelOrder": self.handleCancelOrder,
+            "CancelAllOrders": self.handleCancelAllOrders,
+            "GetOpenOrders": self.handleGetOpenOrders,
+            "GetAccountPositions": self.handleGetAccountPositions,
+            "SubscribeAccountEvents": self.handleSubscribeAccountEvents,
+            "GetAccountFees": self.handleGetAccountFees,
+            "GetOrderFee": self.handleGetOrderFee,
+            "GetAccountInfo": self.handleGetAccountInfo,
+            "GetAccountTrades": self.handleGetAccountTrades,
+            "GetAccountTransactions": self.handleGetAccountTransactions,
+            "GetDepositTickets": lambda connection, sequence, payload: self.handleGetTickets("Deposit", payload),
+            "GetWithdrawTickets": lambda connection, sequence, payload: self.handleGetTickets("Withdraw", payload),
+            "GetAllDepositTickets": lambda connection, sequence, payload: self.handleGetAllTickets("Deposit", payload),
+            "GetAllWithdrawTickets": lambda connection, sequence, payload: self.handleGetAllTickets("Withdraw", payload),
+            "GetDepositTicket": lambda connection, sequence, payload: self.handleGetTicket("Deposit", payload),
+            "GetWithdrawTicket": lambda connection, sequence, payload: self.handleGetTicket("Withdraw", payload),
+        }
+        self.publicFunctions = {
+            "AuthenticateUser", "LogOut", "GetInstrument", "GetInstruments", "GetProduct",
+            "GetProducts", "GetL2Snapshot", "GetTickerHistory", "SubscribeLevel1",
+            "SubscribeLevel2", "SubscribeTrades", "SubscribeTicker", "UnsubscribeLevel1",
+            "UnsubscribeLevel2", "UnsubscribeTrades", "UnsubscribeTicker",
+        }
+
+    @property
+    def url(self) -> str:
+        return "ws://{}:{}".format(self.host, self.port)
+
+    def start(self):
+        # socket.create_server only exists from Python 3.8 on
+        self.listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.listener.bind((self.host, self.port))
+        self.listener.listen()
+        self.port = self.listener.getsockname()[1]
+        self.thread = Thread(target=self.acceptConnections, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        if self.listener is not None:
+            # shutdown() is what wakes up a thread blocked in accept()
+            try:
+                self.listener.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            self.listener.close()
+        for connection in list(self.connections):
+            connection.close()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        self.listener = None
+
+    def acceptConnections(self):
+        while True:
+            try:
+                sock, _ = self.listener.accept()
+            except OSError:
+                return
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            connection = MockConnection(self, sock)
+            self.connections.append(connection)
+            Thread(target=self.serveConnection, args=(connection,), daemon=True).start()
+
+    def serveConnection(self, connection: MockConnection):
+        connection.serve()
+        if connection in self.connections:
+            self.connections.remove(connection)
+
+    def handleMessage(self, connection: MockConnection, message: str):
+        frame = json.loads(message)
+        functionName = frame["n"]
+        sequence = frame["i"]
+        payload = json.loads(frame["o"]) if frame.get("o") else {}
+        handler = self.handlerByFunction.get(functionName)
+        if handler is None:
+            reply = errorPayload(104, "Resource Not Found", "Endpoint Not Found")
+        elif functionName not in self.publicFunctions and not connection.authenticated:
+            reply = errorPayload(20, "Not Authorized")
+        else:
+            reply = handler(connection, sequence, payload)
+        connection.sendMessage(MessageType.Reply, sequence, functionName, reply)
+        # Event streams start only once the subscription reply is on the wire
+        while connection.pendingStreams:
+            connection.pendingStreams.pop().start()
+        while connection.pendingEvents:
+            connection.sendMessage(MessageType.Event, *connection.pendingEvents.pop(0))
+
+    def findInstrument(self, payload: dict) -> dict:
+        if "InstrumentId" in payload:
+            return self.instrumentById.get(payload["InstrumentId"])
+        return self.instrumentBySymbol.get(payload.get("Symbol"))
+
+    # ============== Authentication ================
+    def handleAuthenticateUser(self, connection, sequence, payload):
+        signature = hmac.new(
+            bytes(self.apiSecret, "utf-8"),
+            msg=bytes("{:d}{:d}{:s}".format(payload.get("Nonce", 0), payload.get("UserId", 0), payload.get("APIKey", "")), "utf-8"),
+            digestmod=hashlib.sha256).hexdigest()
+        if payload.get("APIKey") != self.apiKey or payload.get("UserId") != self.userId or \
+            not hmac.compare_digest(signature, payload.get("Signature", "")):
+            return {"Authenticated": False, "errormsg": "Invalid API key or signature"}
+        connection.authenticated = True
+        connection.userId = self.userId
+        return {
+            "Authenticated": True,
+            "SessionToken": base64.b64encode(signature[:24].encode("ascii")).decode("ascii"),
+            "UserId": self.userId,
+            "twoFaToken": None,
+        }
+
+    def handleLogOut(self, connection, sequence, payload):
+        connection.authenticated = False
+        return resultPayload()
+
+    # ============== Reference data ================
+    def handleGetInstrument(self, connection, sequence, payload):
+        instrument = self.findInstrument(payload)
+        return instrument if instrument is not None else errorPayload(104, "Resource Not Found")
+
+    def handleGetInstruments(self, connection, sequence, payload):
+        return self.instruments
+
+    def handleGetProduct(self, connection, sequence, payload):
+        for product in self.products:
+            if product["ProductId"] == payload.get("ProductId"):
+                return product
+        return errorPayload(104, "Resource Not Found")
+
+    def handleGetProducts(self, connection, sequence, payload):
+        return self.products
+
+    # ============== Market data ================
+    def level2Row(self, instrumentId, price, quantity, side, actionType=0):
+        return [
+            next(self.updateIds), 1, nowMs(), actionType, self.midPriceByInstrument[instrumentId],
+            1, round(price, 2), instrumentId, round(quantity, 8), side,
+        ]
+
+    def bookRows(self, rng, instrumentId, depth):
+        mid = self.midPriceByInstrument[instrumentId]
+        rows = []
+        for level in range(depth):
+            offset = (level + 1) * mid * 1e-4
+            rows.append(self.level2Row(instrumentId, mid - offset, rng.uniform(0.001, 2.0), 0))
+            rows.append(self.level2Row(instrumentId, mid + offset, rng.uniform(0.001, 2.0), 1))
+        return rows
+
+    def level1Payload(self, rng, instrumentId):
+        mid = self.midPriceByInstrument[instrumentId]
+        spread = mid * 1e-4
+        return {
+            "OMSId": 1, "InstrumentId": instrumentId,
+            "BestBid": round(mid - spread, 2), "BestOffer": round(mid + spread, 2),
+            "LastTradedPx": round(mid, 2), "LastTradedQty": round(rng.uniform(0.001, 1.0), 8),
+            "LastTradeTime": nowMs(), "SessionOpen": mid, "SessionHigh": mid * 1.01,
+            "SessionLow": mid * 0.99, "SessionClose": mid, "Volume": 10.0,
+            "CurrentDayVolume": 100.0, "CurrentDayNumTrades": 1000, "CurrentDayPxChange": 0.0,
+            "Rolling24HrVolume": 100.0, "Rolling24NumTrades": 1000, "Rolling24HrPxChange": 0.0,
+            "TimeStamp": nowMs(),
+        }
+
+    def tradeRow(self, rng, instrumentId):
+        mid = self.midPriceByInstrument[instrumentId]
+        side = rng.randint(0, 1)
+        return [
+            next(self.tradeIds), instrumentId, round(rng.uniform(0.001, 1.0), 8), round(mid, 2),
+            rng.randint(1, 10 ** 6), rng.randint(1, 10 ** 6), nowMs(), rng.randint(0, 2), side, False, 0,
+        ]
+
+    def tickerRow(self, rng, instrumentId, timestampMs):
+        mid = self.midPriceByInstrument[instrumentId]
+        return [
+            timestampMs, mid * 1.001, mid * 0.999, mid, mid, round(rng.uniform(0.1, 10.0), 8),
+            mid * 0.9999, mid * 1.0001, instrumentId,
+        ]
+
+    def moveMidPrice(self, rng, instrumentId):
+        self.midPriceByInstrument[instrumentId] *= 1.0 + rng.gauss(0.0, 1e-5)
+
+    def handleGetL2Snapshot(self, connection, sequence, payload):
+        instrument = self.findInstrument(payload)
+        if instrument is None:
+            return errorPayload(104, "Resource Not Found")
+        return self.bookRows(connection.random, instrument["InstrumentId"], min(payload.get("Depth", 100), 100))
+
+    def handleGetTickerHistory(self, connection, sequence, payload):
+        instrument = self.findInstrument(payload)
+        if instrument is None:
+            return errorPayload(104, "Resource Not Found")
+        fromDate = datetime.strptime(payload["FromDate"], "%Y-%m-%dT%H:%M:%S").replace(tzinfo=timezone.utc)
+        toDate = datetime.strptime(payload["ToDate"], "%Y-%m-%dT%H:%M:%S").replace(tzinfo=timezone.utc)
+        interval = max(int(payload.get("Interval", 60)), 1)
+        start, end = int(fromDate.timestamp()), int(toDate.timestamp())
+        return [
+            self.tickerRow(connection.random, instrument["InstrumentId"], timestamp * 1000)
+            for timestamp in range(start, end, interval)[:10000]
+        ]
+
+    def subscribe(self, connection, eventName, instrumentId, sequence, makePayload):
+        key = (eventName, instrumentId)
+        if key in connection.subscriptions:
+            connection.subscriptions[key].set()
+        stopEvent = Event()
+        connection.subscriptions[key] = stopEvent
+        rate = self.eventRates.get(eventName, 0)
+        if rate and rate > 0:
+            connection.pendingStreams.append(Thread(
+                target=self.streamEvents,
+                args=(connection, eventName, instrumentId, sequence, rate, stopEvent, makePayload),
+                daemon=True))
+
+    def streamEvents(self, connection, eventName, instrumentId, sequence, rate, stopEvent, makePayload):
+        # Sends every event due since the stream started, so rates above the sleep resolution
+        # are produced in small bursts instead of being capped by it
+        rng = random.Random(self.seed + instrumentId)
+        startedAt = perf_counter()
+        sent = 0
+        while connection.open and not stopEvent.is_set():
+            due = int((perf_counter() - startedAt) * rate) + 1
+            while sent < due and connection.open and not stopEvent.is_set():
+                self.moveMidPrice(rng, instrumentId)
+                connection.sendMessage(MessageType.Event, sequence, eventName, makePayload(rng, instrumentId))
+                sent += 1
+            stopEvent.wait(max(1.0 / rate, 0.0005))
+
+    def handleSubscribeLevel1(self, connection, sequence, payload):
+        instrument = self.findInstrument(payload)
+        if instrument is None:
+            return errorPayload(104, "Resource Not Found")
+        instrumentId = instrument["InstrumentId"]
+        self.subscribe(connection, "Level1UpdateEvent", instrumentId, sequence, self.level1Payload)
+        return self.level1Payload(connection.random, instrumentId)
+
+    def handleSubscribeLevel2(self, connection, sequence, payload):
+        instrument = self.findInstrument(payload)
+        if instrument is None:
+            return errorPayload(104, "Resource Not Found")
+        instrumentId = instrument["InstrumentId"]
+        self.subscribe(connection, "Level2UpdateEvent", instrumentId, sequence,
+            lambda rng, instrumentId: [self.level2Row(
+                instrumentId,
+                self.midPriceByInstrument[instrumentId] * (1.0 + rng.choice((-1, 1)) * rng.randint(1, 20) * 1e-4),
+                rng.uniform(0.0, 2.0), rng.randint(0, 1), rng.randint(0, 2))])
+        return self.bookRows(connection.random, instrumentId, min(payload.get("Depth", 10), 100))
+
+    def handleSubscribeTrades(self, connection, sequence, payload):
+        instrument = self.findInstrument(payload)
+        if instrument is None:
+            return errorPayload(104, "Resource Not Found")
+        instrumentId = instrument["InstrumentId"]
+        self.subscribe(connection, "TradeDataUpdateEvent", instrumentId, sequence,
+            lambda rng, instrumentId: [self.tradeRow(rng, instrumentId)])
+        return [self.tradeRow(connection.random, instrumentId) for _ in range(payload.get("IncludeLastCount", 100))]
+
+    def handleSubscribeTicker(self, connection, sequence, payload):
+        instrument = self.findInstrument(payload)
+        if instrument is None:
+            return errorPayload(104, "Resource Not Found")
+        instrumentId = instrument["InstrumentId"]
+        self.subscribe(connection, "TickerDataUpdateEvent", instrumentId, sequence,
+            lambda rng, instrumentId: [self.tickerRow(rng, instrumentId, nowMs())])
+        return [self.tickerRow(connection.random, instrumentId, nowMs()) for _ in range(payload.get("IncludeLastCount", 100))]
+
+    def handleUnsubscribe(self, connection, sequence, payload):
+        for key in list(connection.subscriptions):
+            if key[1] == payload.get("InstrumentId"):
+                connection.subscriptions.pop(key).set()
+        return resultPayload()
+
+    # ============== Account ================
+    def positions(self, accountId: int) -> dict:
+        # Callers hold ordersLock
+        positions = self.positionsByAccount.get(accountId)
+        if positions is None:
+            positions = {
+                product["ProductId"]: {
+                    "OMSId": product["OMSId"], "AccountId": accountId,
+                    "ProductSymbol": product["Product"], "ProductId": product["ProductId"],
+                    "Amount": DEFAULT_BALANCES.get(product["ProductId"], 0.0), "Hold": 0.0,
+                    "PendingDeposits": 0.0, "PendingWithdraws": 0.0,
+                    "TotalDayDeposits": 0.0, "TotalDayWithdraws": 0.0, "TotalMonthWithdraws": 0.0,
+                }
+                for product in self.products
+            }
+            self.positionsByAccount[accountId] = positions
+        return positions
+
+    def adjustPosition(self, connection, accountId, productId, amount=0.0, hold=0.0, tradeId=0):
+        position = self.positions(accountId)[productId]
+        position["Amount"] += amount
+        position["Hold"] += hold
+        if amount:
+            # Ledger entry, as GetAccountTransactions reports it
+            self.transactionsByAccount.setdefault(accountId, []).append({
+                "TransactionId": next(self.transactionIds), "OMSId": position["OMSId"],
+                "AccountId": accountId, "CR": max(amount, 0.0), "DR": max(-amount, 0.0),
+                "Counterparty": 0, "TransactionType": "Trade" if tradeId else "Other",
+                "ReferenceId": tradeId, "ReferenceType": "Trade" if tradeId else "Other",
+                "ProductId": productId, "Balance": position["Amount"], "TimeStamp": nowMs(),
+            })
+        self.publishAccountEvent(connection, accountId, "AccountPositionEvent", dict(position))
+
+    def holdForOrder(self, order) -> tuple:
+        # Funds reserved by a resting order: quote currency for buys, base currency for sells
+        instrument = self.instrumentById[order["Instrument"]]
+        remaining = order["OrigQuantity"] - order["QuantityExecuted"]
+        if order["Side"] == "Buy":
+            return instrument["Product2"], remaining * order["Price"]
+        return instrument["Product1"], remaining
+
+    def publishAccountEvent(self, connection, accountId, eventName, payload):
+        # The requesting session gets its events right after the reply, as the real API does
+        for subscriber in list(self.connections):
+            sequence = subscriber.accountEventSequences.get(accountId)
+            if sequence is None or not subscriber.open:
+                continue
+            if subscriber is connection:
+                subscriber.pendingEvents.append((sequence, eventName, payload))
+            else:
+                subscriber.sendMessage(MessageType.Event, sequence, eventName, payload)
+
+    def handleSubscribeAccountEvents(self, connection, sequence, payload):
+        connection.accountEventSequences[payload.get("AccountId", self.accountId)] = sequence
+        return {"Subscribed": True}
+
+    def handleGetAccountPositions(self, connection, sequence, payload):
+        with self.ordersLock:
+            return [dict(position) for position in self.positions(payload.get("AccountId", self.accountId)).values()]
+
+    def handleGetAccountFees(self, connection, sequence, payload):
+        accountId = payload.get("AccountId", self.accountId)
+        return [dict(fee, AccountId=accountId) for fee in self.fees]
+
+    def handleGetAccountTrades(self, connection, sequence, payload):
+        # Index 0 is the most recent trade
+        startIndex = max(0, payload.get("StartIndex", 0))
+        count = min(max(0, payload.get("Count", 200)), 200)
+        with self.ordersLock:
+            trades = self.tradesByAccount.get(payload.get("AccountId", self.accountId), [])
+            end = len(trades) - startIndex
+            return [dict(trade) for trade in reversed(trades[max(0, end - count):max(0, end)])]
+
+    def handleGetAccountTransactions(self, connection, sequence, payload):
+        # The `Depth` most recent entries, most recent first
+        depth = max(0, payload.get("Depth", 200))
+        with self.ordersLock:
+            transactions = self.transactionsByAccount.get(payload.get("AccountId", self.accountId), [])
+            return [dict(transaction) for transaction in reversed(transactions[max(0, len(transactions) - depth):])]
+
+    def makeTickets(self, kind: str, number: int) -> list:
+        # Oldest first, one every ten minutes up to now
+        rng = random.Random("{}{}".format(self.seed, kind))
+        statuses = [status.name for status in (DepositStatus if kind == "Deposit" else WithdrawStatus)]
+        startMs = nowMs() - number * 600000
+        tickets = []
+        for ticketNumber in range(1, number + 1):
+            product = self.products[rng.randrange(len(self.products))]
+            createdAt = datetime.fromtimestamp((startMs + ticketNumber * 600000) / 1e3, tz=timezone.utc)
+            ticket = {
+                "AssetManagerId": 1, "AccountId": self.accountId, "AssetId": product["ProductId"],
+                "AssetName": product["Product"], "Amount": round(rng.uniform(1.0, 1000.0), 2),
+                "OMSId": product["OMSId"], "RequestCode": "{:032x}".format(rng.getrandbits(128)),
+                "RequestIP": "127.0.0.1", "RequestUserName": "user{}".format(self.userId),
+                "OperatorId": 1, "Status": statuses[rng.randrange(len(statuses))], "FeeAmt": 0.0,
+                "UpdatedByUser": self.userId, "UpdatedByUserName": "user{}".format(self.userId),
+                "TicketNumber": ticketNumber, "CreatedTimestamp": createdAt.strftime("%Y-%m-%dT%H:%M:%SZ"),
+                "LastUpdateTimeStamp": createdAt.strftime("%Y-%m-%dT%H:%M:%SZ"),
+                "Comments": [], "Attachments": [],
+            }
+            if kind == "Deposit":
+                ticket.update({"RequestUser": self.userId, "DepositInfo": "{}"})
+            else:
+                ticket.update({"RequestUserId": self.userId, "TemplateForm": "{}", "TemplateType": "",
+                    "TemplateFormType": "", "Comment": "", "ExternalAddress": ""})
+            tickets.append(ticket)
+        return tickets
+
+    def setTicketStatus(self, kind: str, requestCode: str, status: str):
+        # Moves a ticket along, e.g. to exercise ticket watchers
+        with self.ordersLock:
+            ticket = self.ticketsByRequestCode[kind][requestCode]
+            ticket["Status"] = status
+            ticket["LastUpdateTimeStamp"] = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+    def handleGetTickets(self, kind: str, payload: dict):
+        with self.ordersLock:
+            return [dict(ticket) for ticket in reversed(self.ticketsByKind[kind])
+                if ticket["AccountId"] == payload.get("AccountId")]
+
+    def handleGetAllTickets(self, kind: str, payload: dict):
+        # Most recent first; every filter left out (or null) matches all tickets
+        statusEnum = DepositStatus if kind == "Deposit" else WithdrawStatus
+        status = payload.get("Status")
+        status = statusEnum(status).name if isinstance(status, int) else status
+        startTime = parseTimestamp(payload.get("StartTimestamp"))
+        endTime = parseTimestamp(payload.get("EndTimestamp"))
+        amount = payload.get("Amount")
+        amountOperator = payload.get("AmountOperator") or 0
+        matches = []
+        with self.ordersLock:
+            for ticket in reversed(self.ticketsByKind[kind]):
+                if payload.get("AccountId") and ticket["AccountId"] != payload["AccountId"]:
+                    continue
+                if payload.get("TicketId") and ticket["TicketNumber"] != payload["TicketId"]:
+                    continue
+                if status is not None and ticket["Status"] != status:
+                    continue
+                if payload.get("UserName") and ticket["RequestUserName"] != payload["UserName"]:
+                    continue
+                createdAt = parseTimestamp(ticket["CreatedTimestamp"])
+                if (startTime is not None and createdAt < startTime) or (endTime is not None and createdAt > endTime):
+                    continue
+                if amount is not None and not (
+                    (amountOperator == 0 and ticket["Amount"] == amount) or
+                    (amountOperator == 1 and ticket["Amount"] >= amount) or
+                    (amountOperator == 2 and ticket["Amount"] <= amount)):
+                    continue
+                matches.append(ticket)
+        startIndex = payload.get("StartIndex") or 0
+        limit = payload.get("Limit")
+        page = matches[startIndex:] if limit is None else matches[startIndex:startIndex + limit]
+        return [dict(ticket) for ticket in page]
+
+    def handleGetTicket(self, kind: str, payload: dict):
+        with self.ordersLock:
+            ticket = self.ticketsByRequestCode[kind].get(payload.get("RequestCode"))
+            if ticket is None:
+                return errorPayload(104, "Resource Not Found", "Ticket not found")
+            return dict(ticket)
+
+    def handleGetAccountInfo(self, connection, sequence, payload):
+        accountId = payload.get("AccountId", self.accountId)
+        return {
+            "OMSID": payload.get("OMSId", 1), "AccountId": accountId,
+            "AccountName": "account{}".format(accountId), "AccountHandle": None,
+            "FirmId": None, "FirmName": None, "AccountType": "Asset", "FeeGroupId": 0,
+            "ParentID": 0, "RiskType": "Normal", "VerificationLevel": 1,
+            "FeeProductType": "BaseProduct", "FeeProduct": 0, "RefererId": 0,
+            "SupportedVenueIds": [1],
+        }
+
+    def handleGetOrderFee(self, connection, sequence, payload):
+        # Base tier only: the mock keeps no trailing volume
+        feeType = "MakerFee" if payload.get("MakerTaker") == "Maker" else "TakerFee"
+        instrument = self.instrumentById.get(payload.get("InstrumentId"))
+        rate = 0.0
+        for fee in self.fees:
+            if fee["FeeType"] == feeType and fee["IsActive"] and fee["LadderThreshold"] == 0:
+                rate = fee["FeeAmt"]
+        amount = payload.get("Amount", 0)
+        if instrument is not None and payload.get("ProductId") == instrument["Product1"]:
+            orderFee = amount * rate
+        else:
+            orderFee = amount * payload.get("Price", 0) * rate
+        return {"OrderFee": orderFee, "ProductId": payload.get("ProductId")}
+
+    # ============== Orders ================
+    def handleSendOrder(self, connection, sequence, payload):
+        instrument = self.instrumentById.get(payload.get("InstrumentId"))
+        if instrument is None:
+            return {"status": "Rejected", "errormsg": "Instrument not found", "OrderId": 0}
+        quantity = payload.get("Quantity", 0)
+        if quantity < instrument["MinimumQuantity"]:
+            return {"status": "Rejected", "errormsg": "Quantity below minimum", "OrderId": 0}
+        orderType = payload.get("OrderType", 2)
+        orderId = next(self.orderIds)
+        accountId = payload.get("AccountId", self.accountId)
+        order = {
+            "Side": SIDE_NAMES[payload.get("Side", 3)],
+            "OrderId": orderId,
+            "Price": payload.get("LimitPrice", 0),
+            "Quantity": quantity,
+            "DisplayQuantity": payload.get("DisplayQuantity", 0) or quantity,
+            "Instrument": instrument["InstrumentId"],
+            "Account": accountId,
+            "OrderType": ORDER_TYPE_NAMES[orderType],
+            "ClientOrderId": payload.get("ClientOrderId", 0),
+            "OrderState": "Working",
+            "ReceiveTime": nowMs(),
+            "ReceiveTimeTicks": nowMs() * 10000,
+            "OrigQuantity": quantity,
+            "QuantityExecuted": 0,
+            "AvgPrice": 0,
+            "CounterPartyId": 0,
+            "ChangeReason": "NewInputAccepted",
+            "OrigOrderId": orderId,
+            "OrigClOrdId": payload.get("ClientOrderId", 0),
+            "EnteredBy": connection.userId,
+            "IsQuote": False,
+            "RejectReason": "",
+            "IsLockedIn": False,
+            "OMSId": payload.get("OMSId", 1),
+        }
+        with self.ordersLock:
+            self.ordersById[orderId] = order
+            if orderType == 1:
+                self.fillOrder(connection, order, self.midPriceByInstrument[instrument["InstrumentId"]])
+            else:
+                productId, hold = self.holdForOrder(order)
+                self.publishAccountEvent(connection, accountId, "OrderStateEvent", dict(order))
+                self.adjustPosition(connection, accountId, productId, hold=hold)
+        return {"status": "Accepted", "errormsg": "", "OrderId": orderId}
+
+    def fillOrder(self, connection, order, price):
+        # Callers hold ordersLock
+        instrument = self.instrumentById[order["Instrument"]]
+        quantity = order["OrigQuantity"] - order["QuantityExecuted"]
+        order["QuantityExecuted"] = order["OrigQuantity"]
+        order["AvgPrice"] = price
+        order["OrderState"] = "FullyExecuted"
+        order["ChangeReason"] = "Trade"
+        accountId = order["Account"]
+        tradeId = next(self.tradeIds)
+        tradeTimeMs = nowMs()
+        trade = {
+            "OMSId": order["OMSId"], "TradeId": tradeId, "OrderId": order["OrderId"],
+            "AccountId": accountId, "ClientOrderId": order["ClientOrderId"],
+            "InstrumentId": order["Instrument"], "Side": order["Side"], "Quantity": quantity,
+            "RemainingQuantity": 0.0, "Price": price, "Value": quantity * price,
+            "TradeTime": tradeTimeMs * 10000, "ContraAcctId": 0, "OrderTradeRevision": 1,
+            "Direction": "NoChange", "IsBlockTrade": False,
+        }
+        self.publishAccountEvent(connection, accountId, "OrderTradeEvent", trade)
+        self.tradesByAccount.setdefault(accountId, []).append(dict(trade,
+            ExecutionId=tradeId, SubAccountId=0, OrderOriginator=self.userId, CounterParty=0,
+            TradeTimeMS=tradeTimeMs, Fee=0.0, FeeProductId=instrument["Product2"]))
+        self.publishAccountEvent(connection, accountId, "OrderStateEvent", dict(order))
+        sign = 1.0 if order["Side"] == "Buy" else -1.0
+        self.adjustPosition(connection, accountId, instrument["Product1"], amount=sign * quantity, tradeId=tradeId)
+        self.adjustPosition(connection, accountId, instrument["Product2"], amount=-sign * quantity * price, tradeId=tradeId)
+
+    def cancelWorkingOrder(self, connection, order):
+        # Callers hold ordersLock
+        productId, hold = self.holdForOrder(order)
+        order["OrderState"] = "Canceled"
+        order["ChangeReason"] = "UserModified"
+        self.publishAccountEvent(connection, order["Account"], "OrderStateEvent", dict(order))
+        self.adjustPosition(connection, order["Account"], productId, hold=-hold)
+
+    def handleCancelOrder(self, connection, sequence, payload):
+        with self.ordersLock:
+            order = self.ordersById.get(payload.get("OrderId"))
+            if order is None and payload.get("ClientOrderId"):
+                for candidate in self.ordersById.values():
+                    if candidate["ClientOrderId"] == payload["ClientOrderId"]:
+                        order = candidate
+                        break
+            if order is None or order["OrderState"] != "Working":
+                return errorPayload(104, "Resource Not Found", "Order not found")
+            self.cancelWorkingOrder(connection, order)
+        return resultPayload()
+
+    def handleCancelAllOrders(self, connection, sequence, payload):
+        with self.ordersLock:
+            for order in self.ordersById.values():
+                if order["OrderState"] != "Working":
+                    continue
+                if "AccountId" in payload and order["Account"] != payload["AccountId"]:
+                    continue
+                if "InstrumentId" in payload and order["Instrument"] != payload["InstrumentId"]:
+                    continue
+                self.cancelWorkingOrder(connection, order)
+        return resultPayload()
+
+    def handleGetOpenOrders(self, connection, sequence, payload):
+        with self.ordersLock:
+            return [
+                dict(order) for order in self.ordersById.values()
+                if order["OrderState"] == "Working" and order["Account"] == payload.get("AccountId")
+            ]
+
+def main():
+    parser = argparse.ArgumentParser(description="Local mock of the FoxBit websocket API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--api-key", default="mock-api-key")
+    parser.add_argument("--api-secret", default="mock-api-secret")
+    parser.add_argument("--user-id", type=int, default=1)
+    parser.add_argument("--level1-rate", type=float, default=DEFAULT_EVENT_RATES["Level1UpdateEvent"])
+    parser.add_argument("--level2-rate", type=float, default=DEFAULT_EVENT_RATES["Level2UpdateEvent"])
+    parser.add_argument("--trade-rate", type=float, default=DEFAULT_EVENT_RATES["TradeDataUpdateEvent"])
+    parser.add_argument("--ticker-rate", type=float, default=DEFAULT_EVENT_RATES["TickerDataUpdateEvent"])
+    args = parser.parse_args()
+
+    server = MockFoxBitServer(
+        host=args.host, port=args.port, apiKey=args.api_key, apiSecret=args.api_secret,
+        userId=args.user_id, eventRates={
+            "Level1UpdateEvent": args.level1_rate,
+            "Level2UpdateEvent": args.level2_rate,
+            "TradeDataUpdateEvent": args.trade_rate,
+            "TickerDataUpdateEvent": args.ticker_rate,
+        }).start()
+    print("Mock FoxBit server listening on {}".format(server.url))
+    try:
+        while True:
+            sleep(1)
+    except KeyboardInterrupt:
+        server.stop()
+
+if __name__ == "__main__":
+    main()
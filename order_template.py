@@ -0,0 +1,61 @@
+import math
+from dataclasses import replace
+from enum import Enum
+from numbers import Number
+from typing import Union
+
+from message_enums import MessageType, Side
+from message_frame import MessageFrame
+from message_request import SendOrderRequest
+
+# Fields patched on every send, in the order they are rendered
+VARIABLE_FIELDS = ("ClientOrderId", "Quantity", "LimitPrice", "Side")
+SEQUENCE_PLACEHOLDER = "@@i@@"
+
+def encodeNumber(value: Number) -> str:
+    # Same text json.dumps produces for a finite int or float
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise TypeError("Expected an int or float, got {!r}.".format(value))
+    if isinstance(value, float):
+        if not math.isfinite(value):
+            raise ValueError("Order fields must be finite, got {!r}.".format(value))
+        return float.__repr__(value)
+    return int.__repr__(value)
+
+class OrderTemplate(object):
+    '''
+    A SendOrder frame pre-encoded once from a prototype SendOrderRequest. The static fields
+    (OMSId, AccountId, InstrumentId, OrderType, TimeInForce, PegPriceType, ...) are serialised
+    up front by the same encoder MessageFrame uses; `render` only joins the cached fragments
+    around the sequence number, ClientOrderId, Quantity, LimitPrice and Side, so its output is
+    byte-for-byte what `MessageFrame(..., "SendOrder", request).to_json()` would produce.
+    '''
+    def __init__(self, prototype: SendOrderRequest):
+        self.prototype = prototype
+        placeholders = {name: "@@{}@@".format(name) for name in VARIABLE_FIELDS}
+        frame = MessageFrame(MessageType.Request, "SendOrder", replace(prototype, **placeholders), sequence=SEQUENCE_PLACEHOLDER)
+        encoded = frame.to_json()
+        # The sequence is a quoted string in the envelope, the order fields are quoted (and
+        # escaped) strings inside the payload string
+        fragments = []
+        for marker in ['"{}"'.format(SEQUENCE_PLACEHOLDER)] + ['\\"{}\\"'.format(placeholders[name]) for name in VARIABLE_FIELDS]:
+            head, separator, encoded = encoded.partition(marker)
+            if not separator:
+                raise ValueError("Could not locate {} in the encoded order.".format(marker))
+            fragments.append(head)
+        fragments.append(encoded)
+        self.fragments = tuple(fragments)
+
+    def render(self, sequence: int, clientOrderId: int, side: Union[Side, int], quantity: Number, limitPrice: Number) -> str:
+        fragments = self.fragments
+        return "".join((
+            fragments[0], int.__repr__(sequence),
+            fragments[1], encodeNumber(clientOrderId),
+            fragments[2], encodeNumber(quantity),
+            fragments[3], encodeNumber(limitPrice),
+            fragments[4], encodeNumber(side.value if isinstance(side, Enum) else side),
+            fragments[5],
+        ))
+
+    def toRequest(self, clientOrderId: int, side: Union[Side, int], quantity: Number, limitPrice: Number) -> SendOrderRequest:
+        return replace(self.prototype, ClientOrderId=clientOrderId, Side=side, Quantity=quantity, LimitPrice=limitPrice)
@@ -0,0 +1,189 @@
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from queue import Queue
+from threading import Condition, Event, Lock, Thread
+from time import monotonic
+from typing import List, Optional
+
+from account_cache import FINISHED_ORDER_STATES
+
+class OrderHandle(Future):
+    '''
+    Handle returned by `FoxBitClient.submitOrder`. As a Future it resolves with the same
+    `(accepted, orderId)` tuple `sendOrder` returns, as soon as the SendOrder reply arrives.
+    It then follows the order through the account event stream: `state` is the latest
+    OrderStateEvent payload, `trades` the OrderTradeEvent payloads so far, and `updates` a
+    queue of `(eventName, payload)` for every change. `finished` is set once the order is
+    rejected, cancelled, expired or fully executed.
+
+    Callbacks (Future callbacks and those given to `addUpdateCallback`) run on the socket
+    thread and must not block.
+    '''
+    def __init__(self, request):
+        super().__init__()
+        self.request = request
+        self.clientOrderId = getattr(request, "ClientOrderId", 0)
+        self.orderId = None
+        self.state = None
+        self.trades = []
+        self.updates = Queue()
+        self.finished = Event()
+        self.updateCallbacks = []
+        # Set when the client refused the order before sending it (see OrderValidator)
+        self.rejectReason = None
+
+    @property
+    def orderState(self) -> Optional[str]:
+        return self.state["OrderState"] if self.state is not None else None
+
+    def addUpdateCallback(self, callback):
+        # Called as callback(handle, eventName, payload)
+        self.updateCallbacks.append(callback)
+
+    def waitUntilFinished(self, timeout: float = None) -> Optional[dict]:
+        self.finished.wait(timeout)
+        return self.state
+
+    def acknowledge(self, accepted: bool, orderId: int):
+        self.orderId = orderId if accepted else None
+        self.set_result((accepted, orderId))
+        if not accepted:
+            self.finished.set()
+
+    def fail(self, exception: BaseException):
+        self.set_exception(exception)
+        self.finished.set()
+
+    def update(self, eventName: str, payload: dict):
+        if eventName == "OrderTradeEvent":
+            self.trades.append(payload)
+        else:
+            self.state = payload
+        self.updates.put((eventName, payload))
+        for callback in self.updateCallbacks:
+            callback(self, eventName, payload)
+        if eventName == "NewOrderRejectEvent" or self.orderState in FINISHED_ORDER_STATES:
+            self.finished.set()
+
+class OrderTracker(object):
+    '''
+    Routes OrderStateEvent, OrderTradeEvent and NewOrderRejectEvent payloads to the
+    OrderHandle they belong to, by OrderId once the order is acknowledged and by ClientOrderId
+    before that. Events for an OrderId that is not known yet (the exchange may publish them
+    ahead of the SendOrder reply) are held, up to `maxHeldOrders` orders, and replayed on
+    acknowledgement. Handles are dropped once their order is finished.
+    '''
+    def __init__(self, maxHeldOrders: int = 1000):
+        self.maxHeldOrders = maxHeldOrders
+        self.handlesByOrderId = dict()
+        self.handlesByClientOrderId = dict()
+        self.heldEventsByOrderId = OrderedDict()
+        self.lock = Lock()
+
+    def track(self, handle: OrderHandle):
+        if handle.clientOrderId:
+            with self.lock:
+                self.handlesByClientOrderId[handle.clientOrderId] = handle
+
+    def acknowledge(self, handle: OrderHandle, reply: Future):
+        try:
+            response = reply.result()
+        except Exception as e:
+            self.forget(handle)
+            handle.fail(e)
+            return
+        accepted, orderId = False, -1
+        if isinstance(response, dict) and not response.get("errorcode"):
+            accepted = response.get("status") == "Accepted"
+            orderId = response.get("OrderId", -1)
+        held = ()
+        with self.lock:
+            if accepted:
+                # Set before the handle is published, so route() never holds an event for an
+                # order whose held events have already been drained
+                handle.orderId = orderId
+                self.handlesByOrderId[orderId] = handle
+                held = self.heldEventsByOrderId.pop(orderId, ())
+        handle.acknowledge(accepted, orderId)
+        if not accepted:
+            self.forget(handle)
+        for eventName, payload in held:
+            self.dispatch(handle, eventName, payload)
+
+    def onOrderState(self, payload: dict):
+        self.route("OrderStateEvent", payload)
+
+    def onOrderTrade(self, payload: dict):
+        self.route("OrderTradeEvent", payload)
+
+    def onNewOrderReject(self, payload: dict):
+        self.route("NewOrderRejectEvent", payload)
+
+    def route(self, eventName: str, payload: dict):
+        orderId = payload.get("OrderId")
+        clientOrderId = payload.get("ClientOrderId")
+        with self.lock:
+            handle = self.handlesByOrderId.get(orderId) if orderId else None
+            if handle is None and clientOrderId:
+                handle = self.handlesByClientOrderId.get(clientOrderId)
+            if handle is None or (handle.orderId is None and orderId and eventName != "NewOrderRejectEvent"):
+                # Not acknowledged yet: keep the event until the reply names its OrderId
+                if orderId:
+                    held = self.heldEventsByOrderId.setdefault(orderId, [])
+                    held.append((eventName, payload))
+                    while len(self.heldEventsByOrderId) > self.maxHeldOrders:
+                        self.heldEventsByOrderId.popitem(last=False)
+                return
+        self.dispatch(handle, eventName, payload)
+
+    def dispatch(self, handle: OrderHandle, eventName: str, payload: dict):
+        handle.update(eventName, payload)
+        if handle.finished.is_set():
+            self.forget(handle)
+
+    def forget(self, handle: OrderHandle):
+        with self.lock:
+            if handle.orderId is not None and self.handlesByOrderId.get(handle.orderId) is handle:
+                del self.handlesByOrderId[handle.orderId]
+            if handle.clientOrderId and self.handlesByClientOrderId.get(handle.clientOrderId) is handle:
+                del self.handlesByClientOrderId[handle.clientOrderId]
+
+    def pendingHandles(self) -> List[OrderHandle]:
+        with self.lock:
+            return list(set(self.handlesByOrderId.values()) | set(self.handlesByClientOrderId.values()))
+
+class ReplyDeadlines(object):
+    '''
+    Calls `expire(reply)` for every watched reply future still pending `timeout` seconds after
+    it was watched, from one daemon thread started by the first `watch`. Every reply gets the
+    same timeout, so the oldest one is always the next to expire and a deque is enough.
+    '''
+    def __init__(self, timeout: float, expire):
+        self.timeout = timeout
+        self.expire = expire
+        self.waiting = deque()
+        self.condition = Condition()
+        self.thread = None
+
+    def watch(self, reply: Future):
+        with self.condition:
+            self.waiting.append((monotonic() + self.timeout, reply))
+            if self.thread is None:
+                self.thread = Thread(target=self.run, daemon=True)
+                self.thread.start()
+            self.condition.notify()
+
+    def run(self):
+        while True:
+            with self.condition:
+                while not self.waiting:
+                    self.condition.wait()
+                deadline, reply = self.waiting[0]
+                if not reply.done():
+                    remaining = deadline - monotonic()
+                    if remaining > 0:
+                        self.condition.wait(remaining)
+                        continue
+                self.waiting.popleft()
+            if not reply.done():
+                self.expire(reply)
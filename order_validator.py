@@ -0,0 +1,94 @@
+from enum import Enum
+from typing import Optional, Union
+
+from message_enums import OrderType, SessionStatus
+from message_request import CancelReplaceOrderRequest, SendOrderRequest
+
+# Order types priced by LimitPrice and by StopPrice
+LIMIT_PRICED_ORDER_TYPES = frozenset((OrderType.Limit.value, OrderType.StopLimit.value, OrderType.BlockTrade.value))
+STOP_PRICED_ORDER_TYPES = frozenset((OrderType.StopMarket.value, OrderType.StopLimit.value))
+
+# SessionStatus comes as its name in GetInstruments replies, but accept the numeric value too
+RUNNING_SESSION_STATUSES = frozenset((SessionStatus.Running.name, SessionStatus.Running.value))
+
+# Slack, in increments, for values that are a whole number of increments up to float rounding
+INCREMENT_TOLERANCE = 1e-6
+
+def isMultiple(value: float, increment: float) -> bool:
+    steps = value / increment
+    return abs(steps - round(steps)) <= INCREMENT_TOLERANCE
+
+def enumValue(value):
+    return value.value if isinstance(value, Enum) else value
+
+class OrderValidator(object):
+    '''
+    Checks orders against the cached instrument metadata of the client's reference data
+    (`FoxBitClient.getReferenceData`) before they are sent: the instrument must exist and its
+    SessionStatus be Running, the quantity must reach MinimumQuantity and be a multiple of
+    QuantityIncrement, and limit and stop prices must reach MinimumPrice and be multiples of
+    PriceIncrement. Fields the exchange did not send are not checked.
+
+    A check is a handful of dict lookups and float operations and never waits on the socket
+    (unless the reference data has not been loaded yet). It returns None for a valid order and
+    the reason otherwise. The session status is as fresh as the reference data, so the
+    exchange remains the final judge.
+    '''
+    def __init__(self, client):
+        self.client = client
+        self.checked = 0
+        self.rejected = 0
+
+    def validate(self, request: Union[SendOrderRequest, CancelReplaceOrderRequest]) -> Optional[str]:
+        return self.check(
+            request.OMSId,
+            request.InstrumentId,
+            request.OrderType,
+            request.Quantity,
+            request.LimitPrice,
+            request.StopPrice)
+
+    def check(self, omsId: int, instrumentId: int, orderType: Union[OrderType, int], quantity: float,
+        limitPrice: float = None, stopPrice: float = None) -> Optional[str]:
+        self.checked += 1
+        reason = self.findViolation(omsId, instrumentId, enumValue(orderType), quantity, limitPrice, stopPrice)
+        if reason is not None:
+            self.rejected += 1
+        return reason
+
+    def findViolation(self, omsId: int, instrumentId: int, orderType: int, quantity: float,
+        limitPrice: float, stopPrice: float) -> Optional[str]:
+        instrument = self.client.getReferenceData(omsId).getInstrument(instrumentId)
+        if instrument is None:
+            return "Unknown instrument {} on OMS {}".format(instrumentId, omsId)
+        sessionStatus = instrument.get("SessionStatus")
+        if sessionStatus is not None and sessionStatus not in RUNNING_SESSION_STATUSES:
+            return "{} session is {}".format(instrument["Symbol"], sessionStatus)
+
+        if quantity is None or quantity <= 0:
+            return "Quantity must be positive, got {}".format(quantity)
+        minimumQuantity = instrument.get("MinimumQuantity")
+        if minimumQuantity and quantity < minimumQuantity:
+            return "Quantity {} is below the {} minimum of {}".format(quantity, instrument["Symbol"], minimumQuantity)
+        quantityIncrement = instrument.get("QuantityIncrement")
+        if quantityIncrement and not isMultiple(quantity, quantityIncrement):
+            return "Quantity {} is not a multiple of the {} increment {}".format(quantity, instrument["Symbol"], quantityIncrement)
+
+        if orderType in LIMIT_PRICED_ORDER_TYPES:
+            reason = self.checkPrice(instrument, "LimitPrice", limitPrice)
+            if reason is not None:
+                return reason
+        if orderType in STOP_PRICED_ORDER_TYPES:
+            return self.checkPrice(instrument, "StopPrice", stopPrice)
+        return None
+
+    def checkPrice(self, instrument: dict, fieldName: str, price: float) -> Optional[str]:
+        if price is None or price <= 0:
+            return "{} must be positive, got {}".format(fieldName, price)
+        minimumPrice = instrument.get("MinimumPrice")
+        if minimumPrice and price < minimumPrice:
+            return "{} {} is below the {} minimum of {}".format(fieldName, price, instrument["Symbol"], minimumPrice)
+        priceIncrement = instrument.get("PriceIncrement")
+        if priceIncrement and not isMultiple(price, priceIncrement):
+            return "{} {} is not a multiple of the {} tick {}".format(fieldName, price, instrument["Symbol"], priceIncrement)
+        return None
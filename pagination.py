@@ -0,0 +1,72 @@
+from collections import deque
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from dataclasses import fields
+from typing import Any, Callable, Iterator, List
+
+# Row formats accepted by iterRows
+ROW_FORMATS = ("dict", "typed", "columns")
+
+def readPages(client, endPointName: str, payloadForPage: Callable[[int, int], Any], pageSize: int,
+    readAhead: int = 2, startIndex: int = 0, timeout: float = 5.0) -> Iterator[List[dict]]:
+    # Walks a StartIndex/Count endpoint page by page. `readAhead` further pages are always
+    # requested (pipelined on the socket) before the current one is handed over, so the caller
+    # works on a page while the next ones are in flight. Stops after the first short page; a
+    # failed or missing reply raises instead of silently truncating the walk.
+    inFlight = deque()
+    nextIndex = startIndex
+
+    def requestNextPage():
+        nonlocal nextIndex
+        future = client.sendRequestAsync(endPointName, payloadForPage(nextIndex, pageSize))
+        future.startIndex = nextIndex
+        inFlight.append(future)
+        nextIndex += pageSize
+
+    # Pages requested ahead of a short page (or of an abandoned walk) stay registered, so their
+    # replies are dropped with their future instead of landing in the endpoint queue
+    for _ in range(readAhead + 1):
+        requestNextPage()
+    while inFlight:
+        future = inFlight.popleft()
+        try:
+            page = future.result(timeout)
+        except FutureTimeoutError:
+            client.pendingReplies.pop(future.sequence, None)
+            raise TimeoutError("{} page at index {} timed out.".format(endPointName, future.startIndex))
+        if isinstance(page, dict) and client.is_error_message(page):
+            raise RuntimeError("{} page at index {} failed: {} {}".format(
+                endPointName, future.startIndex, page.get("errorcode"), page.get("errormsg")))
+        if not isinstance(page, list):
+            raise RuntimeError("{} page at index {} is not a list.".format(endPointName, future.startIndex))
+        if len(page) < pageSize:
+            if page:
+                yield page
+            return
+        requestNextPage()
+        yield page
+
+fieldNamesByType = dict()
+
+def fieldNames(rowType) -> tuple:
+    names = fieldNamesByType.get(rowType)
+    if names is None:
+        names = fieldNamesByType[rowType] = tuple(field.name for field in fields(rowType))
+    return names
+
+def iterRows(pages: Iterator[List[dict]], rowFormat: str = "dict", rowType=None) -> Iterator:
+    # "dict" yields the reply rows, "typed" one `rowType` dataclass per row (fields missing
+    # from the reply are None), "columns" one {field: [values]} chunk per page
+    if rowFormat == "dict":
+        for page in pages:
+            yield from page
+    elif rowFormat == "typed":
+        names = fieldNames(rowType)
+        for page in pages:
+            for row in page:
+                yield rowType(**{name: row.get(name) for name in names})
+    elif rowFormat == "columns":
+        for page in pages:
+            names = dict.fromkeys(name for row in page for name in row)
+            yield {name: [row.get(name) for row in page] for name in names}
+    else:
+        raise ValueError("rowFormat must be one of {}, got {!r}.".format(ROW_FORMATS, rowFormat))
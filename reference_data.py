@@ -0,0 +1,118 @@
+from concurrent.futures import Future
+from threading import Lock, Thread
+from time import monotonic
+from typing import List, Optional, Union
+
+class ReferenceData(object):
+    '''
+    Instruments and products of one Order Management System, loaded once from GetInstruments
+    and GetProducts and indexed by InstrumentId, Symbol ("BTC/BRL"), ProductId and product
+    symbol ("BTC"), so every lookup is a dict access.
+
+    Data older than `ttl` seconds is reloaded in the background while the current data keeps
+    answering. Refreshes are single-flight: however many threads ask at once, one pair of
+    pipelined requests is sent and everyone waits on (or ignores) the same result. The
+    client's getInstrument(s)/getProduct(s) are answered from here, so loads always go to the
+    wire themselves. After a failed load no other is attempted for `retryDelay` seconds, so an
+    outage costs callers one load timeout rather than one per lookup.
+
+    Lookups return the cached dicts themselves and callers must not modify them; the client
+    methods hand out copies.
+    '''
+    def __init__(self, client, omsId: int, ttl: float = 3600.0, retryDelay: float = 30.0):
+        self.client = client
+        self.omsId = omsId
+        self.ttl = ttl
+        self.retryDelay = retryDelay
+        self.instrumentsById = dict()
+        self.instrumentsBySymbol = dict()
+        self.productsById = dict()
+        self.productsBySymbol = dict()
+        self.loadedAt = None
+        self.failedAt = None
+        self.refreshing = None
+        self.lock = Lock()
+
+    # ============== Loading ================
+    def refresh(self, wait: bool = True) -> bool:
+        with self.lock:
+            future = self.refreshing
+            leader = future is None
+            if leader:
+                future = self.refreshing = Future()
+        if leader:
+            if wait:
+                self.load(future)
+            else:
+                Thread(target=self.load, args=(future,), daemon=True).start()
+                return self.loadedAt is not None
+        elif not wait:
+            return self.loadedAt is not None
+        return future.result()
+
+    def load(self, future: Future):
+        loaded = False
+        try:
+            instruments, products = self.client.getAsyncResponses([
+                self.client.sendRequestAsync("GetInstruments", {"OMSId": self.omsId}),
+                self.client.sendRequestAsync("GetProducts", {"OMSId": self.omsId}),
+            ])
+            if isinstance(instruments, list) and isinstance(products, list):
+                self.seed(instruments, products)
+                loaded = True
+        except Exception as e:
+            self.client.logger.warning("Reference data of OMS %s could not be loaded: %s", self.omsId, e)
+        finally:
+            with self.lock:
+                self.failedAt = None if loaded else monotonic()
+                self.refreshing = None
+            future.set_result(loaded)
+
+    # Also used to install data obtained elsewhere, e.g. a warm-start snapshot
+    def seed(self, instruments: List[dict], products: List[dict]):
+        # New indexes are built aside and swapped in, so readers never see a partial load
+        self.instrumentsById = {instrument["InstrumentId"]: instrument for instrument in instruments}
+        self.instrumentsBySymbol = {instrument["Symbol"]: instrument for instrument in instruments}
+        self.productsById = {product["ProductId"]: product for product in products}
+        self.productsBySymbol = {product["Product"]: product for product in products}
+        self.loadedAt = monotonic()
+
+    def ensureLoaded(self) -> bool:
+        now = monotonic()
+        coolingDown = self.failedAt is not None and now - self.failedAt < self.retryDelay
+        if self.loadedAt is None:
+            return False if coolingDown else self.refresh()
+        if now - self.loadedAt > self.ttl and not coolingDown:
+            self.refresh(wait=False)
+        return True
+
+    # ============== Lookups ================
+    def getInstrument(self, instrumentIdOrSymbol: Union[int, str]) -> Optional[dict]:
+        self.ensureLoaded()
+        if isinstance(instrumentIdOrSymbol, str):
+            return self.instrumentsBySymbol.get(instrumentIdOrSymbol)
+        return self.instrumentsById.get(instrumentIdOrSymbol)
+
+    def getProduct(self, productIdOrSymbol: Union[int, str]) -> Optional[dict]:
+        self.ensureLoaded()
+        if isinstance(productIdOrSymbol, str):
+            return self.productsBySymbol.get(productIdOrSymbol)
+        return self.productsById.get(productIdOrSymbol)
+
+    def instruments(self) -> List[dict]:
+        self.ensureLoaded()
+        return list(self.instrumentsById.values())
+
+    def products(self) -> List[dict]:
+        self.ensureLoaded()
+        return list(self.productsById.values())
+
+    def resolveInstrumentId(self, instrumentIdOrSymbol: Union[int, str]) -> int:
+        if not isinstance(instrumentIdOrSymbol, str):
+            return instrumentIdOrSymbol
+        instrument = self.getInstrument(instrumentIdOrSymbol)
+        if instrument is None and self.loadedAt is None:
+            raise RuntimeError("Instruments of OMS {} could not be loaded to resolve {!r}.".format(self.omsId, instrumentIdOrSymbol))
+        if instrument is None:
+            raise ValueError("Unknown instrument symbol {!r} on OMS {}.".format(instrumentIdOrSymbol, self.omsId))
+        return instrument["InstrumentId"]
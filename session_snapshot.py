@@ -0,0 +1,85 @@
+import json
+import os
+from threading import Event
+from time import time
+from typing import List, Optional
+
+# Bumped whenever the layout of the file changes; older files are ignored
+SNAPSHOT_VERSION = 1
+
+class SessionSnapshot(object):
+    '''
+    Warm-start file for `FoxBitClient.warmStart`: the instruments, products, account fee
+    schedule and account info of one OMS/account, saved as JSON after every successful
+    revalidation. On the next start they are installed before the socket is even open, so the
+    reference data, fee engine and validator answer at once while the exchange copies are
+    fetched in the background.
+
+    A file older than `maxAge` seconds, or written for another OMS/account or layout, is
+    ignored. `revalidated` is set once the exchange copies have been received (or have failed
+    to arrive) and applied.
+    '''
+    def __init__(self, path: str, omsId: int, accountId: int, maxAge: float = 86400.0):
+        self.path = path
+        self.omsId = omsId
+        self.accountId = accountId
+        self.maxAge = maxAge
+        self.instruments = None
+        self.products = None
+        self.accountFees = None
+        self.accountInfo = None
+        self.savedAt = None
+        self.fromFile = False
+        self.revalidated = Event()
+
+    def isComplete(self) -> bool:
+        return None not in (self.instruments, self.products, self.accountFees, self.accountInfo)
+
+    def load(self) -> bool:
+        try:
+            with open(self.path, "r", encoding="utf-8") as snapshotFile:
+                data = json.load(snapshotFile)
+        except (OSError, ValueError):
+            return False
+        if not isinstance(data, dict) or data.get("version") != SNAPSHOT_VERSION:
+            return False
+        if data.get("omsId") != self.omsId or data.get("accountId") != self.accountId:
+            return False
+        savedAt = data.get("savedAt")
+        if not isinstance(savedAt, (int, float)) or time() - savedAt > self.maxAge:
+            return False
+        self.update(data.get("instruments"), data.get("products"), data.get("accountFees"), data.get("accountInfo"))
+        self.savedAt = savedAt
+        self.fromFile = self.isComplete()
+        return self.fromFile
+
+    # Values that could not be fetched (None) keep the previous ones
+    def update(self, instruments: Optional[List[dict]], products: Optional[List[dict]],
+        accountFees: Optional[List[dict]], accountInfo: Optional[dict]):
+        if isinstance(instruments, list):
+            self.instruments = instruments
+        if isinstance(products, list):
+            self.products = products
+        if isinstance(accountFees, list):
+            self.accountFees = accountFees
+        if isinstance(accountInfo, dict):
+            self.accountInfo = accountInfo
+
+    def save(self):
+        savedAt = time()
+        data = {
+            "version": SNAPSHOT_VERSION,
+            "savedAt": savedAt,
+            "omsId": self.omsId,
+            "accountId": self.accountId,
+            "instruments": self.instruments,
+            "products": self.products,
+            "accountFees": self.accountFees,
+            "accountInfo": self.accountInfo,
+        }
+        # Written aside and renamed, so a crash never leaves a truncated snapshot behind
+        temporaryPath = "{}.tmp".format(self.path)
+        with open(temporaryPath, "w", encoding="utf-8") as snapshotFile:
+            json.dump(data, snapshotFile)
+        os.replace(temporaryPath, self.path)
+        self.savedAt = savedAt
@@ -0,0 +1,77 @@
+import json
+import time
+import unittest
+from logging import INFO
+
+from foxbit_client import FoxBitClient
+from mock_server import MockFoxBitServer
+
+# Market data streams are off, so the only traffic is what a test sends
+QUIET_EVENT_RATES = {
+    "Level1UpdateEvent": 0,
+    "Level2UpdateEvent": 0,
+    "TradeDataUpdateEvent": 0,
+    "TickerDataUpdateEvent": 0,
+}
+
+def waitFor(condition, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("Condition not met within {} seconds.".format(timeout))
+        time.sleep(0.01)
+
+class MockServerTestCase(unittest.TestCase):
+    '''
+    Runs every test against a fresh MockFoxBitServer with a connected (and, unless
+    `authenticate` is False, authenticated) FoxBitClient as `self.client`.
+    '''
+    authenticate = True
+    serverOptions = dict()
+
+    def setUp(self):
+        self.server = MockFoxBitServer(eventRates=QUIET_EVENT_RATES, **self.serverOptions).start()
+        self.addCleanup(self.server.stop)
+        self.client = self.connectClient()
+
+    def connectClient(self) -> FoxBitClient:
+        client = FoxBitClient(enableConnLog=False, logLevel=INFO)
+        client.connect(self.server.url)
+        # Closed without joining the socket thread (a daemon), which only notices the close at
+        # its next ping timeout
+        self.addCleanup(client.socket.close)
+        if self.authenticate:
+            client.authenticateUser(self.server.apiKey, self.server.apiSecret, self.server.userId)
+        return client
+
+    def countSentFrames(self, client: FoxBitClient = None) -> list:
+        # Frames handed to the socket from now on, as their encoded text
+        client = client if client is not None else self.client
+        sent = []
+        send = client.socket.send
+
+        def recordingSend(frame):
+            sent.append(frame)
+            return send(frame)
+
+        client.socket.send = recordingSend
+        return sent
+
+    def dropRequests(self, *functionNames):
+        # The server reads these requests and never replies to them
+        handleMessage = self.server.handleMessage
+
+        def droppingHandleMessage(connection, message):
+            if json.loads(message)["n"] not in functionNames:
+                handleMessage(connection, message)
+
+        self.server.handleMessage = droppingHandleMessage
+
+def marketOrder(clientOrderId: int, side=None, quantity: float = 0.001, instrumentId: int = 1):
+    # Market orders fill at once on the mock server, each one adding a trade to the account
+    from message_enums import OrderType, PegPriceType, Side, TimeInForce
+    from message_request import SendOrderRequest
+    return SendOrderRequest(AccountId=1, ClientOrderId=clientOrderId, Quantity=quantity, DisplayQuantity=0,
+        UseDisplayQuantity=False, LimitPrice=0, OrderIdOCO=0, OrderType=OrderType.Market,
+        PegPriceType=PegPriceType.Last, InstrumentId=instrumentId, TrailingAmount=0, LimitOffset=0,
+        Side=side if side is not None else Side.Buy, StopPrice=0, TimeInForce=TimeInForce.GTC, OMSId=1)
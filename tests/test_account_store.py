@@ -0,0 +1,114 @@
+import logging
+import os
+import tempfile
+import unittest
+
+from account_store import AccountStore, AccountSync
+from tests.support import MockServerTestCase, marketOrder
+
+def trade(tradeId, instrumentId=1):
+    return {"TradeId": tradeId, "ExecutionId": tradeId, "OrderId": tradeId, "InstrumentId": instrumentId,
+        "Side": "Buy", "Quantity": 1.0, "Price": 100.0, "Value": 100.0, "TradeTimeMS": 1000 * tradeId}
+
+def transaction(transactionId, productId=2):
+    return {"TransactionId": transactionId, "ProductId": productId, "TransactionType": "Trade", "CR": 1.0,
+        "DR": 0.0, "Balance": float(transactionId), "TimeStamp": 1000 * transactionId}
+
+class HistoryClient(object):
+    # Serves `trades` and `transactions` most recent first, like the exchange
+    def __init__(self):
+        self.trades = []
+        self.transactions = []
+        self.depths = []
+        self.tradesRead = 0
+        self.logger = logging.getLogger("tests")
+
+    def iterAccountTrades(self, accountId, omsId, readAhead=2, timeout=5.0):
+        for trade in reversed(self.trades):
+            self.tradesRead += 1
+            yield trade
+
+    def getAccountTransactions(self, accountId, omsId, depth):
+        self.depths.append(depth)
+        return list(reversed(self.transactions))[:depth]
+
+class AccountStoreTest(unittest.TestCase):
+    def setUp(self):
+        folder = tempfile.TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+        self.path = os.path.join(folder.name, "account.db")
+        self.store = AccountStore(self.path)
+        self.addCleanup(self.store.close)
+
+    def test_storing_twice_replaces_and_keeps_the_highest_mark(self):
+        self.store.storeTrades(1, [trade(1), trade(2)])
+        self.store.storeTrades(1, [trade(2)])
+        self.store.storeTrades(1, [])
+        self.assertEqual([row["TradeId"] for row in self.store.queryTrades(1)], [1, 2])
+        self.assertEqual(self.store.highWaterMark(1, "trades"), 2)
+        self.assertIsNone(self.store.highWaterMark(1, "transactions"))
+        self.assertIsNone(self.store.highWaterMark(2, "trades"))
+
+    def test_queries_filter_by_time_and_instrument(self):
+        self.store.storeTrades(1, [trade(tradeId, instrumentId=1 + tradeId % 2) for tradeId in range(1, 11)])
+        self.store.storeTransactions(1, [transaction(1, productId=1), transaction(2)])
+        self.assertEqual([row["TradeId"] for row in self.store.queryTrades(1, startTimeMs=3000, endTimeMs=6000)], [3, 4, 5])
+        self.assertEqual([row["TradeId"] for row in self.store.queryTrades(1, instrumentId=1)], [2, 4, 6, 8, 10])
+        self.assertEqual([row["TransactionId"] for row in self.store.queryTransactions(1, productId=2)], [2])
+
+    def test_marks_survive_reopening(self):
+        self.store.storeTransactions(1, [transaction(7)])
+        self.store.close()
+        self.store = AccountStore(self.path)
+        self.assertEqual(self.store.highWaterMark(1, "transactions"), 7)
+
+class AccountSyncTest(unittest.TestCase):
+    def setUp(self):
+        self.store = AccountStore(":memory:")
+        self.addCleanup(self.store.close)
+        self.client = HistoryClient()
+
+    def sync(self, **options):
+        return AccountSync(self.client, self.store, 1, 1, **options).sync()
+
+    def test_incremental_sync_stops_at_the_high_water_mark(self):
+        self.client.trades = [trade(tradeId) for tradeId in range(1, 101)]
+        self.client.transactions = [transaction(transactionId) for transactionId in range(1, 51)]
+        self.assertEqual(self.sync(), {"trades": 100, "transactions": 50})
+        self.client.trades += [trade(101), trade(102)]
+        self.client.transactions += [transaction(51)]
+        self.client.tradesRead = 0
+        self.assertEqual(self.sync(), {"trades": 2, "transactions": 1})
+        # The two new trades and the one at the mark
+        self.assertEqual(self.client.tradesRead, 3)
+        self.assertEqual(self.sync(), {"trades": 0, "transactions": 0})
+        self.assertEqual(len(self.store.queryTrades(1)), 102)
+
+    def test_transaction_depth_doubles_until_the_mark_is_reached(self):
+        self.client.transactions = [transaction(transactionId) for transactionId in range(1, 11)]
+        self.sync(transactionDepth=4)
+        self.client.transactions += [transaction(transactionId) for transactionId in range(11, 31)]
+        self.client.depths = []
+        self.assertEqual(self.sync(transactionDepth=4)["transactions"], 20)
+        self.assertEqual(self.client.depths, [4, 8, 16, 32])
+        self.assertEqual(self.store.highWaterMark(1, "transactions"), 30)
+
+    def test_failed_transaction_read_raises_without_moving_the_mark(self):
+        self.client.getAccountTransactions = lambda accountId, omsId, depth: None
+        with self.assertRaises(RuntimeError):
+            self.sync()
+        self.assertIsNone(self.store.highWaterMark(1, "transactions"))
+
+class AccountSyncWireTest(MockServerTestCase):
+    def test_sync_against_the_exchange(self):
+        store = AccountStore(":memory:")
+        self.addCleanup(store.close)
+        self.client.sendOrders([marketOrder(i + 1) for i in range(30)])
+        first = self.client.syncAccountHistory(1, 1, store)
+        self.assertEqual(first["trades"], 30)
+        self.client.sendOrders([marketOrder(i + 100) for i in range(3)])
+        self.assertEqual(self.client.syncAccountHistory(1, 1, store)["trades"], 3)
+        self.assertEqual(len(store.queryTrades(1)), 33)
+
+if __name__ == "__main__":
+    unittest.main()
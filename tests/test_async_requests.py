@@ -0,0 +1,119 @@
+import os
+import tempfile
+import unittest
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+
+from foxbit_client import FoxBitClient
+from helpers import failFuture, resolveFuture
+from order_tracker import OrderHandle, OrderTracker, ReplyDeadlines
+from tests.support import MockServerTestCase, marketOrder, waitFor
+
+class FutureHelpersTest(unittest.TestCase):
+    def test_done_futures_are_left_alone(self):
+        cancelled = Future()
+        cancelled.cancel()
+        self.assertFalse(resolveFuture(cancelled, 1))
+        self.assertFalse(failFuture(cancelled, ConnectionError()))
+        self.assertTrue(cancelled.cancelled())
+        resolved = Future()
+        self.assertTrue(resolveFuture(resolved, 1))
+        self.assertFalse(failFuture(resolved, ConnectionError()))
+        self.assertEqual(resolved.result(), 1)
+
+class OrderTrackerTest(unittest.TestCase):
+    def acceptedReply(self, orderId):
+        reply = Future()
+        reply.set_result({"status": "Accepted", "errormsg": "", "OrderId": orderId})
+        return reply
+
+    def test_events_published_before_the_reply_are_replayed(self):
+        tracker = OrderTracker()
+        handle = OrderHandle(marketOrder(7))
+        tracker.track(handle)
+        tracker.onOrderState({"OrderId": 1001, "ClientOrderId": 0, "OrderState": "Working"})
+        tracker.acknowledge(handle, self.acceptedReply(1001))
+        self.assertEqual(handle.result(), (True, 1001))
+        self.assertEqual(handle.orderState, "Working")
+        tracker.onOrderState({"OrderId": 1001, "OrderState": "FullyExecuted"})
+        self.assertTrue(handle.finished.is_set())
+        self.assertEqual(tracker.pendingHandles(), [])
+
+    def test_handle_is_published_with_its_order_id(self):
+        tracker = OrderTracker()
+        handle = OrderHandle(marketOrder(8))
+        seen = []
+        # Runs while acknowledge still holds the tracker lock, as a concurrent route() would see it
+        original = tracker.handlesByOrderId
+        class Recording(dict):
+            def __setitem__(self, orderId, value):
+                seen.append(value.orderId)
+                dict.__setitem__(self, orderId, value)
+        tracker.handlesByOrderId = Recording(original)
+        tracker.acknowledge(handle, self.acceptedReply(1002))
+        self.assertEqual(seen, [1002])
+
+class ReplyDeadlinesTest(unittest.TestCase):
+    def test_only_unanswered_replies_expire(self):
+        expired = []
+        deadlines = ReplyDeadlines(0.05, expired.append)
+        answered, unanswered = Future(), Future()
+        deadlines.watch(answered)
+        deadlines.watch(unanswered)
+        answered.set_result({"status": "Accepted"})
+        waitFor(lambda: not deadlines.waiting)
+        self.assertEqual(expired, [unanswered])
+
+class PendingRepliesWireTest(MockServerTestCase):
+    authenticate = False
+
+    def test_reply_to_a_cancelled_future_does_not_fail_other_requests(self):
+        cancelled = self.client.sendRequestAsync("GetInstruments", {"OMSId": 1})
+        self.assertTrue(cancelled.cancel())
+        products = self.client.sendRequestAsync("GetProducts", {"OMSId": 1})
+        self.assertEqual(len(products.result(5)), 3)
+        self.assertEqual(self.client.pendingReplies, {})
+
+    def test_broken_connection_skips_cancelled_requests(self):
+        cancelled = Future()
+        cancelled.cancel()
+        pending = Future()
+        self.client.pendingReplies.update({998: cancelled, 999: pending})
+        self.client.failPendingReplies(ConnectionError("closed"))
+        self.assertTrue(cancelled.cancelled())
+        self.assertEqual(str(pending.exception()), "closed")
+        self.assertEqual(self.client.pendingReplies, {})
+
+class SubmitOrderWireTest(MockServerTestCase):
+    def test_unanswered_order_fails_its_handle(self):
+        self.client.orderReplyDeadlines.timeout = 0.05
+        self.dropRequests("SendOrder")
+        handle = self.client.submitOrder(marketOrder(7))
+        self.assertIsInstance(handle.exception(timeout=5), FutureTimeoutError)
+        self.assertTrue(handle.finished.is_set())
+        self.assertEqual(self.client.pendingReplies, {})
+        self.assertEqual(self.client.getOrderTracker().pendingHandles(), [])
+
+    def test_answered_orders_do_not_expire(self):
+        self.client.orderReplyDeadlines.timeout = 0.05
+        handle = self.client.submitOrder(marketOrder(7))
+        accepted, _ = handle.result(timeout=5)
+        self.assertTrue(accepted)
+        waitFor(lambda: not self.client.orderReplyDeadlines.waiting)
+
+class WarmStartWireTest(MockServerTestCase):
+    authenticate = False
+
+    def test_failed_authentication_drops_the_pipelined_requests(self):
+        folder = tempfile.TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+        # Still unanswered when the authentication fails
+        self.dropRequests("GetInstruments", "GetProducts")
+        client = FoxBitClient(enableConnLog=False)
+        snapshot = client.warmStart(self.server.url, self.server.apiKey, "wrong-secret", self.server.userId,
+            omsId=1, accountId=1, snapshotPath=os.path.join(folder.name, "session.json"))
+        self.addCleanup(client.socket.close)
+        self.assertIsNone(snapshot)
+        self.assertEqual(client.pendingReplies, {})
+
+if __name__ == "__main__":
+    unittest.main()
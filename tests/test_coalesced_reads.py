@@ -0,0 +1,51 @@
+import json
+from threading import Thread
+from unittest import mock
+
+from tests.support import MockServerTestCase, waitFor
+
+class CoalescedReadsWireTest(MockServerTestCase):
+    authenticate = False
+
+    def readConcurrently(self, callers: int, read):
+        results = [None] * callers
+
+        def call(index):
+            results[index] = read()
+
+        threads = [Thread(target=call, args=(index,)) for index in range(callers)]
+        for thread in threads:
+            thread.start()
+        return threads, results
+
+    def test_identical_reads_in_flight_share_one_request(self):
+        sent = self.countSentFrames()
+        # Held unanswered so that every caller joins the first request
+        self.dropRequests("GetL2Snapshot")
+        with mock.patch("foxbit_client.ONE_SHOT_TIMEOUT", 0.3):
+            threads, results = self.readConcurrently(5, lambda: self.client.getL2Snapshot(1, 1, depth=5))
+            for thread in threads:
+                thread.join(5)
+        self.assertEqual([json.loads(frame)["n"] for frame in sent], ["GetL2Snapshot"])
+        self.assertEqual(results, [None] * 5)
+        self.assertEqual(self.client.pendingReplies, {})
+        self.assertEqual(self.client.inFlightReads, {})
+
+    def test_answered_read_is_shared_then_forgotten(self):
+        first = self.client.getL2Snapshot(1, 1, depth=5)
+        self.assertTrue(first)
+        self.assertEqual(self.client.inFlightReads, {})
+        sent = self.countSentFrames()
+        self.client.getL2Snapshot(1, 1, depth=5)
+        self.assertEqual(len(sent), 1)
+
+    def test_broken_connection_is_reported_to_every_waiter(self):
+        self.dropRequests("GetL2Snapshot")
+        threads, results = self.readConcurrently(3, lambda: self.client.getL2Snapshot(1, 1, depth=5))
+        waitFor(lambda: self.client.pendingReplies)
+        with self.assertLogs(self.client.logger, "ERROR") as logs:
+            self.client.failPendingReplies(ConnectionError("closed"))
+            for thread in threads:
+                thread.join(5)
+        self.assertEqual(results, [None] * 3)
+        self.assertTrue(all("ConnectionError('closed')" in line for line in logs.output))
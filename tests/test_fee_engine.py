@@ -0,0 +1,66 @@
+import unittest
+
+from message_enums import MakerTaker, OrderType
+from message_request import OrderFeeRequest
+from fee_engine import FeeEngine, FeeSchedule
+from tests.support import MockServerTestCase, waitFor
+
+def feeRow(feeType, feeAmt, instrumentId=0, orderType="Unknown", ladderThreshold=0, isActive=True, feeCalcType="Percentage"):
+    return {
+        "FeeId": 0, "OMSId": 1, "AccountId": 1, "InstrumentId": instrumentId, "FeeType": feeType,
+        "OrderType": orderType, "FeeAmt": feeAmt, "FeeCalcType": feeCalcType,
+        "LadderThreshold": ladderThreshold, "IsActive": isActive,
+    }
+
+class FeeScheduleTest(unittest.TestCase):
+    def test_most_specific_row_wins(self):
+        schedule = FeeSchedule([
+            feeRow("Flat", 0.01),
+            feeRow("TakerFee", 0.005),
+            feeRow("TakerFee", 0.004, instrumentId=1),
+            feeRow("TakerFee", 0.003, instrumentId=1, orderType="Limit"),
+        ], loadedAt=0.0)
+        self.assertEqual(schedule.rule(1, MakerTaker.Taker.value, "Limit")["FeeAmt"], 0.003)
+        self.assertEqual(schedule.rule(1, MakerTaker.Taker.value, "Market")["FeeAmt"], 0.004)
+        self.assertEqual(schedule.rule(2, MakerTaker.Taker.value, "Market")["FeeAmt"], 0.005)
+        self.assertEqual(schedule.rule(2, MakerTaker.Maker.value, "Market")["FeeAmt"], 0.01)
+
+    def test_ladder_tier_follows_trailing_volume(self):
+        schedule = FeeSchedule([
+            feeRow("MakerFee", 0.002),
+            feeRow("MakerFee", 0.001, ladderThreshold=100),
+            feeRow("MakerFee", 0.0005, ladderThreshold=1000),
+        ], loadedAt=0.0)
+        self.assertEqual(schedule.rule(1, MakerTaker.Maker.value, "Limit", 0)["FeeAmt"], 0.002)
+        self.assertEqual(schedule.rule(1, MakerTaker.Maker.value, "Limit", 100)["FeeAmt"], 0.001)
+        self.assertEqual(schedule.rule(1, MakerTaker.Maker.value, "Limit", 5000)["FeeAmt"], 0.0005)
+
+    def test_inactive_rows_are_ignored(self):
+        schedule = FeeSchedule([feeRow("TakerFee", 0.005, isActive=False)], loadedAt=0.0)
+        self.assertIsNone(schedule.rule(1, MakerTaker.Taker.value, "Limit"))
+
+class FeeEngineWireTest(MockServerTestCase):
+    def test_estimates_match_get_order_fee(self):
+        engine = self.client.startFeeEngine(1)
+        for productId in (1, 2):
+            for makerTaker in (MakerTaker.Maker, MakerTaker.Taker):
+                request = OrderFeeRequest(OMSId=1, AccountId=1, InstrumentId=1, ProductId=productId, Amount=0.5,
+                    Price=150000.0, OrderType=OrderType.Limit, MakerTaker=makerTaker)
+                with self.subTest(productId=productId, makerTaker=makerTaker.name):
+                    self.assertAlmostEqual(engine.getOrderFee(request)["OrderFee"], self.client.getOrderFee(request)["OrderFee"])
+
+    def test_unanswered_drift_checks_are_not_left_pending(self):
+        engine = self.client.startFeeEngine(1, driftCheckEvery=1)
+        engine.driftTimeout = 0.05
+        self.dropRequests("GetOrderFee")
+        sent = self.countSentFrames()
+        request = OrderFeeRequest(OMSId=1, AccountId=1, InstrumentId=1, ProductId=1, Amount=0.5,
+            Price=150000.0, OrderType=OrderType.Limit, MakerTaker=MakerTaker.Taker)
+        for _ in range(3):
+            engine.getOrderFee(request)
+        waitFor(lambda: len(sent) == 3)
+        waitFor(lambda: not self.client.pendingReplies)
+        self.assertEqual(engine.driftReport()["checks"], 0)
+
+if __name__ == "__main__":
+    unittest.main()
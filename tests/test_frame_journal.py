@@ -0,0 +1,61 @@
+import os
+import tempfile
+import unittest
+
+from frame_journal import FrameDirection, FrameRecorder, JournalCompression, readFrameJournal
+
+FRAMES = [
+    (FrameDirection.Outbound, '{"m":0,"i":2,"n":"GetProducts","o":"{\\"OMSId\\":1}"}'),
+    (FrameDirection.Inbound, '{"m":1,"i":2,"n":"GetProducts","o":"[]"}'),
+    (FrameDirection.Inbound, '{"m":3,"i":0,"n":"Level1UpdateEvent","o":"{\\"Symbol\\":\\"BTC/BRL ₿\\"}"}'),
+]
+
+class FrameJournalTest(unittest.TestCase):
+    def setUp(self):
+        folder = tempfile.TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+        self.path = os.path.join(folder.name, "session.fxj")
+
+    def record(self, frames, compression, flushEach=False):
+        recorder = FrameRecorder(self.path, compression=compression, flushInterval=3600).start()
+        for direction, frame in frames:
+            recorder.record(direction, frame)
+            if flushEach:
+                recorder.flush()
+        recorder.stop()
+
+    def test_frames_round_trip_with_every_compression(self):
+        for compression in JournalCompression:
+            with self.subTest(compression=compression.name):
+                if os.path.exists(self.path):
+                    os.remove(self.path)
+                self.record(FRAMES, compression)
+                entries = list(readFrameJournal(self.path))
+                self.assertEqual([(direction, frame) for direction, _, frame in entries], FRAMES)
+                timestamps = [timestamp for _, timestamp, _ in entries]
+                self.assertEqual(timestamps, sorted(timestamps))
+
+    def test_appending_keeps_earlier_frames(self):
+        self.record(FRAMES[:1], JournalCompression.Zlib)
+        self.record(FRAMES[1:], JournalCompression.Zlib)
+        self.assertEqual([frame for _, _, frame in readFrameJournal(self.path)], [frame for _, frame in FRAMES])
+
+    def test_appending_with_another_compression_is_refused(self):
+        self.record(FRAMES, JournalCompression.Zlib)
+        with self.assertRaises(ValueError):
+            FrameRecorder(self.path, compression=JournalCompression.Lzma).start()
+
+    def test_truncated_trailing_block_is_ignored(self):
+        self.record(FRAMES, JournalCompression.Zlib, flushEach=True)
+        with open(self.path, "r+b") as journal:
+            journal.truncate(os.path.getsize(self.path) - 3)
+        self.assertEqual([frame for _, _, frame in readFrameJournal(self.path)], [frame for _, frame in FRAMES[:2]])
+
+    def test_other_files_are_rejected(self):
+        with open(self.path, "wb") as journal:
+            journal.write(b"not a journal")
+        with self.assertRaises(ValueError):
+            list(readFrameJournal(self.path))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,27 @@
+import json
+import unittest
+
+from helpers import canonicalJson, jsonStringify
+from message_enums import OrderType, Side
+from tests.support import marketOrder
+
+class JsonStringifyTest(unittest.TestCase):
+    def test_request_dataclasses_are_sent_as_their_fields(self):
+        payload = json.loads(jsonStringify(marketOrder(7, Side.Sell)))
+        self.assertEqual(payload["ClientOrderId"], 7)
+        self.assertEqual(payload["Side"], Side.Sell.value)
+        self.assertEqual(payload["OrderType"], OrderType.Market.value)
+
+    def test_plain_dicts_are_unchanged(self):
+        self.assertEqual(json.loads(jsonStringify({"OMSId": 1, "Symbol": "BTC/BRL"})), {"OMSId": 1, "Symbol": "BTC/BRL"})
+
+class CanonicalJsonTest(unittest.TestCase):
+    def test_key_order_does_not_matter(self):
+        self.assertEqual(canonicalJson({"OMSId": 1, "Depth": 5}), canonicalJson({"Depth": 5, "OMSId": 1}))
+        self.assertNotEqual(canonicalJson({"OMSId": 1, "Depth": 5}), canonicalJson({"OMSId": 1, "Depth": 6}))
+
+    def test_dataclasses_and_enums_are_encoded(self):
+        self.assertIn('"Side": 1', canonicalJson(marketOrder(7, Side.Sell)))
+
+if __name__ == "__main__":
+    unittest.main()
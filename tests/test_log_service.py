@@ -0,0 +1,94 @@
+import gzip
+import os
+import tempfile
+import unittest
+from logging import INFO, LogRecord
+
+from log_service import LogRetentionPolicy, LogSampler, RotatingFileWriter
+from tests.support import waitFor
+
+def logRecord(message):
+    return LogRecord("tests", INFO, __file__, 0, message, None, None)
+
+class RotatingFileWriterTest(unittest.TestCase):
+    def setUp(self):
+        folder = tempfile.TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+        self.folder = folder.name
+
+    def writer(self, retention=None, maxFileSize=2000):
+        writer = RotatingFileWriter("client", self.folder, retention=retention)
+        # In bytes, to rotate after a few records
+        writer.maxFileSize = maxFileSize
+        self.addCleanup(writer.close)
+        return writer
+
+    def logFiles(self, suffix):
+        return sorted(name for name in os.listdir(self.folder) if name.endswith(suffix))
+
+    def readAll(self):
+        lines = []
+        for name in os.listdir(self.folder):
+            path = os.path.join(self.folder, name)
+            opener = gzip.open if name.endswith(".gz") else open
+            with opener(path, "rt") as logFile:
+                lines.extend(logFile.read().splitlines())
+        return lines
+
+    def test_nothing_is_created_before_the_first_record(self):
+        folder = os.path.join(self.folder, "logs")
+        RotatingFileWriter("client", folder)
+        self.assertFalse(os.path.exists(folder))
+
+    def test_rotation_by_size_keeps_every_record(self):
+        writer = self.writer()
+        for index in range(100):
+            writer.emit(logRecord("record {:03d} ".format(index) + "x" * 80))
+        writer.close()
+        self.assertGreater(len(self.logFiles(".log")), 1)
+        self.assertEqual(sorted(line.split()[1] for line in self.readAll()), ["{:03d}".format(index) for index in range(100)])
+
+    def test_rotated_files_are_compressed_in_the_background(self):
+        writer = self.writer(retention=LogRetentionPolicy(maxAgeDays=None, maxTotalSize=None))
+        for index in range(100):
+            writer.emit(logRecord("record {:03d} ".format(index) + "x" * 80))
+        # Only the active file stays uncompressed
+        waitFor(lambda: len(self.logFiles(".log")) == 1)
+        writer.close()
+        self.assertEqual(len(self.readAll()), 100)
+
+    def test_total_size_limit_prunes_the_oldest_files(self):
+        # A 1 KB budget: only the most recent compressed files are kept
+        writer = self.writer(retention=LogRetentionPolicy(compress=False, maxAgeDays=None, maxTotalSize=1 / 1024.0))
+        for index in range(200):
+            writer.emit(logRecord("record {:03d} ".format(index) + "x" * 80))
+        waitFor(lambda: len(self.logFiles(".log")) <= 2)
+        self.assertIn(os.path.basename(writer.baseFilename), self.logFiles(".log"))
+
+    def test_concurrent_writers_never_archive_each_others_files(self):
+        # Two clients logging under one name to one folder rotate at different times
+        retention = LogRetentionPolicy(maxAgeDays=None, maxTotalSize=None)
+        first, second = self.writer(retention=retention), self.writer(retention=retention, maxFileSize=3000)
+        for index in range(30):
+            first.emit(logRecord("first {:03d} ".format(index) + "x" * 80))
+            second.emit(logRecord("second {:03d} ".format(index) + "y" * 120))
+        waitFor(lambda: len(self.logFiles(".log")) == 2)
+        self.assertNotEqual(first.baseFilename, second.baseFilename)
+        first.close()
+        second.close()
+        lines = self.readAll()
+        for name in ("first", "second"):
+            self.assertEqual(sorted(line.split()[1] for line in lines if line.startswith(name)),
+                ["{:03d}".format(index) for index in range(30)])
+
+class LogSamplerTest(unittest.TestCase):
+    def test_every_nth_message_is_admitted_with_the_skipped_count(self):
+        sampler = LogSampler()
+        sampler.configure("Level2UpdateEvent", everyN=3)
+        admitted = [sampler.admit("Level2UpdateEvent") for _ in range(7)]
+        self.assertEqual(admitted, [0, None, None, 2, None, None, 2])
+        self.assertEqual(sampler.suppressedCounts()["Level2UpdateEvent"], 4)
+        self.assertEqual(sampler.admit("GetProducts"), 0)
+
+if __name__ == "__main__":
+    unittest.main()
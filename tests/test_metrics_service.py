@@ -0,0 +1,66 @@
+import unittest
+
+from metrics_service import ClientMetrics, LatencyHistogram, MAX_UNANSWERED_REQUESTS
+from tests.support import MockServerTestCase
+
+class LatencyHistogramTest(unittest.TestCase):
+    def test_percentiles_stay_within_the_relative_error_bound(self):
+        histogram = LatencyHistogram(subBucketBits=7)
+        values = list(range(1, 100001))
+        for value in values:
+            histogram.record(value)
+        bound = 2 ** -(7 - 1)
+        for percent in (50.0, 90.0, 99.0, 99.9):
+            exact = values[int(percent / 100.0 * len(values)) - 1]
+            self.assertLessEqual(abs(histogram.percentile(percent) - exact), exact * bound)
+
+    def test_snapshot_reports_count_min_max_and_mean(self):
+        histogram = LatencyHistogram()
+        for value in (5, 10, 15):
+            histogram.record(value)
+        histogram.record(-3)
+        snapshot = histogram.snapshot()
+        self.assertEqual(snapshot["count"], 4)
+        self.assertEqual(snapshot["min"], 0)
+        self.assertEqual(snapshot["max"], 15)
+        self.assertEqual(snapshot["mean"], 7.5)
+
+    def test_empty_histogram_reports_zero(self):
+        self.assertEqual(LatencyHistogram().percentile(99.0), 0)
+
+class ClientMetricsTest(unittest.TestCase):
+    def test_pipelined_requests_are_measured_from_their_own_send(self):
+        metrics = ClientMetrics()
+        metrics.markSent("GetProducts", 2, 1000)
+        metrics.markSent("GetProducts", 4, 5000)
+        metrics.markReply("GetProducts", 2, 6000)
+        metrics.markReply("GetProducts", 4, 6000)
+        latency = metrics.snapshot()["latency"]["GetProducts"]
+        self.assertEqual(latency["count"], 2)
+        self.assertEqual(latency["max"], 5000)
+        self.assertEqual(latency["min"], 1000)
+
+    def test_reply_without_a_send_is_ignored(self):
+        metrics = ClientMetrics()
+        metrics.markReply("GetProducts", 2, 6000)
+        self.assertNotIn("GetProducts", metrics.snapshot()["latency"])
+
+    def test_unanswered_requests_are_bounded(self):
+        metrics = ClientMetrics()
+        for sequence in range(MAX_UNANSWERED_REQUESTS + 10):
+            metrics.markSent("GetProducts", sequence, sequence)
+        self.assertEqual(len(metrics.sentAtByRequest), MAX_UNANSWERED_REQUESTS)
+        self.assertNotIn(("GetProducts", 0), metrics.sentAtByRequest)
+
+class ClientMetricsWireTest(MockServerTestCase):
+    authenticate = False
+
+    def test_every_pipelined_reply_is_recorded(self):
+        self.client.metrics.reset()
+        futures = [self.client.sendRequestAsync("GetProducts", {"OMSId": 1}) for _ in range(20)]
+        self.assertTrue(all(self.client.getAsyncResponses(futures)))
+        self.assertEqual(self.client.getStats()["latency"]["GetProducts"]["count"], 20)
+        self.assertEqual(self.client.metrics.sentAtByRequest, {})
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,30 @@
+from dataclasses import replace
+
+from message_enums import OrderType
+from tests.support import MockServerTestCase, marketOrder
+
+def restingOrder(clientOrderId: int, instrumentId: int = 1, limitPrice: float = 100000.0):
+    # A bid well below the mid price, which rests on the mock book
+    return replace(marketOrder(clientOrderId, quantity=0.01, instrumentId=instrumentId),
+        OrderType=OrderType.Limit, LimitPrice=limitPrice)
+
+class OrderBatchWireTest(MockServerTestCase):
+    def openOrderIds(self):
+        return {order["OrderId"] for order in self.client.getOpenOrders(1, 1)}
+
+    def test_batches_are_sent_and_cancelled_together(self):
+        results = self.client.sendOrders([restingOrder(1), restingOrder(2)])
+        orderIds = [orderId for accepted, orderId in results if accepted]
+        self.assertEqual(len(orderIds), 2)
+        self.assertEqual(self.client.cancelOrders(1, 1, orderIds), {orderId: True for orderId in orderIds})
+        self.assertEqual(self.openOrderIds(), set())
+
+    def test_cancel_all_fallback_only_reports_orders_it_cancelled(self):
+        (_, btcOrderId), (_, ethOrderId) = self.client.sendOrders([
+            restingOrder(1), restingOrder(2, instrumentId=2, limitPrice=5000.0)])
+        # Every individual cancel times out, so the fallback decides
+        self.dropRequests("CancelOrder")
+        cancelled = self.client.cancelOrders(1, 1, [btcOrderId, ethOrderId, 99999], instrumentId=1,
+            fallbackToCancelAll=True, timeout=0.1)
+        self.assertEqual(cancelled, {btcOrderId: True, ethOrderId: False, 99999: False})
+        self.assertEqual(self.openOrderIds(), {ethOrderId})
@@ -0,0 +1,67 @@
+import unittest
+from dataclasses import replace
+
+from message_enums import OrderType
+from mock_server import DEFAULT_INSTRUMENTS, DEFAULT_PRODUCTS
+from order_validator import OrderValidator, isMultiple
+from reference_data import ReferenceData
+from tests.support import MockServerTestCase, marketOrder
+
+class SeededClient(object):
+    def __init__(self, instruments):
+        self.referenceData = ReferenceData(self, 1)
+        self.referenceData.seed(instruments, DEFAULT_PRODUCTS)
+
+    def getReferenceData(self, omsId):
+        return self.referenceData
+
+class OrderValidatorTest(unittest.TestCase):
+    def setUp(self):
+        instruments = [dict(instrument) for instrument in DEFAULT_INSTRUMENTS]
+        instruments[1]["SessionStatus"] = "Paused"
+        self.validator = OrderValidator(SeededClient(instruments))
+
+    def check(self, **overrides):
+        order = dict(omsId=1, instrumentId=1, orderType=OrderType.Limit, quantity=0.001, limitPrice=150000.0)
+        order.update(overrides)
+        return self.validator.check(**order)
+
+    def test_valid_orders_pass(self):
+        self.assertIsNone(self.check())
+        self.assertIsNone(self.check(orderType=OrderType.Market, limitPrice=None))
+        self.assertIsNone(self.check(quantity=0.1 + 0.2))
+
+    def test_each_violation_is_reported(self):
+        cases = {
+            "Unknown instrument": dict(instrumentId=99),
+            "session is Paused": dict(instrumentId=2, quantity=0.01),
+            "Quantity must be positive": dict(quantity=0),
+            "below the BTC/BRL minimum": dict(quantity=0.000001),
+            "not a multiple of the BTC/BRL increment": dict(quantity=0.0010000001),
+            "LimitPrice 150000.005 is not a multiple": dict(limitPrice=150000.005),
+            "LimitPrice 0.5 is below": dict(limitPrice=0.5),
+            "StopPrice must be positive": dict(orderType=OrderType.StopMarket, limitPrice=None),
+        }
+        for expected, overrides in cases.items():
+            with self.subTest(expected):
+                self.assertIn(expected, self.check(**overrides))
+        self.assertEqual(self.validator.rejected, len(cases))
+
+    def test_multiples_tolerate_float_rounding(self):
+        self.assertTrue(isMultiple(0.3, 0.1))
+        self.assertTrue(isMultiple(150000.01, 0.01))
+        self.assertFalse(isMultiple(0.35, 0.1))
+
+class OrderValidatorWireTest(MockServerTestCase):
+    def test_invalid_order_never_reaches_the_socket(self):
+        self.client.startOrderValidator()
+        self.client.getReferenceData(1).ensureLoaded()
+        sent = self.countSentFrames()
+        self.assertEqual(self.client.sendOrder(replace(marketOrder(1), Quantity=0.0000001)), (False, -1))
+        self.assertEqual(sent, [])
+        accepted, _ = self.client.sendOrder(marketOrder(2))
+        self.assertTrue(accepted)
+        self.assertEqual(len(sent), 1)
+
+if __name__ == "__main__":
+    unittest.main()
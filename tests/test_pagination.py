@@ -0,0 +1,91 @@
+import unittest
+from concurrent.futures import Future
+
+from message_enums import Side
+from message_result import AccountTradesResult
+from pagination import iterRows, readPages
+from tests.support import MockServerTestCase, marketOrder
+
+class PagedClient(object):
+    # Answers StartIndex/Count requests from `rows`; with `answer` False futures stay pending
+    def __init__(self, rows, answer=True, errorAt=None):
+        self.rows = rows
+        self.answer = answer
+        self.errorAt = errorAt
+        self.pendingReplies = dict()
+        self.requestedIndexes = []
+        self.sequence = 0
+
+    def sendRequestAsync(self, endPointName, payload):
+        self.sequence += 2
+        future = Future()
+        future.sequence = self.sequence
+        self.pendingReplies[self.sequence] = future
+        startIndex, count = payload["StartIndex"], payload["Count"]
+        self.requestedIndexes.append(startIndex)
+        if self.answer:
+            self.pendingReplies.pop(self.sequence)
+            if startIndex == self.errorAt:
+                future.set_result({"result": False, "errorcode": 20, "errormsg": "Not Authorized"})
+            else:
+                future.set_result(self.rows[startIndex:startIndex + count])
+        return future
+
+    def is_error_message(self, payload):
+        return "errorcode" in payload and "result" in payload and payload["errorcode"]
+
+def tradesPayload(startIndex, count):
+    return {"StartIndex": startIndex, "Count": count}
+
+class ReadPagesTest(unittest.TestCase):
+    def test_walk_stops_after_the_first_short_page(self):
+        client = PagedClient(list(range(25)))
+        pages = list(readPages(client, "GetAccountTrades", tradesPayload, pageSize=10, readAhead=2))
+        self.assertEqual([len(page) for page in pages], [10, 10, 5])
+        # The pages ahead of the short one were requested too
+        self.assertEqual(client.requestedIndexes, [0, 10, 20, 30, 40])
+
+    def test_exact_multiple_ends_on_an_empty_page(self):
+        client = PagedClient(list(range(20)))
+        pages = list(readPages(client, "GetAccountTrades", tradesPayload, pageSize=10, readAhead=0))
+        self.assertEqual([len(page) for page in pages], [10, 10])
+        self.assertEqual(client.requestedIndexes, [0, 10, 20])
+
+    def test_start_index_skips_rows(self):
+        client = PagedClient(list(range(25)))
+        rows = [row for page in readPages(client, "GetAccountTrades", tradesPayload, pageSize=10, startIndex=15) for row in page]
+        self.assertEqual(rows, list(range(15, 25)))
+
+    def test_error_reply_raises_instead_of_truncating(self):
+        client = PagedClient(list(range(50)), errorAt=20)
+        with self.assertRaises(RuntimeError):
+            list(readPages(client, "GetAccountTrades", tradesPayload, pageSize=10))
+
+    def test_timeout_raises_and_unregisters_the_page(self):
+        client = PagedClient(list(range(50)), answer=False)
+        with self.assertRaises(TimeoutError):
+            list(readPages(client, "GetAccountTrades", tradesPayload, pageSize=10, readAhead=1, timeout=0.01))
+        # The page that timed out is dropped; the one read ahead stays registered for its reply
+        self.assertEqual(len(client.pendingReplies), 1)
+
+class IterRowsTest(unittest.TestCase):
+    pages = [[{"TradeId": 2, "Price": 10.0}, {"TradeId": 1, "Price": 11.0}]]
+
+    def test_row_formats(self):
+        self.assertEqual(list(iterRows(iter(self.pages), "dict")), self.pages[0])
+        typed = list(iterRows(iter(self.pages), "typed", AccountTradesResult))
+        self.assertEqual((typed[0].TradeId, typed[0].Price, typed[0].OrderId), (2, 10.0, None))
+        self.assertEqual(list(iterRows(iter(self.pages), "columns")), [{"TradeId": [2, 1], "Price": [10.0, 11.0]}])
+        with self.assertRaises(ValueError):
+            list(iterRows(iter(self.pages), "rows"))
+
+class AccountTradesWireTest(MockServerTestCase):
+    def test_walks_every_trade_most_recent_first(self):
+        self.client.sendOrders([marketOrder(i + 1, Side.Buy if i % 2 else Side.Sell) for i in range(45)])
+        trades = list(self.client.iterAccountTrades(1, 1, pageSize=10))
+        tradeIds = [trade["TradeId"] for trade in trades]
+        self.assertEqual(len(tradeIds), 45)
+        self.assertEqual(tradeIds, sorted(set(tradeIds), reverse=True))
+
+if __name__ == "__main__":
+    unittest.main()
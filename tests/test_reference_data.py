@@ -0,0 +1,78 @@
+import json
+import unittest
+from concurrent.futures import Future
+
+from mock_server import DEFAULT_INSTRUMENTS, DEFAULT_PRODUCTS, errorPayload
+from reference_data import ReferenceData
+from tests.support import MockServerTestCase
+
+class FailingClient(object):
+    # Answers every reference data request with an exchange error
+    def __init__(self):
+        self.sent = []
+        self.logger = self
+
+    def sendRequestAsync(self, endPointName, payload):
+        self.sent.append(endPointName)
+        future = Future()
+        future.set_result(errorPayload(104, "Resource Not Found"))
+        return future
+
+    def getAsyncResponses(self, futures, timeout=None):
+        return [future.result() for future in futures]
+
+    def warning(self, *args):
+        pass
+
+class ReferenceDataTest(unittest.TestCase):
+    def test_failed_load_is_not_retried_during_the_cooldown(self):
+        client = FailingClient()
+        referenceData = ReferenceData(client, 1)
+        self.assertFalse(referenceData.ensureLoaded())
+        self.assertFalse(referenceData.ensureLoaded())
+        self.assertIsNone(referenceData.getInstrument(1))
+        self.assertEqual(client.sent, ["GetInstruments", "GetProducts"])
+        referenceData.retryDelay = 0
+        self.assertFalse(referenceData.ensureLoaded())
+        self.assertEqual(len(client.sent), 4)
+
+    def test_lookups_by_id_and_symbol(self):
+        referenceData = ReferenceData(FailingClient(), 1)
+        referenceData.seed(DEFAULT_INSTRUMENTS, DEFAULT_PRODUCTS)
+        self.assertEqual(referenceData.getInstrument("BTC/BRL")["InstrumentId"], 1)
+        self.assertEqual(referenceData.getProduct(1)["Product"], referenceData.getProduct("BTC")["Product"])
+        self.assertEqual(referenceData.resolveInstrumentId("BTC/BRL"), 1)
+        with self.assertRaises(ValueError):
+            referenceData.resolveInstrumentId("XYZ/BRL")
+
+class ReferenceDataWireTest(MockServerTestCase):
+    def sentFunctions(self, sent):
+        return [json.loads(frame)["n"] for frame in sent]
+
+    def test_unknown_id_is_asked_on_the_wire(self):
+        # The cache only knows the first instrument, the exchange knows them all
+        self.client.getReferenceData(1).seed(DEFAULT_INSTRUMENTS[:1], DEFAULT_PRODUCTS[:1])
+        sent = self.countSentFrames()
+        self.assertEqual(self.client.getInstrument(1, 1)["InstrumentId"], 1)
+        self.assertEqual(self.client.getInstrument(1, 2)["InstrumentId"], 2)
+        self.assertEqual(self.client.getProduct(1, 2)["ProductId"], 2)
+        self.assertIsNone(self.client.getInstrument(1, "XYZ/BRL"))
+        self.assertEqual(self.sentFunctions(sent), ["GetInstrument", "GetProduct"])
+
+    def test_callers_get_copies_of_the_cache(self):
+        self.client.getInstruments(1)[0]["Symbol"] = "changed"
+        self.client.getInstrument(1, 1)["Symbol"] = "changed"
+        self.client.getProducts(1)[0]["Product"] = "changed"
+        self.assertEqual(self.client.getInstruments(1)[0]["Symbol"], DEFAULT_INSTRUMENTS[0]["Symbol"])
+        self.assertEqual(self.client.getReferenceData(1).getProduct(1)["Product"], DEFAULT_PRODUCTS[0]["Product"])
+
+    def test_outage_costs_one_load_then_reads_go_to_the_wire(self):
+        self.server.handlerByFunction["GetInstruments"] = lambda connection, sequence, payload: errorPayload(5, "Operation Failed")
+        sent = self.countSentFrames()
+        for _ in range(3):
+            self.assertEqual(self.client.getInstrument(1, 1)["InstrumentId"], 1)
+        self.assertEqual(self.sentFunctions(sent).count("GetInstruments"), 1)
+        self.assertEqual(self.sentFunctions(sent).count("GetInstrument"), 3)
+
+if __name__ == "__main__":
+    unittest.main()
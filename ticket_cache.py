@@ -0,0 +1,40 @@
+from collections import OrderedDict
+from threading import Lock
+from typing import Optional
+
+from message_enums import DepositStatus, WithdrawStatus
+
+# Ticket statuses after which a ticket no longer changes, by ticket kind
+TERMINAL_TICKET_STATUSES = {
+    "Deposit": frozenset(status.name for status in (DepositStatus.Rejected, DepositStatus.FullyProcessed, DepositStatus.Failed)),
+    "Withdraw": frozenset(status.name for status in (WithdrawStatus.Rejected, WithdrawStatus.FullyProcessed, WithdrawStatus.Failed)),
+}
+
+def isTerminalTicket(kind: str, ticket: dict) -> bool:
+    return ticket.get("Status") in TERMINAL_TICKET_STATUSES[kind]
+
+class TicketCache(object):
+    '''
+    Deposit and withdraw tickets already seen in a terminal status (Rejected, FullyProcessed,
+    Failed), by RequestCode. Such a ticket cannot change any more, so lookups can skip the
+    exchange; tickets in any other status are not kept. The `maxTickets` most recently stored
+    tickets of each kind are kept.
+    '''
+    def __init__(self, maxTickets: int = 100000):
+        self.maxTickets = maxTickets
+        self.ticketsByKind = {kind: OrderedDict() for kind in TERMINAL_TICKET_STATUSES}
+        self.lock = Lock()
+
+    def get(self, kind: str, requestCode: str) -> Optional[dict]:
+        return self.ticketsByKind[kind].get(requestCode)
+
+    def store(self, kind: str, ticket: dict) -> bool:
+        if not isTerminalTicket(kind, ticket):
+            return False
+        tickets = self.ticketsByKind[kind]
+        with self.lock:
+            tickets[ticket["RequestCode"]] = ticket
+            tickets.move_to_end(ticket["RequestCode"])
+            while len(tickets) > self.maxTickets:
+                tickets.popitem(last=False)
+        return True
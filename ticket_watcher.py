@@ -0,0 +1,162 @@
+from queue import Queue
+from threading import Event, Lock, Thread
+from time import monotonic
+from typing import Dict, List, Tuple
+
+from ticket_cache import isTerminalTicket
+
+# Seconds between polls of a ticket in each status, (first, longest): the interval doubles on
+# every poll that finds the ticket unchanged and restarts from the first one after a change.
+# Statuses waiting on a person (AdminProcessing, Pending2Fa) or on a delay are polled less often
+# than the ones the system moves on by itself.
+POLL_INTERVALS_BY_STATUS = {
+    "New": (5.0, 60.0),
+    "AdminProcessing": (30.0, 600.0),
+    "Accepted": (5.0, 60.0),
+    "SystemProcessing": (5.0, 60.0),
+    "Pending": (10.0, 300.0),
+    "Pending2Fa": (30.0, 600.0),
+    "AutoAccepted": (5.0, 60.0),
+    "Delayed": (60.0, 1800.0),
+}
+# Tickets whose status is unknown or that could not be read
+DEFAULT_POLL_INTERVALS = (10.0, 300.0)
+
+class WatchedTicket(object):
+    def __init__(self, requestCode: str, status: str = None):
+        self.requestCode = requestCode
+        self.status = status
+        self.interval = None
+        self.nextPollAt = 0.0
+
+class TicketWatcher(object):
+    '''
+    Follows deposit or withdraw tickets (`kind` "Deposit" or "Withdraw") until they reach a
+    terminal status (Rejected, FullyProcessed, Failed), reporting status changes only.
+
+    Each watched ticket is polled on its own schedule, from `intervals` (by default
+    POLL_INTERVALS_BY_STATUS): the interval grows while the status stays the same and is reset
+    when it changes. Due tickets are looked up together with the client's batch lookup
+    (getDepositTicketBatch/getWithdrawTicketBatch), so a poll costs one pipelined burst of
+    requests for the tickets that are due, never a full ticket listing.
+
+    Changes go to `changes`, a queue of `(requestCode, previousStatus, ticket)`, and to the
+    callbacks given to `addChangeCallback`, which run on the watcher thread.
+    '''
+    def __init__(self, client, kind: str, omsId: int, operatorId: int, accountId: int,
+        intervals: Dict[str, Tuple[float, float]] = None, maxInFlight: int = 16):
+        self.client = client
+        self.kind = kind
+        self.omsId = omsId
+        self.operatorId = operatorId
+        self.accountId = accountId
+        self.intervals = dict(POLL_INTERVALS_BY_STATUS)
+        if intervals:
+            self.intervals.update(intervals)
+        self.maxInFlight = maxInFlight
+        self.lookupBatch = client.getDepositTicketBatch if kind == "Deposit" else client.getWithdrawTicketBatch
+        self.watched = dict()
+        self.lock = Lock()
+        self.changes = Queue()
+        self.changeCallbacks = []
+        self.wakeup = Event()
+        self.stopped = Event()
+        self.thread = None
+        self.polls = 0
+
+    # ============== Watch list ================
+    def watch(self, requestCodes: List[str]):
+        # Tickets of unknown status: the first poll reports their status as a change from None
+        with self.lock:
+            for requestCode in requestCodes:
+                self.watched.setdefault(requestCode, WatchedTicket(requestCode))
+        self.wakeup.set()
+
+    def watchTickets(self, tickets: List[dict]):
+        # Tickets already read (e.g. from getWithdrawTickets): their status is the baseline
+        now = monotonic()
+        with self.lock:
+            for ticket in tickets:
+                if isTerminalTicket(self.kind, ticket):
+                    continue
+                watched = self.watched.setdefault(ticket["RequestCode"], WatchedTicket(ticket["RequestCode"]))
+                watched.status = ticket["Status"]
+                watched.interval = self.intervalsFor(watched.status)[0]
+                watched.nextPollAt = now + watched.interval
+        self.wakeup.set()
+
+    def unwatch(self, requestCode: str):
+        with self.lock:
+            self.watched.pop(requestCode, None)
+
+    def watchedCodes(self) -> List[str]:
+        with self.lock:
+            return list(self.watched)
+
+    def addChangeCallback(self, callback):
+        # Called as callback(requestCode, previousStatus, ticket)
+        self.changeCallbacks.append(callback)
+
+    # ============== Polling ================
+    def start(self) -> "TicketWatcher":
+        if self.thread is None:
+            self.thread = Thread(target=self.run, daemon=True)
+            self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+        self.wakeup.set()
+
+    def run(self):
+        while not self.stopped.is_set():
+            delay = self.pollDue()
+            self.wakeup.wait(delay)
+            self.wakeup.clear()
+
+    def pollDue(self) -> float:
+        # Polls the tickets that are due and returns the seconds until the next one is
+        now = monotonic()
+        with self.lock:
+            dueCodes = [requestCode for requestCode, watched in self.watched.items() if watched.nextPollAt <= now]
+        if dueCodes:
+            self.polls += 1
+            try:
+                ticketsByCode = self.lookupBatch(self.omsId, self.operatorId, self.accountId, dueCodes, maxInFlight=self.maxInFlight)
+            except Exception as e:
+                self.client.logger.warning("Ticket watcher could not poll %d %s tickets: %s", len(dueCodes), self.kind, e)
+                ticketsByCode = dict.fromkeys(dueCodes)
+            for requestCode, ticket in ticketsByCode.items():
+                self.update(requestCode, ticket)
+        now = monotonic()
+        with self.lock:
+            nextPollAt = min((watched.nextPollAt for watched in self.watched.values()), default=None)
+        return None if nextPollAt is None else max(0.0, nextPollAt - now)
+
+    def update(self, requestCode: str, ticket: dict):
+        with self.lock:
+            watched = self.watched.get(requestCode)
+            if watched is None:
+                return
+            previousStatus = watched.status
+            status = ticket["Status"] if ticket is not None else previousStatus
+            first, longest = self.intervalsFor(status)
+            changed = ticket is not None and status != previousStatus
+            if changed or watched.interval is None:
+                watched.interval = first
+            else:
+                watched.interval = min(watched.interval * 2.0, longest)
+            watched.status = status
+            watched.nextPollAt = monotonic() + watched.interval
+            if ticket is not None and isTerminalTicket(self.kind, ticket):
+                del self.watched[requestCode]
+        if changed:
+            self.changes.put((requestCode, previousStatus, ticket))
+            for callback in self.changeCallbacks:
+                try:
+                    callback(requestCode, previousStatus, ticket)
+                except Exception:
+                    self.client.logger.exception("Ticket change callback failed for %s", requestCode)
+
+    def intervalsFor(self, status: str) -> Tuple[float, float]:
+        return self.intervals.get(status, DEFAULT_POLL_INTERVALS)
@@ -0,0 +1,41 @@
+from enum import Enum
+from threading import Lock
+
+class TraceStage(Enum):
+    Send = "Send"
+    Receive = "Receive"
+    EnvelopeDecode = "EnvelopeDecode"
+    PayloadDecode = "PayloadDecode"
+    Dispatch = "Dispatch"
+
+class TraceHooks(object):
+    '''
+    Registry of tracing hooks fired from the client hot path. A hook is called as
+    `hook(stage, functionName, sequence, timestampNs)` where `timestampNs` comes from
+    `time.perf_counter_ns`. Hooks run synchronously on the sending thread (Send) or on the
+    socket thread (every other stage), so they must be cheap and must not block.
+
+    The hook tuples are replaced, never mutated, so the hot path can iterate them without
+    locking; `active` lets the client skip taking timestamps when nothing is registered.
+    '''
+    def __init__(self):
+        self.hooksByStage = {stage: () for stage in TraceStage}
+        self.active = False
+        self.lock = Lock()
+
+    def register(self, hook, stages=None):
+        with self.lock:
+            for stage in (stages if stages is not None else TraceStage):
+                if hook not in self.hooksByStage[stage]:
+                    self.hooksByStage[stage] = self.hooksByStage[stage] + (hook,)
+            self.active = any(self.hooksByStage.values())
+
+    def unregister(self, hook, stages=None):
+        with self.lock:
+            for stage in (stages if stages is not None else TraceStage):
+                self.hooksByStage[stage] = tuple(h for h in self.hooksByStage[stage] if h != hook)
+            self.active = any(self.hooksByStage.values())
+
+    def emit(self, stage: TraceStage, functionName: str, sequence: int, timestampNs: int):
+        for hook in self.hooksByStage[stage]:
+            hook(stage, functionName, sequence, timestampNs)